@@ -1,6 +1,10 @@
+import os
 import sys
 import Queue
 import time
+import zlib
+import random
+import struct
 import threading
 import collections
 import json
@@ -60,9 +64,196 @@ class DuplexClientPeriodicTimer(threading.Thread):
     def fireNow(self):
         with self.dataLock:
             self.currentDelay = 1
+    def fireIn(self, delay):
+        with self.dataLock:
+            self.currentDelay = max(1, int(round(delay)))
     def close(self):
         self.goOn = False
 
+class DuplexClientMemoryQueue(object):
+    """
+    In-memory FIFO of the objects to send to the server.
+
+    Objects are only removed once acknowledged, so they survive a failed
+    poll, but not a restart.
+    """
+    def __init__(self, maxsize):
+        self.maxsize                    = maxsize
+        self.dataLock                   = threading.RLock()
+        self.entries                    = collections.deque()
+    def put(self, o):
+        with self.dataLock:
+            if len(self.entries) >= self.maxsize:
+                raise Queue.Full()
+            self.entries.append((time.time(), o))
+    def peek(self, maxnum):
+        """
+        Returns (objects, cursor): up to maxnum of the oldest objects, and the
+        cursor to pass to ack() once they are sent.
+        """
+        with self.dataLock:
+            objects = [o for (_, o) in list(self.entries)[:maxnum]]
+        return objects, len(objects)
+    def ack(self, cursor):
+        with self.dataLock:
+            for _ in range(cursor):
+                self.entries.popleft()
+    def qsize(self):
+        with self.dataLock:
+            return len(self.entries)
+    def oldestAge(self):
+        with self.dataLock:
+            if not self.entries:
+                return None
+            return time.time()-self.entries[0][0]
+
+class DuplexClientDiskQueue(object):
+    """
+    Persistent FIFO of the objects to send to the server.
+
+    Objects are appended to a journal file, each record being the enqueue
+    time, the length and the object. The offset of the first unacknowledged
+    record is kept in a separate ack file, rewritten atomically on each ack().
+    The journal is emptied once everything is acknowledged, and compacted
+    when its acknowledged part grows beyond COMPACTSIZE bytes.
+    Only the unacknowledged records read by peek() are held in memory.
+    Records and the ack file are synced to disk before put() and ack()
+    return, so a power loss neither loses nor replays acknowledged records.
+    """
+
+    RECORD_HDR  = struct.Struct('>dI')  # enqueue time, length
+    COMPACTSIZE = 10*1024*1024
+
+    def __init__(self, file_name, maxbytes):
+        # store params
+        self.file_name                  = file_name
+        self.ack_file_name              = file_name+'.ack'
+        self.maxbytes                   = maxbytes
+        # local variables
+        self.dataLock                   = threading.RLock()
+        self.ack_offset                 = 0
+        self.end_offset                 = 0
+        self.num_entries                = 0
+        self.oldest_ts                  = None
+        self._recover()
+    def put(self, o):
+        with self.dataLock:
+            if self.end_offset-self.ack_offset+self.RECORD_HDR.size+len(o) > self.maxbytes:
+                raise Queue.Full()
+            now = time.time()
+            with open(self.file_name, 'ab') as f:
+                f.write(self.RECORD_HDR.pack(now, len(o)) + o)
+                self._sync(f)
+            self.end_offset            += self.RECORD_HDR.size+len(o)
+            self.num_entries           += 1
+            if self.oldest_ts is None:
+                self.oldest_ts          = now
+    def peek(self, maxnum):
+        """
+        Returns (objects, cursor): up to maxnum of the oldest objects, and the
+        cursor to pass to ack() once they are sent.
+        """
+        with self.dataLock:
+            objects = []
+            offset  = self.ack_offset
+            if self.num_entries:
+                with open(self.file_name, 'rb') as f:
+                    f.seek(offset)
+                    while len(objects) < maxnum and offset < self.end_offset:
+                        (_, length) = self.RECORD_HDR.unpack(f.read(self.RECORD_HDR.size))
+                        objects    += [f.read(length)]
+                        offset     += self.RECORD_HDR.size+length
+            return objects, (offset, len(objects))
+    def ack(self, cursor):
+        (offset, num) = cursor
+        if not num:
+            return
+        with self.dataLock:
+            self.ack_offset             = offset
+            self.num_entries           -= num
+            if self.num_entries == 0:
+                # everything sent: empty the journal
+                with open(self.file_name, 'wb') as f:
+                    self._sync(f)
+                self.ack_offset         = 0
+                self.end_offset         = 0
+                self.oldest_ts          = None
+            elif self.ack_offset > self.COMPACTSIZE:
+                self._compact()
+            else:
+                self.oldest_ts          = self._readTimestamp(self.ack_offset)
+            self._writeAckOffset()
+    def qsize(self):
+        with self.dataLock:
+            return self.num_entries
+    def oldestAge(self):
+        with self.dataLock:
+            if self.oldest_ts is None:
+                return None
+            return time.time()-self.oldest_ts
+    def _recover(self):
+        # read acknowledged offset
+        try:
+            with open(self.ack_file_name, 'rb') as f:
+                self.ack_offset         = int(f.read())
+        except (IOError, ValueError):
+            self.ack_offset             = 0
+        if not os.path.exists(self.file_name):
+            open(self.file_name, 'wb').close()
+        # count the unacknowledged records, drop a record truncated by a crash
+        size = os.path.getsize(self.file_name)
+        if self.ack_offset > size:
+            self.ack_offset             = 0
+        offset = self.ack_offset
+        with open(self.file_name, 'rb') as f:
+            while offset+self.RECORD_HDR.size <= size:
+                f.seek(offset)
+                (ts, length) = self.RECORD_HDR.unpack(f.read(self.RECORD_HDR.size))
+                if offset+self.RECORD_HDR.size+length > size:
+                    break
+                if self.oldest_ts is None:
+                    self.oldest_ts      = ts
+                self.num_entries       += 1
+                offset                 += self.RECORD_HDR.size+length
+        if offset < size:
+            logger.warning("truncating {0} B of incomplete record in {1}".format(size-offset, self.file_name))
+            with open(self.file_name, 'r+b') as f:
+                f.truncate(offset)
+        self.end_offset                 = offset
+        if self.num_entries:
+            logger.info("{0} objects to send recovered from {1}".format(self.num_entries, self.file_name))
+    def _compact(self):
+        # move the unacknowledged records to a new journal
+        tmp_file_name = self.file_name+'.tmp'
+        with open(self.file_name, 'rb') as fin:
+            fin.seek(self.ack_offset)
+            with open(tmp_file_name, 'wb') as fout:
+                while True:
+                    chunk = fin.read(1024*1024)
+                    if not chunk:
+                        break
+                    fout.write(chunk)
+                self._sync(fout)
+        # the ack file is reset first: on crash, records are sent twice, never lost
+        self.end_offset                -= self.ack_offset
+        self.ack_offset                 = 0
+        self._writeAckOffset()
+        os.rename(tmp_file_name, self.file_name)
+        self.oldest_ts                  = self._readTimestamp(0)
+    def _readTimestamp(self, offset):
+        with open(self.file_name, 'rb') as f:
+            f.seek(offset)
+            return self.RECORD_HDR.unpack(f.read(self.RECORD_HDR.size))[0]
+    def _writeAckOffset(self):
+        tmp_file_name = self.ack_file_name+'.tmp'
+        with open(tmp_file_name, 'wb') as f:
+            f.write(str(self.ack_offset))
+            self._sync(f)
+        os.rename(tmp_file_name, self.ack_file_name)
+    def _sync(self, f):
+        f.flush()
+        os.fsync(f.fileno())
+
 class DuplexClient(object):
 
     def __init__(self, kwargs):
@@ -92,6 +283,10 @@ class DuplexClient(object):
 class DuplexClientHttp(DuplexClient):
 
     MAXQUEUEZISE = 100
+    MAXQUEUEBYTES = 100*1024*1024
+    MAXPOLLOBJECTS = 100
+    TIMEOUT = (5, 30)           # connect and read timeouts, in seconds
+    MAXBACKOFF = 300            # in seconds
 
     def __init__(self, kwargs):
         """
@@ -100,16 +295,38 @@ class DuplexClientHttp(DuplexClient):
         - 'server_url' URL of the server, e.g. "http://127.0.0.1:8080/api/v1/o.json"
         - 'polling_period' the period (in seconds) with which the DuplexClientHttp instance polls the server
         - 'buffer_tx' a boolean. It False, objects passed through the to_server() method are buffered until the next polling_period.
+        The following kwargs MAY be present:
+        - 'queue_file' the journal file of a persistent queue of the objects to send. If absent, the queue is in memory.
+        - 'compress' a boolean. If True, request bodies are gzip-compressed (Content-Encoding: gzip). Defaults to False.
+        - 'timeout' the timeout (in seconds) of a request, or a (connect, read) tuple. Defaults to TIMEOUT.
+        - 'max_backoff' the maximum delay (in seconds) between polls when the server can't be reached. Defaults to MAXBACKOFF.
+        - 'long_poll' the time (in seconds) the server may hold a request until it has objects for us. If set, a
+          DuplexClientLongPoller thread receives the objects from the server, and the periodic polls only
+          happen when there are objects to send.
         """
 
         # store params
         self.server_url      = kwargs['server_url']
         self.polling_period  = kwargs['polling_period']
         self.buffer_tx       = kwargs['buffer_tx']
+        self.queue_file      = kwargs.get('queue_file')
+        self.compress        = kwargs.get('compress', False)
+        self.timeout         = kwargs.get('timeout', self.TIMEOUT)
+        if isinstance(self.timeout, (tuple, list)):
+            self.timeout     = tuple(self.timeout)
+        else:
+            self.timeout     = (self.timeout, self.timeout)  # same connect and read timeouts
+        self.max_backoff     = kwargs.get('max_backoff', self.MAXBACKOFF)
+        self.long_poll       = kwargs.get('long_poll')
 
         # local variables
         self.dataLock        = threading.RLock()
-        self.toserverqueue   = Queue.Queue(maxsize=self.MAXQUEUEZISE)
+        self.session         = requests.Session()  # keeps the connection alive between polls
+        self.num_failures    = 0
+        if self.queue_file:
+            self.toserverqueue = DuplexClientDiskQueue(self.queue_file, maxbytes=self.MAXQUEUEBYTES)
+        else:
+            self.toserverqueue = DuplexClientMemoryQueue(maxsize=self.MAXQUEUEZISE)
         self.is_connected    = False
         self.lastheard_ts    = None
         self._set_is_connected(False)
@@ -124,34 +341,47 @@ class DuplexClientHttp(DuplexClient):
         )
         self.periodicTimer.fireNow()
 
+        # start long-polling for objects from the server
+        self.longPoller      = None
+        if self.long_poll:
+            self.longPoller  = DuplexClientLongPoller(self)
+
     # ======================= public ==========================================
 
     def to_server(self, o):
         """
         'o' contains a single object ['b','yttywetywe']
+        Raises Queue.Full when the queue is full.
         """
         assert type(o) == str
 
         # add to queue
-        self.toserverqueue.put(o, block=False)
+        self.toserverqueue.put(o)
 
-        # send now, if appropriate
-        if self.buffer_tx==False:
+        # send now, if appropriate (not while backing off)
+        with self.dataLock:
+            backing_off = self.num_failures > 0
+        if self.buffer_tx==False and not backing_off:
            self.periodicTimer.fireNow()
 
     def getStatus(self):
         returnVal = {}
         with self.dataLock:
-            returnVal['connectionmode']          = 'http_polling'
+            returnVal['connectionmode']          = 'http_long_polling' if self.long_poll else 'http_polling'
             returnVal['is_connected']            = self.is_connected
             returnVal['lastheard_ts']            = self.lastheard_ts
             if self.lastheard_ts:
                 returnVal['lastheard_since']     = time.time()-self.lastheard_ts
             returnVal['toserverqueue_fill']      = self.toserverqueue.qsize()
+            returnVal['toserverqueue_oldest_age'] = self.toserverqueue.oldestAge()
+            returnVal['num_failures']            = self.num_failures
         return returnVal
 
     def disconnect(self):
-        self.polling_timer.cancel()
+        self.periodicTimer.close()
+        if self.longPoller:
+            self.longPoller.close()
+        self.session.close()
 
     # ======================= private =========================================
 
@@ -169,87 +399,256 @@ class DuplexClientHttp(DuplexClient):
                 'token':   self.token,
                 'ttl':     self.polling_period+3,
             }
-            # objects
-            o = []
-            while True:
-                try:
-                    e = self.toserverqueue.get(block=False)
-                except Queue.Empty:
-                    break
-                else:
-                    o += [e]
+            # objects, removed from the queue only once the server has them
+            (o, cursor) = self.toserverqueue.peek(self.MAXPOLLOBJECTS)
             if o:
                 body['o'] = o
+            elif self.long_poll:
+                # nothing to send, the long poller receives the objects from the server
+                return
 
             # send to server
-            r = requests.post(
-                self.server_url,
-                json = body,
-            ).json()
+            r = self._post(body)
             r = convertToString(r)
         except requests.exceptions.ConnectionError as err:
             self._set_is_connected(False)
+            self._backoff()
             logger.error(err)
         except Exception as err:
             self._set_is_connected(False)
+            self._backoff()
             logger.error(err)
         else:
             self._set_is_connected(True)
+            with self.dataLock:
+                self.num_failures = 0
+            self.toserverqueue.ack(cursor)
+            # drain the backlog at full rate
+            if self.toserverqueue.qsize():
+                self.periodicTimer.fireNow()
             if r['o']:
                 self.from_server_cb(r['o'])
 
+    def _post(self, body, session=None, timeout=None):
+        data    = json.dumps(body)
+        headers = {'Content-Type': 'application/json'}
+        if self.compress:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16+zlib.MAX_WBITS)  # gzip container
+            data       = compressor.compress(data) + compressor.flush()
+            headers['Content-Encoding'] = 'gzip'
+        r = (session or self.session).post(
+            self.server_url,
+            data    = data,
+            headers = headers,
+            timeout = timeout or self.timeout,
+        )
+        r.raise_for_status()
+        return r.json()
+
+    def _backoff(self):
+        """
+        Delay the next poll exponentially with the number of consecutive
+        failures, with jitter so sites don't reconnect in lockstep.
+        """
+        with self.dataLock:
+            self.num_failures += 1
+            delay = min(self.max_backoff, self.polling_period*(2**min(self.num_failures, 16)))
+        self.periodicTimer.fireIn(random.uniform(delay/2.0, delay))
+
     def _set_is_connected(self,newstate):
         with self.dataLock:
             self.is_connected      = newstate
             if self.is_connected:
                 self.lastheard_ts  = time.time()
 
+class DuplexClientLongPoller(threading.Thread):
+    """
+    Thread which keeps one HTTP request pending at the server at all times.
+
+    The request carries a 'wait' field: the server holds it for up to that
+    many seconds, and answers as soon as it has objects for this id. Objects
+    are hence delivered to from_server_cb within one round trip.
+    """
+    MARGIN = 10                 # extra read timeout on top of the wait, in seconds
+    def __init__(self, client):
+        # store params
+        self.client                     = client
+        # local variables
+        self.goOn                       = True
+        self.session                    = requests.Session()
+        self.num_failures               = 0
+        # start the thread
+        threading.Thread.__init__(self)
+        self.name                       = 'DuplexClientLongPoller'
+        self.daemon                     = True
+        self.start()
+    def run(self):
+        while self.goOn:
+            try:
+                body = {
+                    'id':      self.client.id,
+                    'token':   self.client.token,
+                    'ttl':     self.client.long_poll+self.MARGIN,
+                    'wait':    self.client.long_poll,
+                }
+                r = self.client._post(
+                    body,
+                    session = self.session,
+                    timeout = (self.client.timeout[0], self.client.long_poll+self.MARGIN),
+                )
+                r = convertToString(r)
+            except Exception as err:
+                logger.error("DuplexClientLongPoller: {0}".format(err))
+                self.client._set_is_connected(False)
+                self.num_failures += 1
+                delay = min(self.client.max_backoff, 2**min(self.num_failures, 16))
+                time.sleep(random.uniform(delay/2.0, delay))
+            else:
+                self.client._set_is_connected(True)
+                self.num_failures  = 0
+                if r.get('o'):
+                    try:
+                        self.client.from_server_cb(r['o'])
+                    except Exception as err:
+                        logger.critical("DuplexClientLongPoller could not call from_server_cb: {0}".format(err))
+    def close(self):
+        self.goOn = False
+        self.session.close()
+
 class DuplexClientWs(DuplexClient):
 
+    MAXQUEUEZISE = 100
+    MAXBACKOFF = 300            # in seconds
+
     def __init__(self, kwargs):
+        """
+        The following kwargs MUST be present:
+        - the required kwargs for the DuplexClient class
+        - 'server_url' URL of the server, e.g. "ws://127.0.0.1:8080/api/v1/ws"
+        The connection is re-opened, with exponential backoff, when it closes.
+        Objects passed to to_server() while disconnected are queued.
+        """
+
         # store params
-        self.server_url = kwargs['server_url']
+        self.server_url      = kwargs['server_url']
+        self.max_backoff     = kwargs.get('max_backoff', self.MAXBACKOFF)
+
+        # local variables
+        self.dataLock        = threading.RLock()
+        self.toserverqueue   = DuplexClientMemoryQueue(maxsize=self.MAXQUEUEZISE)
+        self.goOn            = True
+        self.is_connected    = False
+        self.lastheard_ts    = None
+        self.num_failures    = 0
+        self.ws              = None
 
         # initialize parent
         DuplexClient.__init__(self, kwargs)
 
         # start Websocket
-        self.ws = websocket.WebSocketApp(self.server_url,
-                                         on_message=self.on_message,
-                                         on_error=self.on_error,
-                                         on_close=self.on_close,
-                                         )
-        self.ws.on_open = self.on_open
-        wst = threading.Thread(target=self.ws.run_forever)
+        wst = threading.Thread(target=self._run)
+        wst.name   = 'DuplexClientWs'
         wst.daemon = True
         wst.start()
 
     def on_message(self, ws, message):
-        if message['o']:
+        try:
+            message = convertToString(json.loads(message))
+        except ValueError as err:
+            logger.error("Websocket: invalid message {0}: {1}".format(message, err))
+            return
+        with self.dataLock:
+            self.lastheard_ts = time.time()
+        if message.get('o'):
             self.from_server_cb(message['o'])
 
     def on_error(self, ws, error):
-        self.from_server_cb(error)
+        logger.error("Websocket error for id {0}: {1}".format(self.id, error))
 
-    def on_close(self, ws):
+    def on_close(self, ws, *args):
+        with self.dataLock:
+            self.is_connected = False
         logger.debug("Websocket closed for id: {0}.".format(self.id))
 
     def on_open(self, ws):
+        with self.dataLock:
+            self.is_connected = True
+            self.lastheard_ts = time.time()
+            self.num_failures = 0
         logger.debug("Websocket open for id: {0}.".format(self.id))
+        # identify ourselves, then send what was queued while disconnected
+        ws.send(json.dumps({
+            'id':    self.id,
+            'token': self.token,
+            'o':     [],
+        }))
+        self._flush()
 
     def to_server(self, o):
-        body = {
-            'id': self.id,
-            'token': self.token,
-            'o': [o]
-        }
-        self.ws.send(json.dumps(body))
+        """
+        'o' contains a single object ['b','yttywetywe']
+        Raises Queue.Full when the queue is full.
+        """
+        self.toserverqueue.put(o)
+        self._flush()
 
     def getStatus(self):
-        raise NotImplementedError()
+        returnVal = {}
+        with self.dataLock:
+            returnVal['connectionmode']          = 'websocket'
+            returnVal['is_connected']            = self.is_connected
+            returnVal['lastheard_ts']            = self.lastheard_ts
+            if self.lastheard_ts:
+                returnVal['lastheard_since']     = time.time()-self.lastheard_ts
+            returnVal['toserverqueue_fill']      = self.toserverqueue.qsize()
+            returnVal['toserverqueue_oldest_age'] = self.toserverqueue.oldestAge()
+            returnVal['num_failures']            = self.num_failures
+        return returnVal
 
     def disconnect(self):
-        self.ws.close()
+        self.goOn = False
+        if self.ws:
+            self.ws.close()
+
+    # ======================= private =========================================
+
+    def _run(self):
+        while self.goOn:
+            self.ws = websocket.WebSocketApp(
+                self.server_url,
+                on_message = self.on_message,
+                on_error   = self.on_error,
+                on_close   = self.on_close,
+            )
+            self.ws.on_open = self.on_open
+            try:
+                self.ws.run_forever()
+            except Exception as err:
+                logger.error("Websocket crashed for id {0}: {1}".format(self.id, err))
+            with self.dataLock:
+                self.is_connected  = False
+                self.num_failures += 1
+                delay = min(self.max_backoff, 2**min(self.num_failures, 16))
+            if self.goOn:
+                time.sleep(random.uniform(delay/2.0, delay))
+
+    def _flush(self):
+        with self.dataLock:
+            if not self.is_connected:
+                return
+            (o, cursor) = self.toserverqueue.peek(self.MAXQUEUEZISE)
+            if not o:
+                return
+            try:
+                self.ws.send(json.dumps({
+                    'id':    self.id,
+                    'token': self.token,
+                    'o':     o,
+                }))
+            except Exception as err:
+                logger.error("Websocket could not send for id {0}: {1}".format(self.id, err))
+            else:
+                self.toserverqueue.ack(cursor)
 
 # =========================== main ============================================
 
@@ -0,0 +1,122 @@
+import os
+import Queue
+
+import mock
+import pytest
+
+import DuplexClient
+
+# ============================ defines ===============================
+
+MAXBYTES = 1024*1024
+
+# ============================ helpers ===============================
+
+def new_queue(tmpdir, maxbytes=MAXBYTES):
+    return DuplexClient.DuplexClientDiskQueue(str(tmpdir.join('outbox')), maxbytes=maxbytes)
+
+# ============================ tests =================================
+
+def test_put_peek_ack(tmpdir):
+    q = new_queue(tmpdir)
+    for i in range(5):
+        q.put('object{0}'.format(i))
+    assert q.qsize() == 5
+
+    (objects, cursor) = q.peek(3)
+    assert objects == ['object0', 'object1', 'object2']
+    q.ack(cursor)
+    assert q.qsize() == 2
+
+    (objects, cursor) = q.peek(10)
+    assert objects == ['object3', 'object4']
+    q.ack(cursor)
+    assert q.qsize() == 0
+    assert q.oldestAge() is None
+    assert os.path.getsize(str(tmpdir.join('outbox'))) == 0
+
+def test_full(tmpdir):
+    q = new_queue(tmpdir, maxbytes=100)
+    q.put('a'*50)
+    with pytest.raises(Queue.Full):
+        q.put('a'*50)
+
+def test_restart(tmpdir):
+    q = new_queue(tmpdir)
+    for i in range(5):
+        q.put('object{0}'.format(i))
+    (objects, cursor) = q.peek(2)
+    q.ack(cursor)
+
+    # a peek not acknowledged before the restart is sent again
+    (objects, cursor) = q.peek(2)
+    assert objects == ['object2', 'object3']
+
+    q = new_queue(tmpdir)
+    assert q.qsize() == 3
+    assert q.oldestAge() is not None
+    (objects, cursor) = q.peek(2)
+    assert objects == ['object2', 'object3']
+    q.ack(cursor)
+
+    # the acknowledged offset survives a second restart
+    q = new_queue(tmpdir)
+    assert q.qsize() == 1
+    q.put('object5')
+    (objects, cursor) = q.peek(10)
+    assert objects == ['object4', 'object5']
+
+def test_recover_truncated_record(tmpdir):
+    q = new_queue(tmpdir)
+    q.put('object0')
+    q.put('object1')
+    size = os.path.getsize(str(tmpdir.join('outbox')))
+
+    # crash in the middle of writing the last record
+    with open(str(tmpdir.join('outbox')), 'r+b') as f:
+        f.truncate(size-3)
+
+    q = new_queue(tmpdir)
+    assert q.qsize() == 1
+    assert os.path.getsize(str(tmpdir.join('outbox'))) == size-q.RECORD_HDR.size-len('object1')
+    q.put('object2')
+    (objects, cursor) = q.peek(10)
+    assert objects == ['object0', 'object2']
+
+def test_recover_invalid_ack_file(tmpdir):
+    q = new_queue(tmpdir)
+    q.put('object0')
+    with open(str(tmpdir.join('outbox.ack')), 'wb') as f:
+        f.write('garbage')
+
+    q = new_queue(tmpdir)
+    assert q.peek(10)[0] == ['object0']
+
+def test_compact(tmpdir, monkeypatch):
+    monkeypatch.setattr(DuplexClient.DuplexClientDiskQueue, 'COMPACTSIZE', 1000)
+    q = new_queue(tmpdir)
+    objects = ['{0:03d}'.format(i)*30 for i in range(40)]  # 90 B objects
+    for o in objects:
+        q.put(o)
+
+    # acknowledge past COMPACTSIZE: the journal only holds what is left
+    (peeked, cursor) = q.peek(15)
+    q.ack(cursor)
+    assert q.ack_offset == 0
+    assert os.path.getsize(str(tmpdir.join('outbox'))) == 25*(q.RECORD_HDR.size+90)
+    assert not os.path.exists(str(tmpdir.join('outbox.tmp')))
+    assert q.peek(100)[0] == objects[15:]
+
+    # and after a restart
+    q = new_queue(tmpdir)
+    assert q.qsize() == 25
+    assert q.peek(100)[0] == objects[15:]
+
+def test_sync(tmpdir):
+    q = new_queue(tmpdir)
+    with mock.patch('os.fsync', wraps=os.fsync) as fsync:
+        q.put('object0')
+        assert fsync.call_count == 1
+        q.put('object1')
+        q.ack(q.peek(1)[1])
+        assert fsync.call_count == 3  # the ack file, before being renamed
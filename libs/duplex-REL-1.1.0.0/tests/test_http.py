@@ -0,0 +1,104 @@
+import json
+import zlib
+
+import mock
+import pytest
+import requests
+
+import DuplexClient
+
+# ============================ defines ===============================
+
+SERVER_URL = 'http://127.0.0.1:8080/api/v1/o.json'
+
+# ============================ fixtures ==============================
+
+@pytest.fixture
+def session():
+    # the periodic timer is replaced, polls are triggered by the tests
+    with mock.patch.object(DuplexClient, 'DuplexClientPeriodicTimer'), \
+         mock.patch.object(DuplexClient.requests, 'Session') as Session:
+        yield Session.return_value
+
+# ============================ helpers ===============================
+
+def new_client(**kwargs):
+    params = {
+        'server_url':     SERVER_URL,
+        'id':             'testmanager',
+        'token':          'mytoken',
+        'polling_period': 1,
+        'buffer_tx':      True,
+        'from_server_cb': mock.Mock(),
+    }
+    params.update(kwargs)
+    return DuplexClient.DuplexClient.from_url(**params)
+
+def reply(o=[]):
+    r = mock.Mock()
+    r.json.return_value = {'o': o}
+    return r
+
+# ============================ tests =================================
+
+def test_poll(session):
+    session.post.return_value = reply([{'cmd': 'a'}])
+    client = new_client()
+    client.to_server('["b","abc"]')
+    client._poll_server()
+
+    (args, kwargs) = session.post.call_args
+    assert args == (SERVER_URL,)
+    assert kwargs['timeout'] == DuplexClient.DuplexClientHttp.TIMEOUT
+    assert 'Content-Encoding' not in kwargs['headers']
+    body = json.loads(kwargs['data'])
+    assert body['o'] == ['["b","abc"]']
+    client.from_server_cb.assert_called_once_with([{'cmd': 'a'}])
+    assert client.getStatus()['toserverqueue_fill'] == 0
+
+def test_timeout(session):
+    session.post.return_value = reply()
+    client = new_client(timeout=10)
+    client._poll_server()
+    assert session.post.call_args[1]['timeout'] == (10, 10)
+
+def test_gzip(session):
+    session.post.return_value = reply()
+    client = new_client(compress=True)
+    client.to_server('["b","abc"]')
+    client._poll_server()
+
+    kwargs = session.post.call_args[1]
+    assert kwargs['headers']['Content-Encoding'] == 'gzip'
+    body = json.loads(zlib.decompress(kwargs['data'], 16+zlib.MAX_WBITS))
+    assert body['id'] == 'testmanager'
+    assert body['o'] == ['["b","abc"]']
+
+def test_backoff(session, monkeypatch):
+    monkeypatch.setattr(DuplexClient.random, 'uniform', lambda a, b: b)
+    session.post.side_effect = requests.exceptions.ConnectionError('unreachable')
+    client = new_client(max_backoff=10)
+    client.to_server('["b","abc"]')
+
+    # the delay doubles with each failure, up to max_backoff
+    delays = []
+    for _ in range(5):
+        client._poll_server()
+        delays += [client.periodicTimer.fireIn.call_args[0][0]]
+    assert delays == [2, 4, 8, 10, 10]
+    assert client.getStatus()['num_failures'] == 5
+    assert client.getStatus()['is_connected'] == False
+
+    # the object was kept, and is sent once the server answers
+    session.post.side_effect  = None
+    session.post.return_value = reply()
+    client._poll_server()
+    assert json.loads(session.post.call_args[1]['data'])['o'] == ['["b","abc"]']
+    assert client.getStatus()['num_failures'] == 0
+    assert client.getStatus()['is_connected'] == True
+    assert client.getStatus()['toserverqueue_fill'] == 0
+
+    # no more backoff: the next failure starts over
+    session.post.side_effect = requests.exceptions.ConnectionError('unreachable')
+    client._poll_server()
+    assert client.periodicTimer.fireIn.call_args[0][0] == 2
@@ -0,0 +1,159 @@
+import json
+import time
+import threading
+
+import mock
+import pytest
+
+import DuplexClient
+
+# ============================ defines ===============================
+
+TIMEOUT = 5
+
+# ============================ fixtures ==============================
+
+@pytest.fixture(autouse=True)
+def noBackoff(monkeypatch):
+    # reconnect right away
+    monkeypatch.setattr(DuplexClient.random, 'uniform', lambda a, b: 0)
+
+# ============================ helpers ===============================
+
+def wait_for(condition):
+    deadline = time.time()+TIMEOUT
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+class FakeWebSocketApp(object):
+    """
+    Stands for websocket.WebSocketApp. Each connection attempt waits for the
+    test to call connect(), then fails or opens until closed.
+    """
+    instances = []
+
+    def __init__(self, url, on_message, on_error, on_close):
+        self.on_message = on_message
+        self.on_error   = on_error
+        self.on_close   = on_close
+        self.on_open    = None
+        self.sent       = []
+        self.fail       = False
+        self.go         = threading.Event()
+        self.closed     = threading.Event()
+        self.instances.append(self)
+
+    def connect(self, fail=False):
+        self.fail = fail
+        self.go.set()
+
+    def run_forever(self):
+        self.go.wait(TIMEOUT)
+        if self.fail:
+            raise Exception('connection refused')
+        self.on_open(self)
+        self.closed.wait(TIMEOUT)
+        self.on_close(self)
+
+    def send(self, data):
+        self.sent.append(json.loads(data))
+
+    def close(self):
+        self.closed.set()
+
+# ============================ tests =================================
+
+def test_long_poll(monkeypatch):
+    received = []
+    replies  = [Exception('server unreachable'), {'o': [{'cmd': 'a'}]}]
+    done     = threading.Event()
+    def post(url, data, headers, timeout):
+        if not replies:
+            done.wait(TIMEOUT)
+            raise Exception('closed')
+        r = replies.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return mock.Mock(json=mock.Mock(return_value=r))
+
+    with mock.patch.object(DuplexClient, 'DuplexClientPeriodicTimer'), \
+         mock.patch.object(DuplexClient.requests, 'Session') as Session:
+        Session.return_value.post.side_effect = post
+        client = DuplexClient.DuplexClient.from_url(
+            server_url      = 'http://127.0.0.1:8080/api/v1/o.json',
+            id              = 'testmanager',
+            token           = 'mytoken',
+            polling_period  = 1,
+            buffer_tx       = False,
+            long_poll       = 20,
+            from_server_cb  = received.append,
+        )
+        try:
+            # the objects of the server are received after a failed request
+            wait_for(lambda: received)
+            assert received == [[{'cmd': 'a'}]]
+            assert client.getStatus()['connectionmode'] == 'http_long_polling'
+            assert client.getStatus()['is_connected'] == True
+            assert client.longPoller.num_failures == 0
+
+            # each request waits at the server, with a read timeout to match
+            calls = Session.return_value.post.call_args_list
+            assert json.loads(calls[-1][1]['data'])['wait'] == 20
+            assert calls[-1][1]['timeout'] == (DuplexClient.DuplexClientHttp.TIMEOUT[0], 20+client.longPoller.MARGIN)
+
+            # the periodic poll does not post when there is nothing to send
+            num_calls = len(calls)
+            client._poll_server()
+            assert len(Session.return_value.post.call_args_list) == num_calls
+        finally:
+            client.disconnect()
+            done.set()
+
+def test_ws_reconnect():
+    FakeWebSocketApp.instances = []
+    received = []
+    with mock.patch.object(DuplexClient.websocket, 'WebSocketApp', FakeWebSocketApp):
+        client = DuplexClient.DuplexClient.from_url(
+            server_url      = 'ws://127.0.0.1:8080/api/v1/ws',
+            id              = 'testmanager',
+            token           = 'mytoken',
+            from_server_cb  = received.append,
+        )
+        try:
+            # objects are queued while disconnected
+            wait_for(lambda: len(FakeWebSocketApp.instances) == 1)
+            client.to_server('["b","abc"]')
+            assert client.getStatus()['is_connected'] == False
+            assert client.getStatus()['toserverqueue_fill'] == 1
+
+            # the first attempt fails, the second one sends the queued objects
+            FakeWebSocketApp.instances[0].connect(fail=True)
+            wait_for(lambda: len(FakeWebSocketApp.instances) == 2)
+            assert client.getStatus()['num_failures'] == 1
+            ws = FakeWebSocketApp.instances[1]
+            ws.connect()
+            wait_for(lambda: len(ws.sent) == 2)
+            assert ws.sent[0] == {'id': 'testmanager', 'token': 'mytoken', 'o': []}
+            assert ws.sent[1]['o'] == ['["b","abc"]']
+            assert client.getStatus()['is_connected'] == True
+            assert client.getStatus()['num_failures'] == 0
+            assert client.getStatus()['toserverqueue_fill'] == 0
+
+            # connected: sent right away, and objects from the server are received
+            client.to_server('["b","def"]')
+            assert ws.sent[2]['o'] == ['["b","def"]']
+            ws.on_message(ws, json.dumps({'o': [{'cmd': 'a'}]}))
+            assert received == [[{'cmd': 'a'}]]
+
+            # the connection drops, then re-opens with the objects queued meanwhile
+            ws.close()
+            wait_for(lambda: len(FakeWebSocketApp.instances) == 3)
+            client.to_server('["b","ghi"]')
+            assert client.getStatus()['toserverqueue_fill'] == 1
+            ws = FakeWebSocketApp.instances[2]
+            ws.connect()
+            wait_for(lambda: len(ws.sent) == 2)
+            assert ws.sent[1]['o'] == ['["b","ghi"]']
+        finally:
+            client.disconnect()
@@ -138,6 +138,7 @@ class ApiDefinition(object):
         if array2scalar :
             self._array2scalar(self.commands)
             self._array2scalar(self.notifications)
+        self._compile()
     
     def _array2scalar(self, defs) :
         '''
@@ -157,6 +158,51 @@ class ApiDefinition(object):
                     fields['response']['FIELDS'].remove(array)
                     fields['response']['FIELDS'] += scalars
     
+    def _compile(self):
+        '''
+        \brief Index the (sub)command definitions by (type, id) and by
+               (type, name tuple), with their request and response fields
+               already built, so lookups do not walk the definition lists.
+        
+        \note The first definition of an id or name wins, as with a linear
+               search. Anything not indexed is looked up the slow way, which
+               raises the appropriate error.
+        '''
+        self._idToNames           = {}   ##< (type,id)                -> name
+        self._nameToIds           = {}   ##< (type,name)              -> id
+        self._definitions         = {}   ##< (type,nameTuple)         -> definition
+        self._subcommandIdToNames = {}   ##< (type,nameTuple,id)      -> subcommand name
+        self._subcommandNameToIds = {}   ##< (type,nameTuple,name)    -> subcommand id
+        self._requestFields       = {}   ##< nameTuple                -> [Field]
+        self._responseFields      = {}   ##< (type,nameTuple)         -> [Field]
+        
+        for type in [self.COMMAND,self.NOTIFICATION]:
+            list = self._getList(type)
+            for item in reversed(list):
+                self._idToNames[(type,item['id'])]   = item['name']
+                self._nameToIds[(type,item['name'])] = item['id']
+            self._compileList(type,(),list)
+    
+    def _compileList(self,type,parentNames,list):
+        for item in reversed(list):
+            names = parentNames+(item['name'],)
+            self._definitions[(type,names)] = item
+            if parentNames:
+                self._subcommandIdToNames[(type,parentNames,item['id'])]   = item['name']
+                self._subcommandNameToIds[(type,parentNames,item['name'])] = item['id']
+            if type==self.COMMAND and 'request' in item:
+                self._requestFields[names] = [Field(fieldRaw,self.fieldOptions)
+                                                 for fieldRaw in item['request']]
+            if 'response' in item:
+                responseName = item['response'].keys()[0]
+                self._responseFields[(type,names)] = [Field(fieldRaw,self.fieldOptions)
+                                                         for fieldRaw in item['response'][responseName]]
+        for item in list:
+            if 'subCommands' in item:
+                # only the first definition of a name is reachable
+                if self._definitions[(type,parentNames+(item['name'],))] is item:
+                    self._compileList(type,parentNames+(item['name'],),item['subCommands'])
+    
     def idToName(self,type,id):
         '''
         \brief Translate a command or notification ID into a command name.
@@ -165,6 +211,10 @@ class ApiDefinition(object):
                    not exist
         \returns The command name.
         '''
+        try:
+            return self._idToNames[(type,id)]
+        except (KeyError,TypeError):
+            pass
         list = self._getList(type)
         for item in list:
             if item['id']==id:
@@ -180,6 +230,10 @@ class ApiDefinition(object):
                    not exist
         \returns The command ID.
         '''
+        try:
+            return self._nameToIds[(type,nameArray[0])]
+        except (KeyError,TypeError,IndexError):
+            pass
         list = self._getList(type)
         for item in list:
             if item['name']==nameArray[0]:
@@ -294,6 +348,10 @@ class ApiDefinition(object):
                    does not exist.
         \returns The definition of a (sub)command, represented as a dictionary.
         '''
+        try:
+            return self._definitions[(type,tuple(nameArray))]
+        except (KeyError,TypeError):
+            pass
         list = self._getList(type)
         definition  = None
         definition,list = self._commandIterator(nameArray,list)
@@ -322,6 +380,10 @@ class ApiDefinition(object):
         return 'subCommands' in self.getDefinition(type,nameArray)
     
     def subcommandIdToName(self,type,nameArray,id):
+        try:
+            return self._subcommandIdToNames[(type,tuple(nameArray),id)]
+        except (KeyError,TypeError):
+            pass
         subcommands = self.getSubcommands(type,nameArray)
         for subcommand in subcommands:
             if subcommand['id']==id:
@@ -330,6 +392,10 @@ class ApiDefinition(object):
                                             str(id))
     
     def subcommandNameToId(self,type,nameArray,name):
+        try:
+            return self._subcommandNameToIds[(type,tuple(nameArray),name)]
+        except (KeyError,TypeError):
+            pass
         subcommands = self.getSubcommands(type,nameArray)
         for subcommand in subcommands:
             if subcommand['name']==name:
@@ -406,6 +472,10 @@ class ApiDefinition(object):
                                         '%s in %s' % (fieldName, '.'.join(commandArray))) 
     
     def getRequestFields(self,commandArray):
+        try:
+            return self._requestFields[tuple(commandArray)]
+        except (KeyError,TypeError):
+            pass
         commandDef = self.getDefinition(self.COMMAND,commandArray)
         if 'request' not in commandDef:
             raise CommandError(CommandError.NO_REQUEST,
@@ -450,6 +520,11 @@ class ApiDefinition(object):
     
     def getResponseFields(self,type,nameArray):
         
+        try:
+            return self._responseFields[(type,tuple(nameArray))]
+        except (KeyError,TypeError):
+            pass
+        
         commandDef = self.getDefinition(type,nameArray)
         
         if 'response' not in commandDef:
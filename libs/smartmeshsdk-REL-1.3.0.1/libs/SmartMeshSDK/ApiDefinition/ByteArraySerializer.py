@@ -22,9 +22,23 @@ class ByteArraySerializer(object):
     
     \brief Serializer/deserializer for byte arrays.
     '''
+    
+    ## struct format of the fixed-length fields decoded in a single unpack
+    _STRUCT_FORMATS = {
+        (ApiDefinition.FieldFormats.INT,  1): 'B',
+        (ApiDefinition.FieldFormats.INT,  2): 'H',
+        (ApiDefinition.FieldFormats.INT,  4): 'I',
+        (ApiDefinition.FieldFormats.INT,  8): 'Q',
+        (ApiDefinition.FieldFormats.INTS, 1): 'b',
+        (ApiDefinition.FieldFormats.INTS, 2): 'h',
+        (ApiDefinition.FieldFormats.INTS, 4): 'i',
+        (ApiDefinition.FieldFormats.BOOL, 1): 'B',
+    }
 
     def __init__(self,ApiDef):
-        self.ApiDef = ApiDef
+        self.ApiDef     = ApiDef
+        self.useLayouts = True      ##< decode with the compiled layouts when the packet fits them
+        self._layouts   = {}        ##< compiled layout (or None), per (type,nameTuple)
     
     def serialize(self,commandArray,fieldsToFill):
         
@@ -47,13 +61,7 @@ class ByteArraySerializer(object):
         for cmdCounter in range(len(commandArray)):
         
             # packet payload
-            definition = self.ApiDef.getDefinition(
-                ApiDefinition.ApiDefinition.COMMAND,
-                commandArray[:cmdCounter+1]
-            )
-            
-            fields = [ApiDefinition.Field(fieldRaw,self.ApiDef.fieldOptions)
-                         for fieldRaw in definition['request']]
+            fields = self.ApiDef.getRequestFields(commandArray[:cmdCounter+1])
             
             for field in fields:
                 thisFieldByteArray = []
@@ -129,7 +137,16 @@ class ByteArraySerializer(object):
             output  = '\n'.join(output)
             log.debug(output)
         
-        continueParsing  = True
+        # decode with the compiled layouts, field by field if the packet does not fit them
+        decoded = None
+        if self.useLayouts:
+            decoded = self._deserializeLayouts(type,nameArray,byteArray)
+        if decoded:
+            (nameArray,returnFields) = decoded
+            continueParsing = False
+        else:
+            continueParsing = True
+        
         while continueParsing:
             
             fieldDefs   = self.ApiDef.getResponseFields(type,nameArray)
@@ -269,3 +286,143 @@ class ByteArraySerializer(object):
             log.debug(output)
         
         return nameArray,returnFields
+    
+    #======================== compiled layouts ================================
+    
+    def _deserializeLayouts(self,type,nameArray,byteArray):
+        '''
+        \brief Decode a packet with the compiled layouts of its (sub)commands.
+        
+        \returns (nameArray,returnFields), or None if the packet is not
+                 complete, has a non-RC_OK return code or a value not in the
+                 options, so must be decoded field by field.
+        '''
+        nameArray       = nameArray[:]
+        returnFields    = {}
+        index           = 0
+        
+        while True:
+            
+            layout = self._getLayout(type,nameArray)
+            if not layout:
+                return None
+            (fixed,length,fields,tail,hasSubcommands) = layout
+            
+            # all fixed-length fields are decoded at once
+            thisLevelArray = byteArray[index:index+length]
+            if len(thisLevelArray)<length:
+                return None
+            values         = fixed.unpack(bytearray(thisLevelArray))
+            index         += length
+            
+            idNextCommand  = None
+            for (name,kind,pos,start,end,validOptions) in fields:
+                if   kind=='struct':
+                    thisFieldValue = values[pos]
+                elif kind=='bool':
+                    if values[pos]>1:
+                        return None
+                    thisFieldValue = values[pos]==1
+                elif kind=='hex':
+                    thisFieldValue = thisLevelArray[start:end]
+                elif kind=='string':
+                    thisFieldValue = ''.join([chr(b) for b in thisLevelArray[start:end]])
+                else:
+                    # unsigned int of a length struct does not have
+                    thisFieldValue = 0
+                    for b in thisLevelArray[start:end]:
+                        thisFieldValue = (thisFieldValue<<8)|b
+                
+                if validOptions and thisFieldValue not in validOptions:
+                    return None
+                
+                if name in ApiDefinition.ApiDefinition.RESERVED:
+                    idNextCommand = thisFieldValue
+                elif name==ApiDefinition.ApiDefinition.RC and thisFieldValue!=ApiDefinition.ApiDefinition.RC_OK:
+                    return None
+                else:
+                    returnFields[name] = thisFieldValue
+            
+            # the variable-length field takes the rest of the packet
+            if tail:
+                returnFields[tail] = byteArray[index:] or None
+                index              = len(byteArray)
+            
+            if not hasSubcommands:
+                break
+            nameArray.append(self.ApiDef.subcommandIdToName(type,
+                                                            nameArray,
+                                                            idNextCommand))
+            if index>=len(byteArray):
+                break
+        
+        return nameArray,returnFields
+    
+    def _getLayout(self,type,nameArray):
+        key = (type,tuple(nameArray))
+        try:
+            return self._layouts[key]
+        except KeyError:
+            layout = self._compileLayout(type,nameArray)
+            self._layouts[key] = layout
+            return layout
+    
+    def _compileLayout(self,type,nameArray):
+        '''
+        \brief Compile the response fields of a (sub)command into a
+               struct.Struct for its fixed-length fields, plus the slices of the
+               other fields.
+        
+        \returns (struct,length,fields,tail,hasSubcommands), or None if the
+                 fields cannot be compiled (only the last field may have a
+                 variable length).
+        '''
+        try:
+            fieldDefs = self.ApiDef.getResponseFields(type,nameArray)
+        except CommandError:
+            return None
+        
+        structFormat    = '>'
+        length          = 0
+        numValues       = 0
+        fields          = []
+        tail            = None
+        
+        for fieldDef in fieldDefs:
+            if tail:
+                return None
+            validOptions = fieldDef.options.validOptions
+            
+            if not fieldDef.length:
+                if fieldDef.format!=ApiDefinition.FieldFormats.HEXDATA or validOptions:
+                    return None
+                tail = fieldDef.name
+                continue
+            
+            thisStructFormat = self._STRUCT_FORMATS.get((fieldDef.format,fieldDef.length))
+            if thisStructFormat:
+                if fieldDef.format==ApiDefinition.FieldFormats.BOOL:
+                    kind = 'bool'
+                else:
+                    kind = 'struct'
+                structFormat += thisStructFormat
+                fields       += [(fieldDef.name,kind,numValues,None,None,validOptions)]
+                numValues    += 1
+            else:
+                if   fieldDef.format==ApiDefinition.FieldFormats.HEXDATA:
+                    kind = 'hex'
+                elif fieldDef.format==ApiDefinition.FieldFormats.STRING:
+                    kind = 'string'
+                elif fieldDef.format==ApiDefinition.FieldFormats.INT:
+                    kind = 'int'
+                else:
+                    return None
+                structFormat += '{0}x'.format(fieldDef.length)
+                fields       += [(fieldDef.name,kind,None,length,length+fieldDef.length,validOptions)]
+            length += fieldDef.length
+        
+        hasSubcommands = self.ApiDef.hasSubcommands(type,nameArray)
+        if hasSubcommands and not [f for f in fields if f[0] in ApiDefinition.ApiDefinition.RESERVED]:
+            return None
+        
+        return (struct.Struct(structFormat),length,fields,tail,hasSubcommands)
@@ -0,0 +1,217 @@
+import threading
+import Queue
+import time
+
+from   IpMgrSubscribe import IpMgrSubscribe
+
+class _Subscription(object) :
+    '''
+    \brief The callback of one notification type, called either on the
+        subscriber thread or, with workers, from a bounded queue.
+    '''
+    
+    POLL_PERIOD         = 1.0 # seconds a worker waits for a notification before checking if closed
+    
+    def __init__(self, fun, workers, maxQueued, policy, errorCb) :
+        self.fun            = fun
+        self.block          = (policy == IpMgrSubscribeWorkers.POLICY_BLOCK)
+        self.errorCb        = errorCb
+        self.queue          = None
+        self.threads        = []
+        self.closed         = False
+        # metrics
+        self.statsLock      = threading.Lock()
+        self.numNotifs      = 0
+        self.numDropped     = 0
+        self.maxQueueDepth  = 0
+        self.cbTimeTotal    = 0.0
+        self.cbTimeMax      = 0.0
+        if workers :
+            self.queue = Queue.Queue(maxQueued)
+            for i in range(workers) :
+                thread = threading.Thread(target = self._work)
+                thread.name = "IpMgrSubscribeWorker"
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+    
+    def dispatch(self, notifName, payload) :
+        if not self.queue :
+            self._call(notifName, payload)
+            return
+        try :
+            self.queue.put((notifName, payload), self.block)
+        except Queue.Full :
+            with self.statsLock :
+                self.numDropped += 1
+            return
+        depth = self.queue.qsize()
+        with self.statsLock :
+            if depth > self.maxQueueDepth :
+                self.maxQueueDepth = depth
+    
+    def close(self) :
+        # the workers exit once the notifications already queued are handled,
+        # on the None marker or, if the queue is full, once they find it empty
+        self.closed = True
+        threads, self.threads = self.threads, []
+        for thread in threads :
+            try :
+                self.queue.put_nowait(None)
+            except Queue.Full :
+                break
+    
+    def getStats(self) :
+        with self.statsLock :
+            return {
+                'notifs':           self.numNotifs,
+                'dropped':          self.numDropped,
+                'queueDepth':       self.queue.qsize() if self.queue else 0,
+                'maxQueueDepth':    self.maxQueueDepth,
+                'cbTimeAvg':        self.cbTimeTotal / self.numNotifs if self.numNotifs else 0.0,
+                'cbTimeMax':        self.cbTimeMax,
+            }
+    
+    def _work(self) :
+        while True :
+            try :
+                item = self.queue.get(True, self.POLL_PERIOD)
+            except Queue.Empty :
+                if self.closed :
+                    break
+                continue
+            if item is None :
+                break
+            try :
+                self._call(*item)
+            except Exception as ex :
+                self.errorCb(ex)
+    
+    def _call(self, notifName, payload) :
+        start = time.time()
+        try :
+            self.fun(notifName, payload)
+        finally :
+            duration = time.time() - start
+            with self.statsLock :
+                self.numNotifs   += 1
+                self.cbTimeTotal += duration
+                if duration > self.cbTimeMax :
+                    self.cbTimeMax = duration
+
+class IpMgrSubscribeWorkers(IpMgrSubscribe) :
+    '''
+    \brief Notification listener for IpMgrConnectorMux object, which can hand
+        the notifications of a type to worker threads.
+    
+    IpMgrSubscribe calls every callback on its single thread, so a slow
+    callback holds up all notifications and lets the connector's queue
+    overflow. Here, each subscribed notification type can get its own
+    bounded queue and workers.
+    
+    IpMgrSubscribe is generated (by GenIpMgrSubscribe.py), this class is
+    not.
+    '''
+    
+    POLICY_BLOCK         = "block"      # a full queue blocks the subscriber thread
+    POLICY_DROP          = "drop"       # a full queue drops the notification
+    DFLT_MAX_QUEUED      = 1000
+    
+    #======================== public ==========================================
+    
+    def __init__(self, ipMgrConnector) :
+        IpMgrSubscribe.__init__(self, ipMgrConnector)
+        # Notification type -> _Subscription. Replaced (never modified) under
+        # _lock, so the subscriber thread reads it without locking.
+        self._dispatch = {}
+    
+    def start(self):
+        '''
+        \brief Start the subscriber _thread.
+        '''
+        self._lock.acquire()
+        subs = self._dispatch.values()
+        self._dispatch = {}
+        self._lock.release()
+        self._closeSubscriptions(subs)
+        IpMgrSubscribe.start(self)
+    
+    def subscribe(self, notifTypes, fun, isRlbl, workers=0, maxQueued=DFLT_MAX_QUEUED, policy=POLICY_BLOCK):
+        '''
+        \brief Subscribe to notification(s), see IpMgrSubscribe.subscribe().
+        
+        \param workers number of threads calling fun. With 0 (the default),
+            fun is called on the subscriber thread, which reads the
+            notifications from the connector. Otherwise, each notification
+            type gets its own queue, so a slow callback does not hold up the
+            other types. With more than one worker, the notifications of a
+            type may be handled out of order.
+        \param maxQueued size of the queue of each notification type, when
+            workers are used.
+        \param policy what to do with a notification when the queue of its
+            type is full: POLICY_BLOCK waits for room, POLICY_DROP drops it
+            (see getStats()).
+        
+        A subscription replaced by this call finishes handling the
+        notifications already in its queue.
+        
+        \exception IpMgrSubscribe.SubscribeError The subscriber hasn't been
+            started, or the notification type(s) or policy specified is (are)
+            not valid.
+        '''
+        
+        if not self._isStarted :
+            raise self.SubscribeError("Error: subscriber is not started")
+        if isinstance(notifTypes, str) :
+            notifTypes = [notifTypes]
+        for nType in notifTypes :  # subscribe type validation
+            if nType not in self._callback :
+                raise self.SubscribeError("Error subscribe type: {0}".format(nType))
+        if policy not in [self.POLICY_BLOCK, self.POLICY_DROP] :
+            raise self.SubscribeError("Error subscribe policy: {0}".format(policy))
+        
+        self._lock.acquire()
+        dispatch = dict(self._dispatch)
+        replaced = []
+        for nType in notifTypes :
+            if nType in dispatch :
+                replaced.append(dispatch[nType])
+            dispatch[nType] = _Subscription(fun, workers, maxQueued, policy, self._workerError)
+        self._dispatch = dispatch
+        self._lock.release()
+        
+        # outside of _lock, so nothing waits on a worker while holding it
+        self._closeSubscriptions(replaced)
+        
+        IpMgrSubscribe.subscribe(self, notifTypes, fun, isRlbl)
+    
+    def getStats(self):
+        '''
+        \brief Get the metrics of the subscribed notification types.
+        
+        \returns A dictionary, per notification type, with the number of
+            notifications handled ('notifs') and dropped because the queue was
+            full ('dropped'), the current and maximum depth of the queue
+            ('queueDepth', 'maxQueueDepth'), and the average and maximum
+            duration of the callback in seconds ('cbTimeAvg', 'cbTimeMax').
+        '''
+        return dict([(nType, sub.getStats()) for (nType, sub) in self._dispatch.items()])
+    
+    #======================== private =========================================
+    
+    def _processOneNotif(self, notifType, notifName, payload):
+        sub = self._dispatch.get(notifType)
+        if sub : 
+            sub.dispatch(notifName, payload)
+        if notifType == self.FINISH :
+            # the connector is gone, let the workers exit
+            self._closeSubscriptions(self._dispatch.values())
+    
+    def _workerError(self, ex) :
+        # same as an exception raised by a callback on the subscriber thread
+        self._processOneNotif(self.ERROR, self.ERROR, ex)
+    
+    def _closeSubscriptions(self, subs) :
+        for sub in subs :
+            if sub.queue :
+                sub.close()
@@ -14,6 +14,7 @@ class IpMgrConnectorSerialInternal(SerialConnector.SerialConnector):
     HELLO_CMD      = (ApiDefinition.ApiDefinition.COMMAND, ['hello'])
     HELLO_RESP_CMD = (ApiDefinition.ApiDefinition.COMMAND, ['hello_response'])
     MGR_HELLO_CMD  = (ApiDefinition.ApiDefinition.NOTIFICATION, ['manager_hello'])
+    MAX_WINDOW     = 32 # experimental, assumes the manager accepts overlapping, out-of-order packetIds
 
     def __init__(self, maxQSize=100):
         api_def = IpMgrDefinition.IpMgrDefinition()
@@ -1,6 +1,7 @@
 #!/usr/bin/python
 
 import sys
+import time
 import threading
 import traceback
 
@@ -38,6 +39,11 @@ class Hdlc(threading.Thread):
     
     _FCS_LENGTH    = 2      # number of bytes in the FCS field
     
+    _READ_TIMEOUT  = 1      # max. number of seconds a read waits for the first byte
+    
+    _FLAG_CHAR     = chr(_HDLC_FLAG)
+    _ESCAPE_CHAR   = chr(_HDLC_ESCAPE)
+    
     def __init__(self,rxcallback,connectcallback):
         
         # log
@@ -59,10 +65,11 @@ class Hdlc(threading.Thread):
         self.pyserialHandler      = ''
         self.busySending          = threading.Lock()
         self.busyReceiving        = False
-        self.lastRxByte           = self._HDLC_FLAG
+        self.statsLock            = threading.Lock()
         
         # initialize state
         self._restart()
+        self._resetStats()
     
     def run(self):
         
@@ -74,89 +81,17 @@ class Hdlc(threading.Thread):
             while self.connected==True:
                 try:
                     
-                    # received a byte
+                    # receive the bytes available, waiting for at least one
                     try:
-                        rxByte = self.pyserialHandler.read(1)
+                        rxBytes = self.pyserialHandler.read(max(1,self._numWaiting()))
                     except Exception as err:
                         # work-around for bug in pyserial
                         # https://sourceforge.net/tracker/?func=detail&aid=3591432&group_id=46487&atid=446302
                         raise serial.SerialException(str(err))
-                    if not len(rxByte):
-                        raise serial.SerialException()
-                    
-                    # convert the received byte from a character to an int
-                    rxByte = ord(rxByte)
-                    if      (
-                                (not self.busyReceiving)             and
-                                self.lastRxByte==self._HDLC_FLAG     and
-                                rxByte!=self._HDLC_FLAG
-                            ):
-                        # start of frame
-                        
-                        self.busyReceiving            = True
-                        self.receivedFrame            = {}
-                        self.receivedFrame['payload'] = [rxByte]
-                    
-                    elif    (
-                                self.busyReceiving                   and
-                                rxByte!=self._HDLC_FLAG
-                            ):
-                        # middle of frame
-                        
-                        if rxByte==self._HDLC_ESCAPE:
-                            self._escape = True
-                            # do not add this byte to the payload
-                        else:
-                            if self._escape == True:
-                                self.receivedFrame['payload'].append(rxByte^self._HDLC_MASK)
-                                self._escape = False
-                            else:
-                                self.receivedFrame['payload'].append(rxByte)
+                    if not len(rxBytes):
+                        continue # timeout
                     
-                    elif    (
-                                self.busyReceiving                   and
-                                rxByte==self._HDLC_FLAG
-                            ):
-                        # end of frame
-                        
-                        self.busyReceiving       = False
-                        
-                        # split payload and fcs
-                        if len(self.receivedFrame['payload'])>self._FCS_LENGTH:
-                            temp_payload                   = self.receivedFrame['payload']
-                            self.receivedFrame['payload']  = temp_payload[:-2]
-                            self.receivedFrame['fcs']      = temp_payload[-2:]
-                            
-                            # check fcs, write 'valid' field
-                            recalculatedCrc                = self.crc.calculate(self.receivedFrame['payload'])
-                            if recalculatedCrc==self.receivedFrame['fcs']:
-                                self.receivedFrame['valid'] = True
-                            else:
-                                self.receivedFrame['valid'] = False
-                            
-                            # log
-                            if log.isEnabledFor(logging.DEBUG):
-                                output     = []
-                                output    += ['\nreceivedFrame:']
-                                output    += self._formatFrame(self.receivedFrame)
-                                log.debug('\n'.join(output))
-                            
-                            # callback
-                            if self.receivedFrame['valid']==True:
-                                try:
-                                    self.rxcallback(self.receivedFrame['payload'])
-                                except (ConnectionError,CommandError) as err:
-                                    output = "@Hdlc: {0}".format(err)
-                                    log.error(output)
-                                    print output
-                        else:
-                            output = "@Hdlc: received hdlc frame too short"
-                            log.error(output)
-                            print output
-                        self._restart()
-                    
-                    # remember the last byte I received
-                    self.lastRxByte = rxByte
+                    self._rxBytes(rxBytes)
                     
                 except serial.SerialException:
                     self.connected = False
@@ -185,7 +120,7 @@ class Hdlc(threading.Thread):
     def connect(self,comPort,baudrate=_BAUDRATE):
         self.comPort         = comPort
         try:
-            self.pyserialHandler = serial.Serial(self.comPort,baudrate=baudrate)
+            self.pyserialHandler = serial.Serial(self.comPort,baudrate=baudrate,timeout=self._READ_TIMEOUT)
             self.pyserialHandler.setRTS(False)
             self.pyserialHandler.setDTR(True)
         except serial.serialutil.SerialException as err:
@@ -195,6 +130,7 @@ class Hdlc(threading.Thread):
         else:
             log.info("opened port {0}@{1}baud".format(self.comPort,baudrate))
             self._restart()
+            self._resetStats()
             self.connected = True
             self.connectcallback(self.connected)
             self.name      = '{0}_HDLC'.format(self.comPort)
@@ -252,6 +188,20 @@ class Hdlc(threading.Thread):
             log.error(output)
             raise ConnectionError(output)
     
+    def getStats(self):
+        '''
+        \returns The statistics of the frames received since connecting, a
+            dictionary with the number of bytes received ('rxBytes'), valid
+            frames ('rxFrames'), frames with a wrong FCS ('crcErrors'), frames
+            too short to hold an FCS ('shortFrames'), and the average number of
+            bytes received per second ('rxBytesPerSec').
+        '''
+        with self.statsLock:
+            returnVal = dict(self.stats)
+        duration = time.time()-self.statsStart
+        returnVal['rxBytesPerSec'] = returnVal['rxBytes']/duration if duration>0 else 0
+        return returnVal
+    
     def disconnect(self):
         log.info("disconnect")
         if self.connected==True:
@@ -272,7 +222,109 @@ class Hdlc(threading.Thread):
     def _restart(self):
         self._escape         = False
         self.busyReceiving   = False
-        self.lastRxByte      = self._HDLC_FLAG
+        self._rxFrame        = []    # unescaped parts of the frame being received
+        self._rxFcs          = self.crc.CRC_INIT
+    
+    def _resetStats(self):
+        with self.statsLock:
+            self.stats       = {
+                'rxBytes':      0,
+                'rxFrames':     0,
+                'crcErrors':    0,
+                'shortFrames':  0,
+            }
+            self.statsStart  = time.time()
+    
+    def _numWaiting(self):
+        try:
+            return self.pyserialHandler.in_waiting
+        except AttributeError:
+            # pyserial<3.0
+            return self.pyserialHandler.inWaiting()
+    
+    def _rxBytes(self,rxBytes):
+        '''
+        Handle bytes received on the serial port, a string.
+        
+        The bytes between two flags are a frame. They are unescaped and added
+        to the running FCS as they are received, the frame is complete at the
+        next flag.
+        '''
+        with self.statsLock:
+            self.stats['rxBytes'] += len(rxBytes)
+        
+        start = 0
+        while True:
+            flag = rxBytes.find(self._FLAG_CHAR,start)
+            end  = len(rxBytes) if flag==-1 else flag
+            if end>start:
+                part                 = self._unescape(rxBytes[start:end])
+                self._rxFcs          = self.crc.update(self._rxFcs,part)
+                self._rxFrame       += [part]
+                self.busyReceiving   = True
+            if flag==-1:
+                break
+            if self.busyReceiving:
+                self._rxFrameDone()
+            self._restart()
+            start = flag+1
+    
+    def _unescape(self,part):
+        if self._escape and part:
+            # the previous part ended with an escape character, this first
+            # byte is the escaped one, so is not itself an escape character
+            self._escape = False
+            return chr(ord(part[0])^self._HDLC_MASK)+self._unescape(part[1:])
+        if self._ESCAPE_CHAR not in part:
+            return part
+        
+        # the byte after each escape character is XOR'ed with the mask
+        pieces = part.split(self._ESCAPE_CHAR)
+        for i in range(1,len(pieces)):
+            if pieces[i]:
+                pieces[i] = chr(ord(pieces[i][0])^self._HDLC_MASK)+pieces[i][1:]
+        
+        # the part ends with an escape character, the next part starts with the escaped byte
+        self._escape = (pieces[-1]=='')
+        return ''.join(pieces)
+    
+    def _rxFrameDone(self):
+        frame = ''.join(self._rxFrame)
+        
+        if len(frame)<=self._FCS_LENGTH:
+            with self.statsLock:
+                self.stats['shortFrames'] += 1
+            output = "@Hdlc: received hdlc frame too short"
+            log.error(output)
+            print output
+            return
+        
+        receivedFrame            = {}
+        receivedFrame['payload'] = list(bytearray(frame[:-self._FCS_LENGTH]))
+        receivedFrame['valid']   = (self._rxFcs==self.crc.CRC_GOOD)
+        
+        with self.statsLock:
+            if receivedFrame['valid']:
+                self.stats['rxFrames']  += 1
+            else:
+                self.stats['crcErrors'] += 1
+        
+        # log
+        if log.isEnabledFor(logging.DEBUG):
+            receivedFrame['fcs'] = list(bytearray(frame[-self._FCS_LENGTH:]))
+            output     = []
+            output    += ['\nreceivedFrame:']
+            output    += self._formatFrame(receivedFrame)
+            log.debug('\n'.join(output))
+        
+        # callback
+        if receivedFrame['valid']==True:
+            try:
+                self.rxcallback(receivedFrame['payload'])
+            except (ConnectionError,CommandError) as err:
+                output = "@Hdlc: {0}".format(err)
+                log.error(output)
+                print output
     
     def _formatFrame(self,frame):
         returnVal  = []
@@ -24,6 +24,70 @@ log = logging.getLogger('SerialConnector')
 log.setLevel(logging.ERROR)
 log.addHandler(NullHandler())
 
+class SerialResponse(object):
+    '''
+    \brief The response to a command sent with SerialConnector.sendAsync(),
+        available once the device answers.
+    '''
+    
+    def __init__(self, connector, cmdId, packet, timeout, maxRetry):
+        
+        # store params
+        self.connector       = connector
+        self.cmdId           = cmdId
+        self.packet          = packet
+        self.timeout         = timeout
+        self.maxRetry        = maxRetry
+        
+        # local variables
+        self.retry           = 0                      ##< number of times the command was resent
+        self.deadline        = None                   ##< time after which the command is resent
+        self.doneEvent       = threading.Event()      ##< set when the response (or an error) is in
+        self.response        = None                   ##< fields of the response
+        self.error           = None                   ##< exception to raise instead of returning the response
+    
+    #======================== public ==========================================
+    
+    def done(self):
+        '''
+        \brief Return whether the command was answered (or failed).
+        '''
+        return self.doneEvent.isSet()
+    
+    def result(self, timeout=None):
+        '''
+        \brief Wait for the response to the command and return it.
+        
+        \param timeout Maximum time to wait, in seconds. None to wait until
+            the command is answered or has exhausted its retries.
+        
+        \exception ConnectionError no response after all retries, or disconnected.
+        \exception APIError the device answered with an error return code.
+        \returns The fields of the response, as returned by SerialConnector.send().
+        '''
+        if timeout is not None:
+            giveUp = time.time()+timeout
+        
+        while not self.doneEvent.wait(self.timeout):
+            if timeout is not None and time.time()>=giveUp:
+                output = "no response after {0}s".format(timeout)
+                log.error(output)
+                raise ConnectionError(output)
+            # resend the commands which timed out
+            with self.connector.requestSendLock:
+                self.connector._servicePipeline()
+        
+        if self.error:
+            raise self.error
+        return self.response
+    
+    #======================== private =========================================
+    
+    def _complete(self, response, error):
+        self.response        = response
+        self.error           = error
+        self.doneEvent.set()
+
 class SerialConnector(ApiConnector):
     '''
     \ingroup ApiConnector
@@ -34,6 +98,7 @@ class SerialConnector(ApiConnector):
     
     MAX_NUM_RETRY = 5
     RX_TIMEOUT    = 0.500 # in seconds
+    MAX_WINDOW    = 1     # commands outstanding at once, limited by the packetId range
     
     def __init__(self, api_def, maxQSize=100) :
         
@@ -58,6 +123,10 @@ class SerialConnector(ApiConnector):
         self.requestSendLock = threading.Lock()       ##< lock to prevent concurrent requests to be sent
         self.tsDataSent      = 0                      ##< timestamp when sent data
         self.tsDataReceived  = 0                      ##< timestamp when received data
+        self.window          = 1                      ##< number of commands sent without waiting for their response
+        self.pipeline        = {}                     ##< outstanding SerialResponse, per packetId
+        self.pipelineStale   = {}                     ##< cmdId of resent commands already answered, per packetId
+        self.pipelineCond    = threading.Condition()  ##< protects the pipeline, notified when a command completes
         
     #======================== public ==========================================
     
@@ -88,6 +157,15 @@ class SerialConnector(ApiConnector):
                 self.hdlc.disconnect()
             # delete the hdlc module
             self.hdlc = None
+        
+        # fail the outstanding commands
+        with self.pipelineCond:
+            outstanding        = self.pipeline.values()
+            self.pipeline      = {}
+            self.pipelineStale = {}
+            self.pipelineCond.notifyAll()
+        for request in outstanding:
+            request._complete(None,ConnectionError("disconnected: {0}".format(reason)))
     
     def send(self,commandArray,fields):
         if not self.isConnected:
@@ -98,7 +176,69 @@ class SerialConnector(ApiConnector):
         # serialize the fields
         cmdId, serializedFields = self.api_def.serialize(commandArray,fields)
         
+        # always stop-and-wait, only sendAsync() pipelines commands
         return self._sendInternal(cmdId,False,serializedFields)
+    
+    def sendAsync(self,commandArray,fields,timeout=None,maxRetry=None):
+        '''
+        \brief Send a command without waiting for its response.
+        
+        Up to self.window commands are outstanding at once, this call blocks
+        while the window is full. Responses are matched to their command by
+        packetId. A command not answered within timeout is resent with the
+        same packetId, so only pipeline commands which can safely be executed
+        twice (e.g. getMoteConfig, getMoteInfo).
+        
+        \note Experimental: with a window larger than 1, the device must
+            accept overlapping commands and answer them in any order, which
+            its serial API does not document.
+        
+        \param commandArray The command, as for send().
+        \param fields       The fields of the command, as for send().
+        \param timeout      Time to wait for the response before resending,
+            in seconds (RX_TIMEOUT by default).
+        \param maxRetry     Number of times the command is resent before
+            failing (MAX_NUM_RETRY by default).
+        
+        \returns A SerialResponse, call its result() method to get the response.
+        '''
+        if not self.isConnected:
+            output = "not connected"
+            log.error(output)
+            raise ConnectionError(output)
+        
+        # serialize the fields
+        cmdId, serializedFields = self.api_def.serialize(commandArray,fields)
+        
+        return self._sendPipelined(cmdId,serializedFields,timeout,maxRetry)
+    
+    def setWindow(self,window):
+        '''
+        \brief Set the number of commands sendAsync() sends without waiting
+            for their response, 1 (the default) to wait for each response.
+        
+        \note Experimental, see sendAsync(). send() always waits for the
+            response.
+        
+        \param window Number of outstanding commands, at most MAX_WINDOW.
+        '''
+        if not 1<=window<=self.MAX_WINDOW:
+            output = "window must be between 1 and {0}".format(self.MAX_WINDOW)
+            log.error(output)
+            raise ValueError(output)
+        with self.pipelineCond:
+            self.window = window
+            self.pipelineCond.notifyAll()
+
+    def getHdlcStats(self):
+        '''
+        \brief Return the statistics of the frames received on the serial port
+            (see Hdlc.getStats()), None if not connected.
+        '''
+        with self.hdlcLock:
+            if self.hdlc:
+                return self.hdlc.getStats()
+        return None
 
     #======================== virtual methods =================================
 
@@ -119,6 +259,12 @@ class SerialConnector(ApiConnector):
         \brief Send an ACK if needed.
         '''
         raise NotImplementedError() # to be implemented by child class
+    
+    def _incrementTxPacketId(self):
+        '''
+        \brief Move to the packetId of the next request.
+        '''
+        raise NotImplementedError() # to be implemented by child class
 
     def isHelloResponse(self, cmdId):
         return False
@@ -185,47 +331,185 @@ class SerialConnector(ApiConnector):
                     raise ConnectionError(output)
                 retry = retry + 1
                     
-            if isinstance(self.responseBuf,Exception):
-                log.error("responseBuf contains exception {0}".format(self.responseBuf))
-                raise self.responseBuf
-            
-            if  (
-                    (ApiDefinition.ApiDefinition.RC in self.responseBuf) and
-                    (
-                        self.responseBuf[ApiDefinition.ApiDefinition.RC]!= \
-                            ApiDefinition.ApiDefinition.RC_OK
-                    )
-                ):
-                temp_name = self.api_def.idToName(
-                                    ApiDefinition.ApiDefinition.COMMAND,
-                                    cmdId
-                                )
-                temp_rc   = self.responseBuf[ApiDefinition.ApiDefinition.RC]
-                temp_desc = '({0})\n{1}'.format(
-                    self.api_def.fieldValueToDesc(
-                        ApiDefinition.ApiDefinition.COMMAND,
-                        [temp_name],
-                        ApiDefinition.ApiDefinition.RC,
-                        temp_rc
-                    ),
-                    self.api_def.rcToDescription(
-                        temp_rc,
-                        [temp_name],
-                    ),
-                )
-                if temp_rc not in [11,18]: # rc==11:RC_NOT_FOUND, rc==18:RC_END_OF_LIST
-                    log.warning("received RC={0} for command {1}:\n{2}".format(temp_rc,
-                                                                               temp_name,
-                                                                               temp_desc))
-                raise APIError(temp_name,temp_rc,temp_desc)
-            
-            # return packet received
-            return self.responseBuf
+            return self._checkResponse(cmdId,self.responseBuf)
         
         finally:
             if not isResponse:
                 self.requestSendLock.release()
     
+    def _checkResponse(self,cmdId,response):
+        '''
+        \brief Return the response to a command, raise it if it is an
+            exception, or an APIError if its return code is not RC_OK.
+        '''
+        if isinstance(response,Exception):
+            log.error("responseBuf contains exception {0}".format(response))
+            raise response
+            
+        if  (
+                (ApiDefinition.ApiDefinition.RC in response) and
+                (
+                    response[ApiDefinition.ApiDefinition.RC]!= \
+                        ApiDefinition.ApiDefinition.RC_OK
+                )
+            ):
+            temp_name = self.api_def.idToName(
+                                ApiDefinition.ApiDefinition.COMMAND,
+                                cmdId
+                            )
+            temp_rc   = response[ApiDefinition.ApiDefinition.RC]
+            temp_desc = '({0})\n{1}'.format(
+                self.api_def.fieldValueToDesc(
+                    ApiDefinition.ApiDefinition.COMMAND,
+                    [temp_name],
+                    ApiDefinition.ApiDefinition.RC,
+                    temp_rc
+                ),
+                self.api_def.rcToDescription(
+                    temp_rc,
+                    [temp_name],
+                ),
+            )
+            if temp_rc not in [11,18]: # rc==11:RC_NOT_FOUND, rc==18:RC_END_OF_LIST
+                log.warning("received RC={0} for command {1}:\n{2}".format(temp_rc,
+                                                                           temp_name,
+                                                                           temp_desc))
+            raise APIError(temp_name,temp_rc,temp_desc)
+            
+        # return packet received
+        return response
+    
+    def _sendPipelined(self,cmdId,serializedFields,timeout=None,maxRetry=None):
+        
+        if timeout is None:
+            timeout  = self.RX_TIMEOUT
+        if maxRetry is None:
+            maxRetry = self.MAX_NUM_RETRY
+        
+        with self.requestSendLock:
+            
+            # wait for room in the window, resending the commands which timed out
+            while True:
+                with self.pipelineCond:
+                    if len(self.pipeline)<self.window:
+                        break
+                    self.pipelineCond.wait(self.RX_TIMEOUT)
+                self._servicePipeline()
+            
+            # build packet to send, with the next packetId
+            with self.paramLock:
+                packetId = self.TxPacketId
+            packet  = []
+            packet += self._buildTxHeader(cmdId,False,serializedFields)
+            packet += serializedFields
+            
+            with self.paramLock:
+                if self.TxPacketId==packetId:
+                    # the header holds the current packetId, the next command uses the next one
+                    self._incrementTxPacketId()
+                else:
+                    # the header was built with the next packetId (e.g. mote connectors)
+                    packetId = self.TxPacketId
+            
+            request = SerialResponse(self,cmdId,packet,timeout,maxRetry)
+            with self.pipelineCond:
+                self.pipelineStale.pop(packetId,None)
+                self.pipeline[packetId] = request
+            
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("---------- pcToMote DATA ({0}) pipelined ---------->".format(packetId))
+                self.tsDataSent = time.time()
+            
+            try:
+                self._transmitPipelined(request)
+            except ConnectionError:
+                with self.pipelineCond:
+                    self.pipeline.pop(packetId,None)
+                raise
+        
+        return request
+    
+    def _transmitPipelined(self,request):
+        request.deadline = time.time()+request.timeout
+        with self.hdlcLock:
+            if not self.hdlc:
+                output = "no HDLC module, did I just disconnect?"
+                log.error(output)
+                raise ConnectionError(output)
+            self.hdlc.send(request.packet)
+    
+    def _servicePipeline(self):
+        '''
+        \brief Resend the pipelined commands which timed out, fail those which
+            have exhausted their retries.
+        
+        \note The caller holds requestSendLock.
+        '''
+        now     = time.time()
+        resend  = []
+        expired = []
+        with self.pipelineCond:
+            for (packetId,request) in self.pipeline.items():
+                if request.deadline>now:
+                    continue
+                if request.retry>=request.maxRetry:
+                    # a late response to the command is dropped
+                    del self.pipeline[packetId]
+                    self.pipelineStale[packetId] = request.cmdId
+                    expired += [request]
+                else:
+                    request.retry += 1
+                    resend  += [(packetId,request)]
+            if expired:
+                self.pipelineCond.notifyAll()
+        
+        for request in expired:
+            output = "retried {0} times, max allowed is {1}".format(request.retry,request.maxRetry)
+            log.error(output)
+            request._complete(None,ConnectionError(output))
+        
+        for (packetId,request) in resend:
+            log.info("retry {0} of packetId {1}".format(request.retry,packetId))
+            self._transmitPipelined(request)
+    
+    def _completePipelined(self,cmdId,packetId,payload):
+        '''
+        \brief Hand a response to the pipelined command it answers.
+        
+        \returns True if the response was for a pipelined command.
+        '''
+        with self.pipelineCond:
+            request = self.pipeline.get(packetId)
+            if request is None or request.cmdId!=cmdId:
+                if self.pipelineStale.get(packetId)==cmdId:
+                    # second response to a command resent too early, or
+                    # response to a command which already failed
+                    del self.pipelineStale[packetId]
+                    log.info("dropping duplicate response to packetId {0}".format(packetId))
+                    return True
+                return False
+            del self.pipeline[packetId]
+            if request.retry:
+                self.pipelineStale[packetId] = cmdId
+            self.pipelineCond.notifyAll()
+        
+        # deserialize received packet
+        try:
+            nameArray, fields = self.api_def.deserialize(
+                                    ApiDefinition.ApiDefinition.COMMAND,
+                                    cmdId,
+                                    payload)
+        except Exception as err:
+            fields = err
+        
+        try:
+            response = self._checkResponse(cmdId,fields)
+        except Exception as err:
+            request._complete(None,err)
+        else:
+            request._complete(response,None)
+        return True
+    
     def _resetPacketIds(self):
         self.TxPacketId=0
         self.RxPacketId=0
@@ -282,6 +566,10 @@ class SerialConnector(ApiConnector):
                 log.debug("<--------- moteToPc DATA ({0}) ----------".format(packetId))
                 self.tsDataReceived = time.time()
         
+        # responses to pipelined commands are matched on their packetId
+        if isResponse and self._completePipelined(cmdId,packetId,payload):
+            return
+        
         # check packetId
         (wasValidPacketId, isRepeatId, updateRxPacketId) = self.isValidPacketId(cmdId,isResponse,packetId)
 
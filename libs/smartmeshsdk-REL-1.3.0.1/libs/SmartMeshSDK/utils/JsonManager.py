@@ -24,7 +24,8 @@ from SmartMeshSDK                      import sdk_version
 from SmartMeshSDK.utils                import FormatUtils as u, \
                                               SerialScanner
 from SmartMeshSDK.IpMgrConnectorSerial import IpMgrConnectorSerial
-from SmartMeshSDK.IpMgrConnectorMux    import IpMgrSubscribe
+from SmartMeshSDK.IpMgrConnectorMux    import IpMgrSubscribe, \
+                                              IpMgrSubscribeWorkers
 from SmartMeshSDK.ApiException         import APIError,      \
                                               ConnectionError
 from SmartMeshSDK.protocols.Hr         import HrParser
@@ -112,11 +113,12 @@ class ManagerHandler(threading.Thread):
     \brief Connects to the manager, re-connects automatically
     '''
     
-    def __init__(self,serialport,notifHandler):
+    def __init__(self,serialport,notifHandler,window=1):
 
         # store params
         self.serialport      = serialport
         self.notifHandler    = notifHandler
+        self.window          = window
         
         # local variables
         self.reconnectEvent  = threading.Event()
@@ -139,21 +141,32 @@ class ManagerHandler(threading.Thread):
                     self.connector.connect({
                         'port': self.serialport,
                     })
+                    self.connector.setWindow(self.window)
 
                     # subscribe to notifications
-                    self.subscriber = IpMgrSubscribe.IpMgrSubscribe(self.connector)
+                    self.subscriber = IpMgrSubscribeWorkers.IpMgrSubscribeWorkers(self.connector)
                     self.subscriber.start()
+                    # data and health reports (parsed here) have their own
+                    # worker, so the connector's queue is drained promptly
                     self.subscriber.subscribe(
                         notifTypes =    [
                                             IpMgrSubscribe.IpMgrSubscribe.NOTIFDATA,
                                         ],
                         fun =           self._notifAll,
                         isRlbl =        False,
+                        workers =       1,
                     )
                     self.subscriber.subscribe(
                         notifTypes =    [
-                                            IpMgrSubscribe.IpMgrSubscribe.NOTIFEVENT,
                                             IpMgrSubscribe.IpMgrSubscribe.NOTIFHEALTHREPORT,
+                                        ],
+                        fun =           self._notifAll,
+                        isRlbl =        True,
+                        workers =       1,
+                    )
+                    self.subscriber.subscribe(
+                        notifTypes =    [
+                                            IpMgrSubscribe.IpMgrSubscribe.NOTIFEVENT,
                                             IpMgrSubscribe.IpMgrSubscribe.NOTIFIPDATA,
                                             IpMgrSubscribe.IpMgrSubscribe.NOTIFLOG,
                                         ],
@@ -241,10 +254,11 @@ class SnapshotThread(threading.Thread):
     \brief one instance per JsonManager, waits to be triggered, does snapshot on one manager
     '''
     
-    def __init__(self,raw_POST,notifCb):
+    def __init__(self,raw_POST,raw_POST_many,notifCb):
         
         # store params
         self.raw_POST             = raw_POST
+        self.raw_POST_many        = raw_POST_many
         self.notifCb              = notifCb
         
         # local variable
@@ -324,14 +338,12 @@ class SnapshotThread(threading.Thread):
                     
                     # getMoteInfo() on all motes
                     snapshot['getMoteInfo'] = {}
-                    for mac in macs:
-                        resp = self.raw_POST(
-                            commandArray   = ["getMoteInfo"],
-                            fields         = {
-                                "macAddress": mac,
-                            },
-                            manager        = manager,
-                        )
+                    resps = self.raw_POST_many(
+                        commandArray   = ["getMoteInfo"],
+                        fieldsList     = [{"macAddress": mac} for mac in macs],
+                        manager        = manager,
+                    )
+                    for (mac,resp) in zip(macs,resps):
                         macString     = u.formatMacString(mac)
                         snapshot['getMoteInfo'][macString] = stringifyMacIpAddresses(resp)
                     
@@ -461,7 +473,7 @@ class JsonManager(object):
     
     OAP_TIMEOUT = 30.000
     
-    def __init__(self, autoaddmgr, autodeletemgr, serialport, notifCb, configfilename=None):
+    def __init__(self, autoaddmgr, autodeletemgr, serialport, notifCb, configfilename=None, serialwindow=1):
         
         # store params
         self.autoaddmgr           = autoaddmgr
@@ -469,6 +481,7 @@ class JsonManager(object):
         self.serialport           = serialport
         self.notifCb              = notifCb
         self.configfilename       = configfilename
+        self.serialwindow         = serialwindow
         
         # local variables
         self.startTime            = time.time()
@@ -480,6 +493,7 @@ class JsonManager(object):
         self.oapClients           = {}
         self.snapshotThread       = SnapshotThread(
             self.raw_POST,
+            self.raw_POST_many,
             self.notifCb,
         )
         self.outstandingEvents    = {}
@@ -543,6 +557,54 @@ class JsonManager(object):
         
         return returnVal
     
+    def raw_POST_many(self, commandArray, fieldsList, manager):
+        '''
+        \brief Send the same command once per entry of fieldsList, without
+            waiting for each response (up to the serial window of the
+            manager, see SerialConnector.sendAsync()). With a window of 1,
+            the default, the commands are sent one after the other, as
+            raw_POST(). A larger window is experimental.
+        
+        \returns The responses, in the order of fieldsList.
+        '''
+        if type(manager)==int:
+            manager = sorted(self.managerHandlers.keys())[manager]
+        
+        # mac addresses: '00-01-02-03-04-05-06-07' -> [0,1,2,3,4,5,6,7]
+        wasDestringified = [destringifyMacAddresses(fields) for fields in fieldsList]
+        
+        with self.dataLock:
+            connector = self.managerHandlers[manager].connector
+            if connector.window>1:
+                requests  = [
+                    connector.sendAsync(
+                        commandArray = commandArray,
+                        fields       = fields,
+                    ).result for fields in fieldsList
+                ]
+            else:
+                requests  = [
+                    lambda fields=fields: connector.send(
+                        commandArray = commandArray,
+                        fields       = fields,
+                    ) for fields in fieldsList
+                ]
+            returnVal = []
+            for request in requests:
+                try:
+                    returnVal += [request()]
+                except APIError as err:
+                    returnVal += [{
+                        'RC': err.rc,
+                    }]
+        
+        for (resp,destringified) in zip(returnVal,wasDestringified):
+            if destringified:
+                # mac addresses: [0,1,2,3,4,5,6,7] -> '00-01-02-03-04-05-06-07'
+                stringifyMacIpAddresses(resp)
+        
+        return returnVal
+    
     #=== oap
     
     # /info
@@ -937,7 +999,7 @@ class JsonManager(object):
             # add
             for m in self.config['managers']:
                 if m not in self.managerHandlers:
-                    self.managerHandlers[m] = ManagerHandler(m,self._manager_raw_notif_handler)
+                    self.managerHandlers[m] = ManagerHandler(m,self._manager_raw_notif_handler,self.serialwindow)
             # remove
             for m in self.managerHandlers.keys():
                 if m not in self.config['managers']:
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from SmartMeshSDK.SerialConnector import Hdlc
+
+# ============================ defines ===============================
+
+FRAMES = [
+    [0x7d, 0x01],
+    [0x01, 0x7d],
+    [0x5d, 0x7d, 0x02],
+    [0x7e, 0x7d, 0x7e, 0x5e],
+    range(256),
+]
+
+# ============================ helpers ===============================
+
+class StubSerialPort(object):
+    # stands for the serial port, keeps the bytes written
+    def __init__(self):
+        self.written = ''
+    def write(self, data):
+        self.written += data
+        return len(data)
+
+def encode(frames):
+    hdlc                 = Hdlc.Hdlc(None, None)
+    hdlc.connected       = True
+    hdlc.pyserialHandler = StubSerialPort()
+    for frame in frames:
+        hdlc.send(list(frame))
+    return hdlc.pyserialHandler.written
+
+def decode(reads):
+    received = []
+    hdlc     = Hdlc.Hdlc(received.append, None)
+    for rxBytes in reads:
+        hdlc._rxBytes(rxBytes)
+    return received, hdlc.getStats()
+
+def split(rxBytes, sizes):
+    reads = []
+    while rxBytes:
+        size     = sizes()
+        reads   += [rxBytes[:size]]
+        rxBytes  = rxBytes[size:]
+    return reads
+
+# ============================ tests =================================
+
+@pytest.mark.parametrize('sizes', [
+    lambda rxBytes: len(rxBytes),                   # all at once
+    lambda rxBytes: 1,                              # byte by byte: escape and escaped byte in two reads
+    lambda rxBytes: random.randint(1, 8),           # at random offsets
+], ids=['one read', 'byte by byte', 'random splits'])
+def test_rx_reads(sizes):
+    random.seed(0)
+    rxBytes = encode(FRAMES)
+    (received, stats) = decode(split(rxBytes, lambda: sizes(rxBytes)))
+    assert received == FRAMES
+    assert stats['rxFrames'] == len(FRAMES)
+    assert stats['crcErrors'] == 0
+
+def test_rx_escaped_escape_byte_by_byte():
+    # an escaped 0x7d, the escape character and the escaped byte in two reads
+    rxBytes = encode([[0x01, 0x7d, 0x7d, 0x02]])
+    assert '\x7d\x5d\x7d\x5d' in rxBytes
+    (received, stats) = decode(list(rxBytes))
+    assert received == [[0x01, 0x7d, 0x7d, 0x02]]
+    assert stats['crcErrors'] == 0
+
+def test_rx_invalid_fcs():
+    rxBytes = encode([[0x01, 0x02, 0x03]])
+    rxBytes = rxBytes[:2]+chr(ord(rxBytes[2])^0xff)+rxBytes[3:]
+    (received, stats) = decode([rxBytes])
+    assert received == []
+    assert stats['crcErrors'] == 1
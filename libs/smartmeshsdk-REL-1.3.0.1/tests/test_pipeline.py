@@ -0,0 +1,161 @@
+import threading
+import time
+
+import pytest
+
+from SmartMeshSDK                      import ApiConnector
+from SmartMeshSDK.ApiException         import ConnectionError, \
+                                              APIError
+from SmartMeshSDK.IpMgrConnectorSerial import IpMgrConnectorSerialInternal
+
+# ============================ defines ===============================
+
+MACS = [
+    [0x00, 0x17, 0x0d, 0x00, 0x00, 0x38, 0x00, i] for i in range(4)
+]
+
+# ============================ helpers ===============================
+
+class FakeHdlc(object):
+    # stands for the HDLC module, keeps the frames sent
+    def __init__(self):
+        self.sent         = []
+        self.disconnected = False
+    def send(self, packet):
+        self.sent        += [list(packet)]
+    def disconnect(self):
+        self.disconnected = True
+
+def respond(connector, packet, rc=0):
+    # answer a getMoteInfo command, echoing its MAC address
+    (cmdId, packetId, mac) = (packet[1], packet[2], packet[4:12])
+    payload = [rc] + mac + [0]*33
+    connector._hdlcRxCb([0x01, cmdId, packetId, len(payload)] + payload)
+
+def waitFor(condition):
+    for _ in range(100):
+        if condition():
+            return
+        time.sleep(0.01)
+    assert condition()
+
+@pytest.fixture
+def connector():
+    c = IpMgrConnectorSerialInternal.IpMgrConnectorSerialInternal()
+    ApiConnector.ApiConnector.connect(c)
+    c.hdlc = FakeHdlc()
+    c.setWindow(4)
+    return c
+
+def getMoteInfo(connector, mac, timeout=10, maxRetry=None):
+    return connector.sendAsync(
+        ['getMoteInfo'],
+        {'macAddress': mac},
+        timeout  = timeout,
+        maxRetry = maxRetry,
+    )
+
+# ============================ tests =================================
+
+def test_out_of_order(connector):
+    requests = [getMoteInfo(connector, mac) for mac in MACS[:3]]
+    packets  = connector.hdlc.sent
+    assert [p[2] for p in packets] == [0, 1, 2]
+    
+    for i in [2, 0, 1]:
+        respond(connector, packets[i])
+    
+    for (request, mac) in zip(requests, MACS):
+        assert request.done()
+        assert request.result()['macAddress'] == mac
+    assert connector.pipeline == {}
+
+def test_error_rc(connector):
+    request = getMoteInfo(connector, MACS[0])
+    respond(connector, connector.hdlc.sent[0], rc=11)
+    with pytest.raises(APIError):
+        request.result()
+
+def test_duplicate_response_after_resend(connector):
+    request = getMoteInfo(connector, MACS[0], timeout=0.01)
+    time.sleep(0.02)
+    with connector.requestSendLock:
+        connector._servicePipeline()
+    (first, resent) = connector.hdlc.sent
+    assert resent == first
+    assert request.retry == 1
+    
+    # the response to the first transmission completes the command
+    respond(connector, first)
+    assert request.result()['macAddress'] == MACS[0]
+    assert connector.pipelineStale == {first[2]: first[1]}
+    
+    # the late response to the resend is dropped
+    respond(connector, resent)
+    assert connector.pipelineStale == {}
+    
+    # and the next command is still answered
+    request = getMoteInfo(connector, MACS[1])
+    respond(connector, connector.hdlc.sent[-1])
+    assert request.result()['macAddress'] == MACS[1]
+
+def test_timeout_resend_then_fail(connector):
+    request = getMoteInfo(connector, MACS[0], timeout=0.01, maxRetry=2)
+    with pytest.raises(ConnectionError) as excinfo:
+        request.result()
+    assert 'retried 2 times' in str(excinfo.value)
+    assert len(connector.hdlc.sent) == 3
+    assert all(p == connector.hdlc.sent[0] for p in connector.hdlc.sent)
+    assert connector.pipeline == {}
+    
+    # a response arriving after the failure is dropped
+    respond(connector, connector.hdlc.sent[0])
+    assert connector.pipelineStale == {}
+
+def test_window_full_blocks(connector):
+    connector.setWindow(2)
+    requests = [getMoteInfo(connector, mac) for mac in MACS[:2]]
+    
+    third    = []
+    thread   = threading.Thread(target=lambda: third.append(getMoteInfo(connector, MACS[2])))
+    thread.start()
+    time.sleep(0.05)
+    assert len(connector.hdlc.sent) == 2
+    
+    respond(connector, connector.hdlc.sent[1])
+    thread.join(5)
+    assert not thread.isAlive()
+    assert len(connector.hdlc.sent) == 3
+    assert requests[1].result()['macAddress'] == MACS[1]
+    
+    respond(connector, connector.hdlc.sent[2])
+    assert third[0].result()['macAddress'] == MACS[2]
+
+def test_disconnect_with_outstanding(connector):
+    hdlc     = connector.hdlc
+    requests = [getMoteInfo(connector, mac) for mac in MACS[:2]]
+    
+    connector.disconnect("unplugged")
+    
+    assert hdlc.disconnected
+    assert connector.pipeline == {}
+    for request in requests:
+        with pytest.raises(ConnectionError) as excinfo:
+            request.result()
+        assert 'unplugged' in str(excinfo.value)
+    with pytest.raises(ConnectionError):
+        getMoteInfo(connector, MACS[2])
+
+def test_send_waits_for_response(connector):
+    # send() does not pipeline, even with a window larger than 1
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(connector.send(['getMoteInfo'], {'macAddress': MACS[0]})),
+    )
+    thread.start()
+    waitFor(lambda: connector.hdlc.sent)
+    assert connector.pipeline == {}
+    
+    respond(connector, connector.hdlc.sent[0])
+    thread.join(5)
+    assert result[0]['macAddress'] == MACS[0]
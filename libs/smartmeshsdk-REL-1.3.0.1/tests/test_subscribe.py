@@ -0,0 +1,204 @@
+import threading
+import Queue
+import time
+
+import pytest
+
+from SmartMeshSDK                    import ApiException
+from SmartMeshSDK.IpMgrConnectorMux  import IpMgrSubscribeWorkers
+
+W = IpMgrSubscribeWorkers.IpMgrSubscribeWorkers
+
+# ============================ helpers ===============================
+
+class FakeConnector(object):
+    # stands for the manager connector, notifications are fed by the test
+    def __init__(self):
+        self.notifs     = Queue.Queue()
+        self.subscribed = []
+    def getNotification(self):
+        notif = self.notifs.get()
+        if notif is None:
+            raise ApiException.QueueError()
+        return notif
+    def dn_subscribe(self, filter, unackFilter):
+        self.subscribed += [(filter, unackFilter)]
+
+class Recorder(object):
+    # a callback which records its calls, and can be held up
+    def __init__(self, blocked=False):
+        self.calls   = []
+        self.threads = []
+        self.running = threading.Event()
+        self.release = threading.Event()
+        if not blocked:
+            self.release.set()
+    def __call__(self, notifName, payload):
+        self.running.set()
+        self.release.wait()
+        self.threads += [threading.current_thread().name]
+        self.calls   += [(notifName, payload)]
+
+def waitFor(condition):
+    for _ in range(200):
+        if condition():
+            return
+        time.sleep(0.01)
+    assert condition()
+
+@pytest.fixture
+def connector():
+    return FakeConnector()
+
+@pytest.fixture
+def subscriber(connector, monkeypatch):
+    monkeypatch.setattr(IpMgrSubscribeWorkers._Subscription, 'POLL_PERIOD', 0.05)
+    s = W(connector)
+    s.start()
+    yield s
+    connector.notifs.put(None)
+    s._thread.join(5)
+
+def data(i):
+    return (W.NOTIFDATA, i)
+
+# ============================ tests =================================
+
+def test_subscriber_thread(subscriber, connector):
+    cb = Recorder()
+    subscriber.subscribe(W.NOTIFDATA, cb, False)
+    assert connector.subscribed == [([0, 0x10], [0, 0x10])]
+    
+    connector.notifs.put(data(1))
+    waitFor(lambda: cb.calls)
+    assert cb.calls   == [data(1)]
+    assert cb.threads == ['IpMgrSubscribe']
+
+def test_worker_dispatch(subscriber, connector):
+    slow   = Recorder(blocked=True)
+    events = Recorder()
+    subscriber.subscribe(W.NOTIFDATA,  slow,   False, workers=1)
+    subscriber.subscribe(W.NOTIFEVENT, events, True)
+    
+    for i in range(3):
+        connector.notifs.put(data(i))
+    connector.notifs.put(('eventMoteJoin', 'join'))
+    
+    # a slow data callback does not hold up the events
+    waitFor(lambda: events.calls)
+    assert events.calls == [(W.EVENTMOTEJOIN, 'join')]
+    assert slow.calls   == []
+    
+    slow.release.set()
+    waitFor(lambda: len(slow.calls) == 3)
+    assert slow.calls   == [data(i) for i in range(3)]
+    assert slow.threads == ['IpMgrSubscribeWorker']*3
+
+def test_worker_error(subscriber, connector):
+    errors = Recorder()
+    def fail(notifName, payload):
+        raise ValueError(payload)
+    subscriber.subscribe(W.ERROR,     errors, True)
+    subscriber.subscribe(W.NOTIFDATA, fail,   False, workers=1)
+    
+    connector.notifs.put(data('oops'))
+    waitFor(lambda: errors.calls)
+    (notifName, ex) = errors.calls[0]
+    assert notifName == W.ERROR
+    assert isinstance(ex, ValueError)
+
+def test_policy_drop():
+    cb  = Recorder(blocked=True)
+    sub = IpMgrSubscribeWorkers._Subscription(cb, 1, 2, W.POLICY_DROP, None)
+    sub.dispatch(*data(0))
+    cb.running.wait(5)
+    for i in range(1, 5):
+        sub.dispatch(*data(i))
+    
+    stats = sub.getStats()
+    assert stats['dropped']       == 2
+    assert stats['queueDepth']    == 2
+    assert stats['maxQueueDepth'] == 2
+    
+    cb.release.set()
+    waitFor(lambda: sub.getStats()['notifs'] == 3)
+    assert cb.calls == [data(i) for i in range(3)]
+    assert sub.getStats()['queueDepth'] == 0
+    sub.close()
+
+def test_policy_block():
+    cb     = Recorder(blocked=True)
+    sub    = IpMgrSubscribeWorkers._Subscription(cb, 1, 1, W.POLICY_BLOCK, None)
+    sub.dispatch(*data(0))
+    cb.running.wait(5)
+    sub.dispatch(*data(1))
+    
+    thread = threading.Thread(target=sub.dispatch, args=data(2))
+    thread.start()
+    time.sleep(0.05)
+    assert thread.isAlive()
+    
+    cb.release.set()
+    thread.join(5)
+    waitFor(lambda: len(cb.calls) == 3)
+    assert cb.calls == [data(i) for i in range(3)]
+    assert sub.getStats()['dropped'] == 0
+    sub.close()
+
+def test_getStats(subscriber, connector):
+    def slow(notifName, payload):
+        time.sleep(payload)
+    events = Recorder()
+    subscriber.subscribe(W.NOTIFDATA,  slow,   False, workers=1)
+    subscriber.subscribe(W.NOTIFEVENT, events, True)
+    
+    for duration in [0.01, 0.03]:
+        connector.notifs.put(data(duration))
+    waitFor(lambda: subscriber.getStats()[W.NOTIFDATA]['notifs'] == 2)
+    
+    stats = subscriber.getStats()
+    assert sorted(stats.keys()) == [W.NOTIFDATA, W.NOTIFEVENT]
+    assert stats[W.NOTIFEVENT]['notifs']  == 0
+    assert stats[W.NOTIFDATA]['dropped']  == 0
+    assert stats[W.NOTIFDATA]['cbTimeMax'] >= 0.03
+    assert 0.02 <= stats[W.NOTIFDATA]['cbTimeAvg'] <= stats[W.NOTIFDATA]['cbTimeMax']
+
+def test_replace_in_flight(subscriber, connector):
+    old = Recorder(blocked=True)
+    new = Recorder()
+    subscriber.subscribe(W.NOTIFDATA, old, False, workers=1, maxQueued=2)
+    oldSub     = subscriber._dispatch[W.NOTIFDATA]
+    oldThreads = oldSub.threads
+    
+    # one notification in the callback, the queue full behind it
+    for i in range(3):
+        connector.notifs.put(data(i))
+    waitFor(lambda: oldSub.getStats()['queueDepth'] == 2)
+    
+    # replacing does not wait for the old callback
+    start = time.time()
+    subscriber.subscribe(W.NOTIFDATA, new, False, workers=1)
+    assert time.time()-start < 1
+    
+    for i in range(3, 5):
+        connector.notifs.put(data(i))
+    waitFor(lambda: len(new.calls) == 2)
+    assert new.calls == [data(3), data(4)]
+    
+    # the notifications already queued are handled by the old callback
+    old.release.set()
+    waitFor(lambda: len(old.calls) == 3)
+    assert old.calls == [data(i) for i in range(3)]
+    waitFor(lambda: not any(t.isAlive() for t in oldThreads))
+    assert subscriber._dispatch[W.NOTIFDATA].threads[0].isAlive()
+
+def test_finish_stops_workers(subscriber, connector):
+    finished = Recorder()
+    subscriber.subscribe(W.FINISH,    finished, True)
+    subscriber.subscribe(W.NOTIFDATA, Recorder(), False, workers=2)
+    threads = subscriber._dispatch[W.NOTIFDATA].threads
+    assert len(threads) == 2
+    
+    connector.notifs.put(None)
+    waitFor(lambda: finished.calls)
+    waitFor(lambda: not any(t.isAlive() for t in threads))
@@ -8,9 +8,9 @@ import json
 import struct
 import base64
 import time
-import copy
 import logging
 import ast
+import re
 
 # third-party packages
 import flatdict
@@ -23,6 +23,10 @@ import hr_parser
 
 OAP_PORT = 0xF0B9
 
+# fields holding a MAC address or a version, which are lists of bytes in JSON
+MAC_FIELDS      = ['macAddress', 'source', 'dest']
+VERSION_FIELDS  = ['sol_version', 'sdk_version', 'solmanager_version']
+
 # =========================== logging =========================================
 
 log = logging.getLogger(__name__)
@@ -34,6 +38,104 @@ log = logging.getLogger(__name__)
 class SolDuplicateOapNotificationException(Exception):
     pass
 
+class _StructCodec(object):
+    """
+    Precompiled codec for the value of a SOL type with a fixed structure.
+
+    The whole structure is packed/unpacked with a single struct.Struct call,
+    MAC addresses and versions are converted from/to lists of bytes.
+    """
+
+    def __init__(self, sol_struct):
+        self.fields      = sol_struct['fields']
+        self.extrafields = sol_struct.get('extrafields')
+        self.struct      = struct.Struct(sol_struct['structure'])
+        self.as_lists    = [
+            (i, name, 8 if name in MAC_FIELDS else 4)
+            for (i, name) in enumerate(self.fields)
+            if name in MAC_FIELDS+VERSION_FIELDS
+        ]
+
+    @classmethod
+    def compile(cls, sol_struct):
+        """
+        :return: the codec of the given SOL structure, None if its format
+            can't be mapped one character per field (e.g. '5p')
+        """
+        pack_format = sol_struct['structure']
+        if not pack_format[1:].isalpha() or len(pack_format)-1 != len(sol_struct['fields']):
+            return None
+        return cls(sol_struct)
+
+    def pack(self, fields):
+        """
+        :raises KeyError: if a field is missing
+        :raises struct.error: if a value can't be packed
+        """
+        pack_values = [fields[name] for name in self.fields]
+        for (i, _, _) in self.as_lists:
+            if type(pack_values[i]) == list:
+                pack_values[i] = _list_to_num(pack_values[i])
+
+        returnVal = bytearray(self.struct.pack(*pack_values))
+        if self.extrafields:
+            returnVal.extend(fields[self.extrafields])
+        return returnVal
+
+    def unpack(self, buf, offset=0):
+        """
+        :param bytearray buf: the buffer holding the value
+        :param int offset: the offset of the value in buf
+        :raises struct.error: if the buffer is shorter than the structure
+        """
+        returnVal = dict(zip(
+            self.fields,
+            self.struct.unpack_from(buf, offset),
+        ))
+        for (_, name, length) in self.as_lists:
+            returnVal[name] = _num_to_list(returnVal[name], length)
+        if self.extrafields:
+            returnVal[self.extrafields] = list(buf[offset+self.struct.size:])
+        return returnVal
+
+# one codec per SOL type, the last definition wins (as in SolDefines.solStructure)
+_CODECS = dict((s['type'], _StructCodec.compile(s)) for s in SolDefines.sol_types)
+
+# tags of the values in the binary encoding of SOL_TYPE_DUST_SNAPSHOT_2
+_S2_NONE        = 0x00
+_S2_FALSE       = 0x01
+_S2_TRUE        = 0x02
+_S2_INT8        = 0x03
+_S2_INT16       = 0x04
+_S2_INT32       = 0x05
+_S2_INT64       = 0x06
+_S2_BIGINT      = 0x07       # decimal string
+_S2_FLOAT       = 0x08       # double
+_S2_STR         = 0x09       # UTF-8 string
+_S2_MAC         = 0x0a       # string "xx-xx-xx-xx-xx-xx-xx-xx", as 8 bytes
+_S2_LIST        = 0x0b
+_S2_DICT        = 0x0c       # keys are indexes in the key table
+
+_S2_INTS        = [
+    (_S2_INT8,  struct.Struct('>b')),
+    (_S2_INT16, struct.Struct('>h')),
+    (_S2_INT32, struct.Struct('>i')),
+    (_S2_INT64, struct.Struct('>q')),
+]
+_S2_STRUCTS     = dict(_S2_INTS + [(_S2_FLOAT, struct.Struct('>d'))])
+_S2_MAC_RE      = re.compile('^[0-9a-f]{2}(-[0-9a-f]{2}){7}$')
+
+# header of the binary objects created by json_to_bytes, followed by timestamp and type
+_HEADER_SINGLE = (
+    SolDefines.SOL_HDR_V        << SolDefines.SOL_HDR_V_OFFSET |
+    SolDefines.SOL_HDR_T_SINGLE << SolDefines.SOL_HDR_T_OFFSET |
+    SolDefines.SOL_HDR_M_8BMAC  << SolDefines.SOL_HDR_M_OFFSET |
+    SolDefines.SOL_HDR_S_EPOCH  << SolDefines.SOL_HDR_S_OFFSET |
+    SolDefines.SOL_HDR_Y_1B     << SolDefines.SOL_HDR_Y_OFFSET |
+    SolDefines.SOL_HDR_L_ELIDED << SolDefines.SOL_HDR_L_OFFSET
+)
+_TIMESTAMP_TYPE = struct.Struct('>IB')
+
 def version():
     import __version__
     return [int(v) for v in __version__.__version__.split('.')]
@@ -52,40 +154,38 @@ def dust_to_json(dust_notif, mac_manager=None, timestamp=None):
     :rtype: list
     """
 
-    notif_list  = _split_dust_notif(dust_notif)
-    sol_jsonl   = []
+    return _dust_to_json(dust_notif, mac_manager, timestamp)
 
-    for d_n in notif_list:
-        # get sol_mac
-        if d_n['name'] in ['notifData', 'notifIpData']:
-            sol_mac = d_n['fields']['macAddress']
-        elif d_n['name'] in ['hr', 'oap']:
-            sol_mac = d_n['mac']
-        else:
-            sol_mac = mac_manager
+def dust_to_json_many(dust_notifs, mac_manager=None, timestamps=None, on_error=None):
+    """
+    Convert several Dust serial API notifications into a single list of JSON SOL Objects.
 
-        # get sol_type and sol_value
-        try:
-            sol_type, sol_ts, sol_value = _dust_notif_to_sol_json(d_n)
-        except SolDuplicateOapNotificationException:
-            continue
+    :param list dust_notifs: The Dust serial API notifications, see dust_to_json
+    :param list mac_manager: A list of byte containing the MAC address of the manager
+    :param list timestamps: for each notification, the Unix epoch of the message creation
+        in seconds (UTC), or None. The current time is used when None.
+    :param on_error: if set, called with (notification, exception) for each
+        notification which can't be converted, the others are still converted.
+        If None, the exception is raised.
+    :return: A list of SOL Object in JSON format, in the order of the notifications
+    :rtype: list
+    """
 
-        # get sol_ts
-        if   sol_ts:
-            pass # _dust_notif_to_sol_json() returned the ts (sol object with EPOCH ts)
-        elif timestamp is None:
-            sol_ts = int(time.time())  # timestamp in seconds
-        else:
-            sol_ts = timestamp
+    now         = int(time.time())
+    sol_jsonl   = []
 
-        # create JSON Object
-        sol_json = {
-            "mac":          sol_mac,
-            "timestamp":    sol_ts,
-            "type":         sol_type,
-            "value":        sol_value,
-        }
-        sol_jsonl.append(sol_json)
+    for (i, dust_notif) in enumerate(dust_notifs):
+        timestamp  = timestamps[i] if timestamps else None
+        try:
+            sol_jsonl += _dust_to_json(
+                dust_notif,
+                mac_manager,
+                now if timestamp is None else timestamp,
+            )
+        except Exception as err:
+            if on_error is None:
+                raise
+            on_error(dust_notif, err)
 
     return sol_jsonl
 
@@ -98,56 +198,145 @@ def json_to_bin(sol_json):
     :rtype: list
     """
 
-    sol_bin = []
+    return list(json_to_bytes(sol_json))
+
+def json_to_bin_many(sol_jsonl):
+    """
+    Convert several JSON SOL Objects into binary SOL Objects.
+
+    :param list sol_jsonl: a list of JSON SOL Objects
+    :return: the list of binary SOL Objects
+    :rtype: list
+    """
+
+    return [list(sol_bin) for sol_bin in json_to_bytes_many(sol_jsonl)]
+
+def json_to_bytes_many(sol_jsonl, on_error=None):
+    """
+    Convert several JSON SOL Objects into binary SOL Objects, as
+    json_to_bin_many, but without going through lists of bytes.
+
+    The header and MAC address are encoded once per MAC address of the batch.
+
+    :param list sol_jsonl: a list of JSON SOL Objects
+    :param on_error: if set, called with (object, exception) for each object
+        which can't be converted, which is then left out. If None, the
+        exception is raised.
+    :return: the list of binary SOL Objects
+    :rtype: list of bytearray
+    """
+
+    prefixes    = {}  # header and MAC address, per MAC address
+    sol_binl    = []
+
+    for sol_json in sol_jsonl:
+        try:
+            mac    = sol_json['mac']
+            key    = mac if isinstance(mac, basestring) else tuple(mac)
+            prefix = prefixes.get(key)
+            if prefix is None:
+                prefix = prefixes[key] = _bin_prefix(mac)
+            sol_binl += [_json_to_bytes(sol_json, bytearray(prefix))]
+        except Exception as err:
+            if on_error is None:
+                raise
+            on_error(sol_json, err)
+
+    return sol_binl
+
+def json_to_bytes(sol_json):
+    """
+    Convert a JSON SOL Object into a single binary SOL Object, as json_to_bin,
+    but without going through a list of bytes.
+
+    :param dict sol_json: a JSON SOL Object
+    :return: A single binary SOL Object
+    :rtype: bytearray
+    """
+
+    return _json_to_bytes(sol_json, _bin_prefix(sol_json['mac']))
+
+def bin_to_batch(sol_binl, timestamp=None):
+    """
+    Pack a list of binary SOL Objects into a single binary batch.
+
+    The batch header has the T bit set to multi, the S bit set to epoch and
+    the L field set to 2-byte length. It is followed by the 4-byte timestamp
+    of the batch, the 2-byte number of Objects and, for each Object, its
+    2-byte length and its complete binary representation.
+
+    :param list sol_binl: a list of binary SOL Objects, each at most
+        SOL_BATCH_MAX_LENGTH bytes long
+    :param int timestamp: the epoch timestamp of the batch, now by default
+    :return: A single binary batch
+    :rtype: list
+    """
+
+    return list(bin_to_batch_bytes(sol_binl, timestamp))
+
+def bin_to_batch_bytes(sol_binl, timestamp=None):
+    """
+    Pack a list of binary SOL Objects into a single binary batch, as
+    bin_to_batch, but without going through a list of bytes.
+
+    :param list sol_binl: a list of binary SOL Objects (lists of bytes or bytearrays)
+    :param int timestamp: the epoch timestamp of the batch, now by default
+    :return: A single binary batch
+    :rtype: bytearray
+    """
+
+    assert len(sol_binl) <= 0xffff
+
+    if timestamp is None:
+        timestamp = int(time.time())
 
     # header
     h     = 0
     h    |= SolDefines.SOL_HDR_V        << SolDefines.SOL_HDR_V_OFFSET
-    h    |= SolDefines.SOL_HDR_T_SINGLE << SolDefines.SOL_HDR_T_OFFSET
-    h    |= SolDefines.SOL_HDR_M_8BMAC  << SolDefines.SOL_HDR_M_OFFSET
+    h    |= SolDefines.SOL_HDR_T_MULTI  << SolDefines.SOL_HDR_T_OFFSET
     h    |= SolDefines.SOL_HDR_S_EPOCH  << SolDefines.SOL_HDR_S_OFFSET
-    h    |= SolDefines.SOL_HDR_Y_1B     << SolDefines.SOL_HDR_Y_OFFSET
-    h    |= SolDefines.SOL_HDR_L_ELIDED << SolDefines.SOL_HDR_L_OFFSET
-    sol_bin        += [h]
+    h    |= SolDefines.SOL_HDR_L_2B     << SolDefines.SOL_HDR_L_OFFSET
 
-    # mac
-    if isinstance(sol_json['mac'], basestring):
-        sol_bin += _format_mac_string_to_bytes(sol_json['mac'])
-    else:
-        sol_bin += sol_json['mac']
+    batch     = bytearray([h])
+    batch.extend(_num_to_list(timestamp, SolDefines.SOL_TIMESTAMP_SIZE))
+    batch.extend(_num_to_list(len(sol_binl), SolDefines.SOL_BATCH_NUMBER_SIZE))
+    for sol_bin in sol_binl:
+        assert len(sol_bin) <= SolDefines.SOL_BATCH_MAX_LENGTH
+        batch.extend(_num_to_list(len(sol_bin), SolDefines.SOL_BATCH_LENGTH_SIZE))
+        batch.extend(sol_bin)
 
-    # timestamp
-    sol_bin        += _num_to_list(sol_json['timestamp'], 4)
+    return batch
 
-    # type
-    sol_bin        += _num_to_list(sol_json['type'], 1)
+def batch_to_bin(batch):
+    """
+    Unpack a binary batch created by bin_to_batch. The timestamp of the
+    batch is skipped, each Object carries its own.
 
-    # value
-    if   sol_json['type'] == SolDefines.SOL_TYPE_DUST_NOTIF_HRNEIGHBORS:
-        sol_bin    += _get_sol_binary_value_dust_hr_neighbors(
-            sol_json['value']
-        )
-    elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_NOTIF_HRDISCOVERED:
-        sol_bin    += _get_sol_binary_value_dust_hr_discovered(
-            sol_json['value']
-        )
-    elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_NOTIF_HREXTENDED:
-        sol_bin    += _get_sol_binary_value_dust_hr_extended(
-            sol_json['value']
-        )
-    elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_SNAPSHOT:
-        sol_bin    += _get_sol_binary_value_snapshot(
-            sol_json['value']
-        )
-    elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_SNAPSHOT_2:
-        sol_bin    += [ord(c) for c in str(sol_json['value'])]
-    else:
-        sol_bin    += _fields_to_binary_with_structure(
-            sol_json['type'],
-            sol_json['value']
-        )
+    :param list batch: a binary batch
+    :return: the list of binary SOL Objects it contains
+    :rtype: list
+    """
 
-    return sol_bin
+    h     = batch[0]
+    assert (h >> SolDefines.SOL_HDR_V_OFFSET) & 0x03 == SolDefines.SOL_HDR_V
+    assert (h >> SolDefines.SOL_HDR_T_OFFSET) & 0x01 == SolDefines.SOL_HDR_T_MULTI
+    assert (h >> SolDefines.SOL_HDR_S_OFFSET) & 0x01 == SolDefines.SOL_HDR_S_EPOCH
+    assert (h >> SolDefines.SOL_HDR_L_OFFSET) & 0x03 == SolDefines.SOL_HDR_L_2B
+
+    ptr       = SolDefines.SOL_HEADER_SIZE+SolDefines.SOL_TIMESTAMP_SIZE
+    num       = _list_to_num(batch[ptr:ptr+SolDefines.SOL_BATCH_NUMBER_SIZE])
+    ptr      += SolDefines.SOL_BATCH_NUMBER_SIZE
+
+    sol_binl  = []
+    for _ in range(num):
+        length    = _list_to_num(batch[ptr:ptr+SolDefines.SOL_BATCH_LENGTH_SIZE])
+        ptr      += SolDefines.SOL_BATCH_LENGTH_SIZE
+        assert ptr+length <= len(batch)
+        sol_binl += [batch[ptr:ptr+length]]
+        ptr      += length
+    assert ptr == len(batch)
+
+    return sol_binl
 
 def bin_to_http(sol_binl):
     """
@@ -162,7 +351,7 @@ def bin_to_http(sol_binl):
     try:
         return_val = {
             "v": SolDefines.SOL_HDR_V,
-            "o": [base64.b64encode(s) for s in ("".join(chr(b) for b in sol_bin) for sol_bin in sol_binl)]
+            "o": [base64.b64encode(str(bytearray(sol_bin))) for sol_bin in sol_binl]
         }
     except:
         print sol_binl
@@ -193,12 +382,15 @@ def bin_to_json(sol_bin, mac=None):
     """
     Convert a binary SOL object into a JSON SOL Object.
 
-    :param list sol_bin: binary SOL object
+    :param sol_bin: binary SOL object, as a list of bytes, a str or a bytearray
     :param list mac: A list of byte containing the MAC address of the that created the object
     :return: JSON SOL Objects
     :rtpe: list
     """
 
+    if not isinstance(sol_bin, bytearray):
+        sol_bin = bytearray(sol_bin)
+
     sol_json = {}
 
     # header
@@ -213,7 +405,7 @@ def bin_to_json(sol_bin, mac=None):
     h_Y   = (h >> SolDefines.SOL_HDR_Y_OFFSET) & 0x01
     h_L   = (h >> SolDefines.SOL_HDR_L_OFFSET) & 0x03
 
-    sol_bin = sol_bin[1:]
+    ptr   = SolDefines.SOL_HEADER_SIZE
 
     # mac
 
@@ -221,63 +413,56 @@ def bin_to_json(sol_bin, mac=None):
         assert mac is not None
         sol_json['mac']  = _format_buffer(mac)
     else:
-        assert len(sol_bin) >= 8
-        sol_json['mac']  = _format_buffer(sol_bin[:8])
-        sol_bin          = sol_bin[8:]
+        assert len(sol_bin) >= ptr+8
+        sol_json['mac']  = _format_buffer(sol_bin[ptr:ptr+8])
+        ptr             += 8
 
-    # timestamp
+    # timestamp, type
 
     assert h_S == SolDefines.SOL_HDR_S_EPOCH
-    assert len(sol_bin) >= 4
-    sol_json['timestamp'] = _list_to_num(sol_bin[:4])
-    sol_bin = sol_bin[4:]
-
-    # type
-
     assert h_Y == SolDefines.SOL_HDR_Y_1B
-    sol_json['type'] = sol_bin[0]
-    sol_bin = sol_bin[1:]
+    assert len(sol_bin) >= ptr+_TIMESTAMP_TYPE.size
+    (sol_json['timestamp'], sol_json['type']) = _TIMESTAMP_TYPE.unpack_from(sol_bin, ptr)
+    ptr += _TIMESTAMP_TYPE.size
 
     # length
 
     if h_L == SolDefines.SOL_HDR_L_WK:
-        sol_item              = SolDefines.solStructure(sol_json['type'])
-        obj_size              = struct.calcsize(sol_item['structure'])
+        obj_size              = SolDefines.solStructureSize(sol_json['type'])
     elif h_L == SolDefines.SOL_HDR_L_1B:
-        sol_json['length']    = sol_bin[0]
-        obj_size              = sol_bin[0]
-        sol_bin               = sol_bin[1:]
+        sol_json['length']    = sol_bin[ptr]
+        obj_size              = sol_bin[ptr]
+        ptr                  += 1
     elif h_L == SolDefines.SOL_HDR_L_2B:
-        sol_json['length']    = sol_bin[:2]
-        obj_size              = sol_bin[:2]
-        sol_bin               = sol_bin[2:]
+        sol_json['length']    = list(sol_bin[ptr:ptr+2])
+        obj_size              = _list_to_num(sol_json['length'])
+        ptr                  += 2
     elif h_L == SolDefines.SOL_HDR_L_ELIDED:
-        obj_size              = len(sol_bin)
+        obj_size              = len(sol_bin)-ptr
 
     # value
-    assert len(sol_bin) == obj_size
+    assert len(sol_bin)-ptr == obj_size
     if   sol_json['type'] == SolDefines.SOL_TYPE_DUST_NOTIF_HRNEIGHBORS:
         sol_json['value'] = hr_parser.parseHr(
-            [hr_parser.HR_ID_NEIGHBORS, len(sol_bin)]+sol_bin,
+            [hr_parser.HR_ID_NEIGHBORS, obj_size]+list(sol_bin[ptr:]),
         )['Neighbors']
     elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_NOTIF_HRDISCOVERED:
         sol_json['value'] = hr_parser.parseHr(
-            [hr_parser.HR_ID_DISCOVERED, len(sol_bin)]+sol_bin,
+            [hr_parser.HR_ID_DISCOVERED, obj_size]+list(sol_bin[ptr:]),
         )['Discovered']
     elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_NOTIF_HREXTENDED:
         sol_json['value'] = hr_parser.parseHr(
-            [hr_parser.HR_ID_EXTENDED, len(sol_bin)]+sol_bin,
+            [hr_parser.HR_ID_EXTENDED, obj_size]+list(sol_bin[ptr:]),
         )['Extended']
     elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_SNAPSHOT:
-        sol_json['value'] = _binary_to_fields_snapshot(sol_bin)
-    elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_SNAPSHOT_2:
-        value_str = "".join([chr(b) for b in sol_bin])
-        value_eval = ast.literal_eval(value_str)
-        sol_json['value'] = json.loads(json.dumps(value_eval))
+        sol_json['value'] = _binary_to_fields_snapshot(list(sol_bin[ptr:]))
+    elif sol_json['type'] in [SolDefines.SOL_TYPE_DUST_SNAPSHOT_2, SolDefines.SOL_TYPE_DUST_SNAPSHOT_DELTA]:
+        sol_json['value'] = _binary_to_fields_snapshot_2(sol_bin, ptr)
     else:
-        sol_json['value'] = _binary_to_fields_with_structure(
+        sol_json['value'] = _bytes_to_fields_with_structure(
             sol_json['type'],
             sol_bin,
+            ptr,
         )
 
     return sol_json
@@ -291,8 +476,8 @@ def json_to_influxdb(sol_json, tags):
     :return: InfluxDB point
     :rtpe: list
     """
-    # tags
-    obj_tags = copy.deepcopy(tags)
+    # tags, only top-level keys are added
+    obj_tags = dict(tags)
 
     # fields
     if   sol_json['type'] == SolDefines.SOL_TYPE_DUST_NOTIF_HRNEIGHBORS:
@@ -309,17 +494,19 @@ def json_to_influxdb(sol_json, tags):
     elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_SNAPSHOT:
         fields = {"mote": []}
         for mote in sol_json["value"]:
+            mote = dict(mote)  # not to modify sol_json
             mote["macAddress"] = _format_buffer(mote["macAddress"])
+            mote["paths"] = [dict(path) for path in mote["paths"]]
             for path in mote["paths"]:
                 path["macAddress"] = _format_buffer(path["macAddress"])
             fields["mote"].append(mote)
     elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_EVENTNETWORKRESET:
         fields = {'value': 'dummy'}
     else:
-        fields = sol_json["value"]
+        fields = dict(sol_json["value"])  # not to modify sol_json
         for (k, v) in fields.items():
             if type(v) == list:  # mac
-                if k in ['macAddress', 'source', 'dest']:
+                if k in MAC_FIELDS:
                     fields[k] = _format_buffer(v)
                 elif k in ['sol_version', 'sdk_version', 'solmanager_version']:
                     fields[k] = ".".join(str(i) for i in v)
@@ -419,115 +606,229 @@ def influxdb_to_json(sol_influxdb):
             json_list.append(jdic)
     return json_list
 
+# ==== snapshots
+
+def snapshot_diff(previous, current):
+    """
+    Compute the changes from one JsonManager snapshot to the next, as a
+    dictionary with the following (optional) keys:
+    - 'set': the values which were added, or changed (other than integers)
+    - 'inc': for integers (e.g. counters), the difference with the previous value
+    - 'del': the list of keys which were removed
+    - 'sub': for dictionaries present in both, their own changes
+
+    Motes which joined or left hence appear in 'set' or 'del' of the per-mote
+    dictionaries, and a changed list (e.g. the links of a mote) is 'set' whole.
+
+    :param dict previous: the previous snapshot
+    :param dict current: the current snapshot
+    :return: the delta, {} if nothing changed
+    :rtype: dict
+    """
+    delta = {}
+    for (k, v) in current.items():
+        if k not in previous:
+            delta.setdefault('set', {})[k] = v
+            continue
+        p = previous[k]
+        if p == v and type(p) == type(v):
+            continue
+        if isinstance(p, dict) and isinstance(v, dict):
+            delta.setdefault('sub', {})[k] = snapshot_diff(p, v)
+        elif type(p) in (int, long) and type(v) in (int, long):
+            delta.setdefault('inc', {})[k] = v - p
+        else:
+            delta.setdefault('set', {})[k] = v
+    removed = [k for k in previous if k not in current]
+    if removed:
+        delta['del'] = removed
+    return delta
+
+def snapshot_apply(previous, delta):
+    """
+    Rebuild a snapshot from the previous one and a delta returned by
+    snapshot_diff. Both, or neither, can have been through
+    json_to_bytes/bin_to_json, which turns the keys into strings.
+
+    The previous snapshot is not modified, unchanged parts are shared with
+    the result.
+
+    :param dict previous: the previous snapshot
+    :param dict delta: the changes from the previous snapshot
+    :return: the current snapshot
+    :rtype: dict
+    """
+    current = dict(previous)
+    if 'del' in delta:
+        removed = set(_snapshot_key(k) for k in delta['del'])
+        for k in previous:
+            if _snapshot_key(k) in removed:
+                del current[k]
+    for (k, v) in delta.get('inc', {}).items():
+        current[k] += v
+    for (k, v) in delta.get('sub', {}).items():
+        current[k] = snapshot_apply(current[k], v)
+    current.update(delta.get('set', {}))
+    return current
+
 # ==== file manipulation
 
 def dumpToFile(sol_jsonl, file_name):
 
     with open(file_name, 'ab') as f:
-        for sol_json in sol_jsonl:
-            sol_bin = json_to_bin(sol_json)
-            sol_bin = hdlc.hdlcify(sol_bin)
-            sol_bin = ''.join([chr(b) for b in sol_bin])
-            f.write(sol_bin)
+        f.write(hdlc.hdlcifyMany(json_to_bytes_many(sol_jsonl)))
 
 def loadFromFile(file_name, start_timestamp=None, end_timestamp=None):
 
     if start_timestamp is not None or end_timestamp is not None:
         assert start_timestamp is not None and end_timestamp is not None
 
-    if start_timestamp is None:
-        # retrieve all data
+    return [
+        sol_json for (sol_json, _) in iterFromFile(
+            file_name,
+            start_timestamp = start_timestamp,
+            end_timestamp   = end_timestamp,
+        )
+    ]
 
-        (bins, _) = hdlc.dehdlcify(file_name)
+def iterFromFile(file_name, start_timestamp=None, end_timestamp=None, mac=None, types=None, offset=None):
+    """
+    Iterate over the objects of a file written by dumpToFile, decoding them
+    one by one, in constant memory.
+
+    Objects not matching mac or types are filtered on their header, before
+    being decoded. The file is assumed chronological: the first object is
+    found by binary search on start_timestamp, and the iteration stops at
+    the first object after end_timestamp.
+
+    :param str file_name: the file to read
+    :param int start_timestamp: only objects at or after that time (inclusive)
+    :param int end_timestamp: only objects at or before that time (inclusive)
+    :param mac: only objects from that MAC address (string or list of bytes)
+    :param list types: only objects of those SOL types
+    :param int offset: resume at that offset (as yielded by a previous
+        iteration), instead of searching for start_timestamp
+    :return: a generator of (sol_json, offset) tuples, where offset is the
+        cursor right after that object
+    """
 
-        sol_jsonl = []
-        for b in bins:
-            sol_jsonl += [bin_to_json(b)]
+    if isinstance(mac, basestring):
+        mac = _format_mac_string_to_bytes(mac)
+    if mac is not None:
+        mac = bytearray(mac)
+    if types is not None:
+        types = set(types)
 
-    else:
+    with open(file_name, 'rb') as f:
 
-            #=== find start_offset
+        #=== find start offset
 
-            while True:
+        if offset is None:
+            if start_timestamp is None:
+                offset = 0
+            else:
+                try:
+                    offset = _fileFindStartOffset(f, start_timestamp)
+                except IndexError:
+                    # complete file is corrupted
+                    return
 
-                start_offset = None
+        #=== read objects
 
-                def one_object(offset):
-                    (sol, offs) = hdlc.dehdlcify(file_name, fileOffset=offset, maxNum=1)
-                    sol = sol[0]
-                    sol = bin_to_json(sol)
-                    return sol, offs
+        for (sol_bin, offset) in hdlc.iterDehdlcifyBytes(f, offset):
+            (sol_mac, sol_ts, sol_type) = _bin_header(sol_bin)
+            if end_timestamp is not None and sol_ts > end_timestamp:
+                break
+            if start_timestamp is not None and sol_ts < start_timestamp:
+                continue
+            if mac is not None and sol_mac != mac:
+                continue
+            if types is not None and sol_type not in types:
+                continue
+            yield bin_to_json(sol_bin), offset
 
-                def oneTimestamp(offset):
-                    (osol, offs) = one_object(offset)
-                    return osol['timestamp'], offs
+# ======================= private =========================================
 
-                #=== get boundaries
+def _bin_prefix(mac):
+    # header, mac
+    sol_bin         = bytearray([_HEADER_SINGLE])
+    if isinstance(mac, basestring):
+        sol_bin    += bytearray.fromhex(mac.replace('-', ''))
+    else:
+        sol_bin.extend(mac)
+    return sol_bin
 
-                left_offset_start = 0
-                try:
-                    (left_timestamp, left_offset_stop) = oneTimestamp(left_offset_start)
-                except IndexError:
-                    # complete file is corrupted
-                    return []
-                with open(file_name, 'rb') as f:
-                    f.seek(0, os.SEEK_END)
-                    right_offset_start = f.tell()
-                while True:
-                    right_offset_start = _fileBackUpUntilStartFrame(file_name, right_offset_start)
-                    try:
-                        (right_timestamp, right_offset_stop) = oneTimestamp(right_offset_start)
-                    except IndexError:
-                        right_offset_start -= 1
-                    else:
-                        break
-
-                if left_timestamp > start_timestamp:
-                    start_offset = left_timestamp
-                    break
-                if right_timestamp < start_timestamp:
-                    start_offset = right_timestamp
-                    break
-
-                #=== binary search
-
-                while left_offset_stop < right_offset_start-1:
-
-                    cur_offset_start = int((right_offset_start-left_offset_start)/2+left_offset_start)
-                    (cur_timestamp, cur_offset_stop) = oneTimestamp(cur_offset_start)
-
-                    if cur_timestamp == start_timestamp:
-                        start_offset = cur_offset_start
-                        break
-                    elif cur_timestamp > start_timestamp:
-                        right_offset_start = cur_offset_start
-                    elif cur_timestamp < start_timestamp:
-                        left_offset_start  = cur_offset_start
-                        left_offset_stop   = cur_offset_stop
-
-                if start_offset is None:
-                    start_offset = left_offset_start
+def _json_to_bytes(sol_json, sol_bin):
+    # sol_bin holds the header and mac (see _bin_prefix)
 
-                break
+    # timestamp, type
+    sol_bin        += _TIMESTAMP_TYPE.pack(sol_json['timestamp'], sol_json['type'])
 
-            #=== read objects
+    # value
+    if   sol_json['type'] == SolDefines.SOL_TYPE_DUST_NOTIF_HRNEIGHBORS:
+        sol_bin.extend(_get_sol_binary_value_dust_hr_neighbors(
+            sol_json['value']
+        ))
+    elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_NOTIF_HRDISCOVERED:
+        sol_bin.extend(_get_sol_binary_value_dust_hr_discovered(
+            sol_json['value']
+        ))
+    elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_NOTIF_HREXTENDED:
+        sol_bin.extend(_get_sol_binary_value_dust_hr_extended(
+            sol_json['value']
+        ))
+    elif sol_json['type'] == SolDefines.SOL_TYPE_DUST_SNAPSHOT:
+        sol_bin.extend(_get_sol_binary_value_snapshot(
+            sol_json['value']
+        ))
+    elif sol_json['type'] in [SolDefines.SOL_TYPE_DUST_SNAPSHOT_2, SolDefines.SOL_TYPE_DUST_SNAPSHOT_DELTA]:
+        sol_bin    += _get_sol_binary_value_snapshot_2(sol_json['value'])
+    else:
+        sol_bin    += _fields_to_bytes_with_structure(
+            sol_json['type'],
+            sol_json['value']
+        )
 
-            sol_jsonl = []
+    return sol_bin
 
-            curOffset = start_offset
-            while True:
-                try:
-                    (o, curOffset) = one_object(curOffset)
-                except IndexError:
-                    # we have passed the end of the file
-                    break
-                if o['timestamp'] > end_timestamp:
-                    break
-                sol_jsonl += [o]
+def _dust_to_json(dust_notif, mac_manager, timestamp):
 
-    return sol_jsonl
+    notif_list  = _split_dust_notif(dust_notif)
+    sol_jsonl   = []
 
-# ======================= private =========================================
+    for d_n in notif_list:
+        # get sol_mac
+        if d_n['name'] in ['notifData', 'notifIpData']:
+            sol_mac = d_n['fields']['macAddress']
+        elif d_n['name'] in ['hr', 'oap']:
+            sol_mac = d_n['mac']
+        else:
+            sol_mac = mac_manager
+
+        # get sol_type and sol_value
+        try:
+            sol_type, sol_ts, sol_value = _dust_notif_to_sol_json(d_n)
+        except SolDuplicateOapNotificationException:
+            continue
+
+        # get sol_ts
+        if   sol_ts:
+            pass # _dust_notif_to_sol_json() returned the ts (sol object with EPOCH ts)
+        elif timestamp is None:
+            sol_ts = int(time.time())  # timestamp in seconds
+        else:
+            sol_ts = timestamp
+
+        # create JSON Object
+        sol_json = {
+            "mac":          sol_mac,
+            "timestamp":    sol_ts,
+            "type":         sol_type,
+            "value":        sol_value,
+        }
+        sol_jsonl.append(sol_json)
+
+    return sol_jsonl
 
 def _split_dust_notif(dust_notif):
     """
@@ -610,10 +911,8 @@ def _split_dust_notif(dust_notif):
         for hrName in notif_keys:
             assert hrName in hr_type_list
         for hrName in notif_keys:
-            dust_notif_copy = copy.deepcopy(dust_notif)
-            for hr_type in [t for t in notif_keys if t != hrName]:
-                del dust_notif_copy['hr'][hr_type]
-            notif_list += [dust_notif_copy]
+            # same notification, with only that HR; everything else is shared
+            notif_list += [dict(dust_notif, hr={hrName: dust_notif['hr'][hrName]})]
     else:
         notif_list += [dust_notif]
 
@@ -634,6 +933,9 @@ def _dust_notif_to_sol_json(dust_notif):
     elif dust_notif['name'] == 'snapshot':
         sol_type = SolDefines.SOL_TYPE_DUST_SNAPSHOT_2
         sol_value = dust_notif
+    elif dust_notif['name'] == 'snapshotDelta':
+        sol_type = SolDefines.SOL_TYPE_DUST_SNAPSHOT_DELTA
+        sol_value = dust_notif
     else:
         (sol_type, sol_value) = _dust_other_notif_to_sol_json(dust_notif)
 
@@ -660,10 +962,10 @@ def _dust_notifData_to_sol_json(dust_notif):
         # notifData contains does NOT contain neither OAP nor SOL
 
         sol_type  = SolDefines.SOL_TYPE_DUST_NOTIFDATA
-        sol_value = copy.deepcopy(dust_notif['fields'])
-        del(sol_value['macAddress'])
-        del(sol_value['utcSecs'])
-        del(sol_value['utcUsecs'])
+        sol_value = dict(
+            (k, v) for (k, v) in dust_notif['fields'].items()
+            if k not in ['macAddress', 'utcSecs', 'utcUsecs']
+        )
 
     return sol_type, sol_ts, sol_value
 
@@ -763,7 +1065,7 @@ def _fields_to_json_with_structure(sol_type, dust_notif):
     returnVal       = {}
     for name in sol_struct['fields']:
         returnVal[name] = dust_notif['fields'][name]
-        if name in ['source', 'dest', 'macAddress']:
+        if name in MAC_FIELDS:
             returnVal[name] = _format_mac_string_to_bytes(returnVal[name])
     if 'extrafields' in sol_struct:
         returnVal[sol_struct['extrafields']] = dust_notif['fields'][sol_struct['extrafields']]
@@ -774,7 +1076,21 @@ def _fields_to_json_with_structure(sol_type, dust_notif):
 
     return returnVal
 
+def _fields_to_bytes_with_structure(sol_type, fields):
+
+    codec = _CODECS.get(sol_type)
+    if codec:
+        try:
+            return codec.pack(fields)
+        except (KeyError, struct.error):
+            pass  # missing fields, or unexpected values, see below
+
+    return bytearray(_fields_to_binary_field_by_field(sol_type, fields))
+
 def _fields_to_binary_with_structure(sol_type, fields):
+    return list(_fields_to_bytes_with_structure(sol_type, fields))
+
+def _fields_to_binary_field_by_field(sol_type, fields):
 
     sol_struct      = SolDefines.solStructure(sol_type)
 
@@ -796,7 +1112,19 @@ def _fields_to_binary_with_structure(sol_type, fields):
 
     return returnVal
 
+def _bytes_to_fields_with_structure(sol_type, buf, offset=0):
+
+    codec = _CODECS.get(sol_type)
+    if codec and len(buf)-offset >= codec.struct.size:
+        return codec.unpack(buf, offset)
+
+    # truncated binary, or no codec: unpack field by field
+    return _binary_to_fields_field_by_field(sol_type, list(buf[offset:]))
+
 def _binary_to_fields_with_structure(sol_type, binary):
+    return _bytes_to_fields_with_structure(sol_type, bytearray(binary))
+
+def _binary_to_fields_field_by_field(sol_type, binary):
 
     sol_struct      = SolDefines.solStructure(sol_type)
 
@@ -821,9 +1149,9 @@ def _binary_to_fields_with_structure(sol_type, binary):
         returnVal[sol_struct['extrafields']] = binary[pack_length:]
 
     for (k, v) in returnVal.items():
-        if k in ['macAddress', 'source', 'dest']:
+        if k in MAC_FIELDS:
             returnVal[k] = _num_to_list(v, 8)
-        elif k in ['sol_version', 'sdk_version', 'solmanager_version']:
+        elif k in VERSION_FIELDS:
             returnVal[k] = _num_to_list(v, 4)
 
     return returnVal
@@ -997,16 +1325,254 @@ def _get_sol_binary_value_snapshot(snapshot):
     return_val  = [ord(c) for c in return_val]
     return return_val
 
+# snapshot 2
+
+def _get_sol_binary_value_snapshot_2(snapshot):
+    """
+    Encode a JsonManager snapshot (any JSON-like value), as:
+    version (1B) | number of keys | keys | value
+
+    Numbers are varints. Each dictionary key is written once in the key
+    table, and referenced by its index. A value is a 1-byte tag (_S2_*),
+    followed by its content.
+
+    :rtype: str
+    """
+    keys        = {}
+    value       = []
+    _snapshot_2_encode(snapshot, keys, value)
+
+    return_val  = [chr(SolDefines.SOL_SNAPSHOT_2_VERSION), _varint(len(keys))]
+    for (k, _) in sorted(keys.items(), key=lambda i: i[1]):
+        return_val += [_varint(len(k)), k]
+    return ''.join(return_val + value)
+
+def _snapshot_2_encode(v, keys, out):
+    if v is None:
+        out += [chr(_S2_NONE)]
+    elif v is True:
+        out += [chr(_S2_TRUE)]
+    elif v is False:
+        out += [chr(_S2_FALSE)]
+    elif isinstance(v, (int, long)):
+        for (tag, s) in _S2_INTS:
+            try:
+                out += [chr(tag), s.pack(v)]
+                break
+            except struct.error:
+                pass
+        else:
+            out += [chr(_S2_BIGINT), _varint(len(str(v))), str(v)]
+    elif isinstance(v, float):
+        out += [chr(_S2_FLOAT), _S2_STRUCTS[_S2_FLOAT].pack(v)]
+    elif isinstance(v, basestring):
+        if _S2_MAC_RE.match(v):
+            out += [chr(_S2_MAC), str(bytearray.fromhex(v.replace('-', '')))]
+        else:
+            if isinstance(v, unicode):
+                v = v.encode('utf-8')
+            out += [chr(_S2_STR), _varint(len(v)), v]
+    elif isinstance(v, (list, tuple)):
+        out += [chr(_S2_LIST), _varint(len(v))]
+        for i in v:
+            _snapshot_2_encode(i, keys, out)
+    elif isinstance(v, dict):
+        out += [chr(_S2_DICT), _varint(len(v))]
+        for (k, i) in v.items():
+            k = _snapshot_key(k)
+            if k not in keys:
+                keys[k] = len(keys)
+            out += [_varint(keys[k])]
+            _snapshot_2_encode(i, keys, out)
+    else:
+        raise TypeError("can't encode {0!r} in a snapshot".format(v))
+
+def _snapshot_key(k):
+    # keys are strings, as in JSON
+    if isinstance(k, unicode):
+        return k.encode('utf-8')
+    elif not isinstance(k, str):
+        return json.dumps(k)
+    return k
+
+def _binary_to_fields_snapshot_2(buf, ptr):
+    """
+    Decode a snapshot encoded by _get_sol_binary_value_snapshot_2, or
+    written as a Python literal by older versions. Strings are unicode.
+
+    :param bytearray buf: the buffer holding the snapshot
+    :param int ptr: the offset of the snapshot in buf
+    """
+    if buf[ptr] == ord('{'):
+        # Python literal
+        value_eval = ast.literal_eval(str(buf[ptr:]))
+        return json.loads(json.dumps(value_eval))
+
+    assert buf[ptr] == SolDefines.SOL_SNAPSHOT_2_VERSION
+    ptr += 1
+
+    (num_keys, ptr) = _read_varint(buf, ptr)
+    keys            = []
+    for _ in range(num_keys):
+        (length, ptr) = _read_varint(buf, ptr)
+        keys         += [buf[ptr:ptr+length].decode('utf-8')]
+        ptr          += length
+
+    (value, ptr) = _snapshot_2_decode(buf, ptr, keys)
+    assert ptr == len(buf)
+    return value
+
+def _snapshot_2_decode(buf, ptr, keys):
+    tag  = buf[ptr]
+    ptr += 1
+    if   tag == _S2_DICT:
+        (num, ptr) = _read_varint(buf, ptr)
+        v = {}
+        for _ in range(num):
+            (k, ptr)     = _read_varint(buf, ptr)
+            (v[keys[k]], ptr) = _snapshot_2_decode(buf, ptr, keys)
+    elif tag == _S2_LIST:
+        (num, ptr) = _read_varint(buf, ptr)
+        v = []
+        for _ in range(num):
+            (i, ptr) = _snapshot_2_decode(buf, ptr, keys)
+            v.append(i)
+    elif tag in _S2_STRUCTS:
+        s    = _S2_STRUCTS[tag]
+        v    = s.unpack_from(buf, ptr)[0]
+        ptr += s.size
+    elif tag == _S2_STR:
+        (length, ptr) = _read_varint(buf, ptr)
+        v    = buf[ptr:ptr+length].decode('utf-8')
+        ptr += length
+    elif tag == _S2_MAC:
+        v    = unicode(_format_buffer(buf[ptr:ptr+8]))
+        ptr += 8
+    elif tag == _S2_NONE:
+        v    = None
+    elif tag == _S2_TRUE:
+        v    = True
+    elif tag == _S2_FALSE:
+        v    = False
+    elif tag == _S2_BIGINT:
+        (length, ptr) = _read_varint(buf, ptr)
+        v    = int(str(buf[ptr:ptr+length]))
+        ptr += length
+    else:
+        raise ValueError("unknown snapshot tag {0}".format(tag))
+    return v, ptr
+
+def _varint(num):
+    # unsigned LEB128
+    return_val = []
+    while num >= 0x80:
+        return_val += [chr(0x80 | (num & 0x7f))]
+        num >>= 7
+    return_val += [chr(num)]
+    return ''.join(return_val)
+
+def _read_varint(buf, ptr):
+    num   = 0
+    shift = 0
+    while True:
+        b      = buf[ptr]
+        ptr   += 1
+        num   |= (b & 0x7f) << shift
+        shift += 7
+        if not b & 0x80:
+            return num, ptr
+
 # ==== file manipulation
 
-def _fileBackUpUntilStartFrame(file_name, curOffset):
-    with open(file_name, 'rb') as f:
-        f.seek(curOffset, os.SEEK_SET)
-        while True:
-            byte = f.read(1)
-            if byte == hdlc.HDLC_FLAG:
-                return f.tell()-1
-            f.seek(-2, os.SEEK_CUR)
+def _bin_header(sol_bin):
+    """
+    Read the MAC, timestamp and type of a binary SOL object, without
+    decoding its value.
+
+    :return: (mac, timestamp, type), mac being None if elided
+    :rtype: tuple
+    """
+    h     = sol_bin[0]
+    ptr   = SolDefines.SOL_HEADER_SIZE
+    if (h >> SolDefines.SOL_HDR_M_OFFSET) & 0x01 == SolDefines.SOL_HDR_M_8BMAC:
+        mac  = sol_bin[ptr:ptr+8]
+        ptr += 8
+    else:
+        mac  = None
+    timestamp = _list_to_num(sol_bin[ptr:ptr+SolDefines.SOL_TIMESTAMP_SIZE])
+    ptr      += SolDefines.SOL_TIMESTAMP_SIZE
+    return mac, timestamp, sol_bin[ptr]
+
+def _fileOneObject(f, offset):
+    """
+    :return: the first valid object at or after offset, and the offset right after it
+    :raises IndexError: if there is no valid object after offset
+    """
+    for (sol_bin, next_offset) in hdlc.iterDehdlcifyBytes(f, offset):
+        return bin_to_json(sol_bin), next_offset
+    raise IndexError("no object after offset {0}".format(offset))
+
+def _fileFindStartOffset(f, start_timestamp):
+    """
+    Binary search the offset of the first object with a timestamp at or after
+    start_timestamp, in a file written chronologically.
+    """
+
+    #=== get boundaries
+
+    left_offset_start = 0
+    (left_json, left_offset_stop) = _fileOneObject(f, left_offset_start)
+    left_timestamp = left_json['timestamp']
+
+    f.seek(0, os.SEEK_END)
+    right_offset_start = f.tell()
+    while True:
+        right_offset_start = _fileBackUpUntilStartFrame(f, right_offset_start)
+        try:
+            (right_json, right_offset_stop) = _fileOneObject(f, right_offset_start)
+        except IndexError:
+            right_offset_start -= 1
+        else:
+            break
+    right_timestamp = right_json['timestamp']
+
+    if left_timestamp >= start_timestamp:
+        return left_offset_start
+    if right_timestamp < start_timestamp:
+        return right_offset_stop
+
+    #=== binary search
+
+    # objects before left_offset_stop are before start_timestamp, the object
+    # at right_offset_start is at or after it; several objects may share
+    # start_timestamp, so a match still narrows down to the first one
+    while left_offset_stop < right_offset_start-1:
+
+        cur_offset_start = int((right_offset_start-left_offset_start)/2+left_offset_start)
+        (cur_json, cur_offset_stop) = _fileOneObject(f, cur_offset_start)
+        cur_timestamp = cur_json['timestamp']
+
+        if cur_timestamp >= start_timestamp:
+            right_offset_start = cur_offset_start
+        else:
+            left_offset_start  = cur_offset_start
+            left_offset_stop   = cur_offset_stop
+
+    return left_offset_stop
+
+def _fileBackUpUntilStartFrame(f, curOffset):
+    """
+    :return: the offset of the last HDLC flag at or before curOffset
+    """
+    end = curOffset+1
+    while end > 0:
+        start = max(0, end-hdlc.BLOCK_SIZE)
+        f.seek(start, os.SEEK_SET)
+        flag = f.read(end-start).rfind(hdlc.HDLC_FLAG)
+        if flag != -1:
+            return start+flag
+        end = start
+    raise IndexError("no HDLC flag before offset {0}".format(curOffset))
 
 # ==== miscellaneous helpers
 
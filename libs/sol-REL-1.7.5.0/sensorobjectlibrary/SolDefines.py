@@ -1,5 +1,5 @@
 from math import sqrt as sqrt
-import sys
+import struct
 
 SOL_PORT                                    = 0xf0ba
 
@@ -66,19 +66,19 @@ SOL_TYPE_SENS_GS1_I1MV2                     = 0x46
 SOL_TYPE_SENS_MICROWAVE_MOTION              = 0x47
 SOL_TYPE_SENS_INDUCTION_CURRENT_C_SOURCE    = 0x48
 SOL_TYPE_SENS_INDUCTION_CURRENT_V_SOURCE    = 0x49
+SOL_TYPE_DUST_SNAPSHOT_DELTA                = 0x4a
 
 def sol_type_to_type_name(type_id):
-    SolDefines = sys.modules[__name__]
-    for n in dir(SolDefines):
-        if n.startswith('SOL_TYPE_') and getattr(SolDefines, n) == type_id:
-            return n
-    raise ValueError("SOL type %s does not exist" % type_id)
+    try:
+        return _name_by_type[type_id]
+    except (KeyError, TypeError):
+        raise ValueError("SOL type %s does not exist" % type_id)
 
 def sol_name_to_type(type_name):
-    SolDefines = sys.modules[__name__]
-    if type_name in dir(SolDefines):
-        return getattr(SolDefines, type_name)
-    raise ValueError("SOL object name %s does not exist" % type_name)
+    try:
+        return _type_by_name[type_name]
+    except (KeyError, TypeError):
+        raise ValueError("SOL object name %s does not exist" % type_name)
 
 def solStructure(type_id):
     """
@@ -92,13 +92,26 @@ def solStructure(type_id):
     if isinstance(type_id, basestring):
         type_id = sol_name_to_type(type_id)
 
-    sol_item = {}
-    for item in sol_types:
-        if item['type'] == type_id:
-            sol_item = item
-    if any(sol_item):
-        return sol_item
-    else:
+    try:
+        return _structure_by_type[type_id]
+    except (KeyError, TypeError):
+        raise ValueError("SOL structure not found for given id:%s" % type_id)
+
+def solStructureSize(type_id):
+    """
+    Return the size in bytes of the SOL structure of the given type id,
+    i.e. struct.calcsize() of its 'structure'.
+    If the element is not found, it raises a ValueError.
+
+    :param int|str type_id:
+    :rtype: int
+    """
+    if isinstance(type_id, basestring):
+        type_id = sol_name_to_type(type_id)
+
+    try:
+        return _size_by_type[type_id]
+    except (KeyError, TypeError):
         raise ValueError("SOL structure not found for given id:%s" % type_id)
 
 ### Dust Constants
@@ -152,6 +165,17 @@ SOL_TIMESTAMP_SIZE      = 4
 SOL_TIMESTAMP_OFFSET    = 1
 SOL_OBJNUMBER_SIZE      = 1
 
+### Batch of complete SOL Objects (uplink to the server)
+
+SOL_BATCH_NUMBER_SIZE   = 2
+SOL_BATCH_LENGTH_SIZE   = 2
+SOL_BATCH_MAX_LENGTH    = 0xffff
+
+### Binary encoding of SOL_TYPE_DUST_SNAPSHOT_2 and SOL_TYPE_DUST_SNAPSHOT_DELTA
+### (older snapshots start with '{')
+
+SOL_SNAPSHOT_2_VERSION  = 0x01
+
 ### type definitions
 
 sol_types = [
@@ -681,3 +705,22 @@ sol_types = [
         ],
     },
 ]
+
+### Indexes, built once
+
+# name -> type, for all SOL_TYPE_* names
+_type_by_name           = dict(
+    (n, v) for (n, v) in globals().items() if n.startswith('SOL_TYPE_')
+)
+
+# type -> name, the first name in alphabetical order when a type has several
+_name_by_type           = {}
+for _n in sorted(_type_by_name, reverse=True):
+    _name_by_type[_type_by_name[_n]] = _n
+del _n
+
+# type -> structure and its size, the last definition wins when a type has several
+_structure_by_type      = dict((item['type'], item) for item in sol_types)
+_size_by_type           = dict(
+    (t, struct.calcsize(item['structure'])) for (t, item) in _structure_by_type.items()
+)
@@ -0,0 +1,426 @@
+#!/usr/bin/python
+
+"""
+Bulk export of SOL Objects (e.g. read from a backup file) to other formats.
+"""
+
+# =========================== imports =========================================
+
+# from default Python
+import os
+import json
+import mmap
+import struct
+import logging
+
+# third-party packages
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import Sol as sol
+import SolDefines
+import SolStore
+import openhdlc as hdlc
+
+# =========================== defines =========================================
+
+INFLUXDB_CHUNK_SIZE     = 5000      # objects of the same type converted at once
+
+COLUMNS_CHUNK_SIZE      = 10000     # objects of the same type held in memory before being written
+COLUMNS_SCHEMA          = 'schema.json'
+COLUMNS_EXT             = '.col'
+
+# MAC and timestamp of the binary objects written by dumpToFile, and offset of their value
+_MAC_TIMESTAMP          = struct.Struct('>QI')
+_VALUE_OFFSET           = SolDefines.SOL_HEADER_SIZE+8+SolDefines.SOL_TIMESTAMP_SIZE+1
+
+# types which json_to_influxdb converts specifically, never exported column-wise
+_INFLUXDB_SPECIFIC_TYPES = [
+    SolDefines.SOL_TYPE_DUST_NOTIF_HRNEIGHBORS,
+    SolDefines.SOL_TYPE_DUST_NOTIF_HRDISCOVERED,
+    SolDefines.SOL_TYPE_DUST_NOTIF_HREXTENDED,
+    SolDefines.SOL_TYPE_DUST_SNAPSHOT,
+    SolDefines.SOL_TYPE_DUST_EVENTNETWORKRESET,
+]
+
+# =========================== logging =========================================
+
+log = logging.getLogger(__name__)
+
+# =========================== public ==========================================
+
+# ==== InfluxDB line protocol
+
+def json_to_influxdb_lines(sol_jsonl, tags, chunk_size=INFLUXDB_CHUNK_SIZE):
+    """
+    Convert JSON SOL Objects into InfluxDB line protocol, with the same
+    points as json_to_influxdb.
+
+    The Objects are grouped by SOL type, and each group of chunk_size
+    Objects is converted column-wise: the 'apply' functions of the type are
+    called per column (on NumPy arrays when available), and the lines are
+    assembled from the formatted columns.
+
+    :param sol_jsonl: an iterable of JSON SOL Objects, e.g. sol.iterFromFile()
+    :param dict tags: tags of all points, the MAC address of each Object is
+        added as tag 'mac'
+    :param int chunk_size: number of Objects of the same type converted at once
+    :return: a generator of strings, each holding complete lines
+    """
+    groups = {}
+    for sol_json in sol_jsonl:
+        group = groups.setdefault(sol_json['type'], [])
+        group.append(sol_json)
+        if len(group) >= chunk_size:
+            del groups[sol_json['type']]
+            yield _influxdb_lines(sol_json['type'], group, tags)
+    for (sol_type, group) in groups.items():
+        yield _influxdb_lines(sol_type, group, tags)
+
+def influxdb_to_line(sol_influxdb):
+    """
+    Format an InfluxDB point, as returned by json_to_influxdb, as a line of
+    the InfluxDB line protocol. Tags and fields are sorted by key, as by the
+    influxdb client, None values are omitted.
+
+    :param dict sol_influxdb: the InfluxDB point
+    :return: the line, terminated by a newline
+    :rtype: str
+    """
+    tags   = [
+        '{0}={1}'.format(_escape_tag(k), _escape_tag(v))
+        for (k, v) in sorted(sol_influxdb['tags'].items())
+        if v is not None and v != ''
+    ]
+    fields = [
+        '{0}={1}'.format(_escape_tag(k), _field_value(v))
+        for (k, v) in sorted(sol_influxdb['fields'].items())
+        if v is not None
+    ]
+    return '{0} {1} {2}\n'.format(
+        ','.join([_escape_measurement(sol_influxdb['measurement'])] + tags),
+        ','.join(fields),
+        sol_influxdb['time'],
+    )
+
+# ==== columns
+
+def dumpToColumns(file_name, dir_name, types=None, chunk_size=COLUMNS_CHUNK_SIZE):
+    """
+    Write the objects of a file written by dumpToFile, or of a SolStore
+    directory, as columns, see ColumnsWriter. Objects are not converted to
+    JSON.
+
+    :param str file_name: the file or SolStore directory to read
+    :param str dir_name: the directory to write the columns to
+    :param list types: only objects of those SOL types
+    :param int chunk_size: objects of the same type held in memory
+    :return: the writer, holding the number of objects written and skipped per type
+    :rtype: ColumnsWriter
+    """
+    if types is not None:
+        types = set(types)
+
+    writer = ColumnsWriter(dir_name, chunk_size)
+    if os.path.isdir(file_name):
+        # the index of the segments selects the types
+        for sol_bin in SolStore.SolStore(file_name).iterLoadBin(types=types):
+            writer.append(sol_bin)
+    else:
+        with open(file_name, 'rb') as f:
+            for (sol_bin, _) in hdlc.iterDehdlcifyBytes(f):
+                if types is not None and sol._bin_header(sol_bin)[2] not in types:
+                    continue
+                writer.append(sol_bin)
+    writer.close()
+    return writer
+
+class ColumnsWriter(object):
+    """
+    Write binary SOL Objects of types with a fixed structure as columns, one
+    directory per type ("<type name>/"), holding:
+    - one file per column ("<column>.col"): 'mac', 'timestamp' then the
+      fields of the type, as packed little-endian values
+    - the description of the columns ("schema.json"): their names and struct
+      formats, and the number of rows
+
+    The values are unpacked with the structure of the type, and written
+    column by column every chunk_size objects of that type.
+    """
+
+    def __init__(self, dir_name, chunk_size=COLUMNS_CHUNK_SIZE):
+        """
+        :param str dir_name: the directory to write the columns to, created if needed
+        :param int chunk_size: objects of the same type held in memory
+        """
+        # store params
+        self.dir_name   = dir_name
+        self.chunk_size = chunk_size
+
+        # local variables
+        self.tables     = {}      # per SOL type, its _ColumnsTable
+        self.skipped    = {}      # per SOL type, the number of objects not written
+
+        if not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+
+    def append(self, sol_bin):
+        """
+        :param bytearray sol_bin: a single binary SOL Object, with a MAC
+            address, an epoch timestamp and elided length (as written by dumpToFile)
+        """
+        if sol_bin[0] != sol._HEADER_SINGLE:
+            self._skip(sol._bin_header(sol_bin)[2])
+            return
+
+        sol_type = sol_bin[_VALUE_OFFSET-1]
+        table    = self.tables.get(sol_type)
+        if table is None:
+            codec = sol._CODECS.get(sol_type)
+            if codec is None or codec.extrafields:
+                self._skip(sol_type)
+                return
+            table = _ColumnsTable(self.dir_name, sol_type, codec)
+            self.tables[sol_type] = table
+
+        if len(sol_bin) != _VALUE_OFFSET+table.codec.struct.size:
+            self._skip(sol_type)
+            return
+        table.rows += [
+            _MAC_TIMESTAMP.unpack_from(sol_bin, SolDefines.SOL_HEADER_SIZE) +
+            table.codec.struct.unpack_from(sol_bin, _VALUE_OFFSET)
+        ]
+        if len(table.rows) >= self.chunk_size:
+            table.flush()
+
+    def close(self):
+        """
+        Write the remaining rows and the schema of each type.
+        """
+        for table in self.tables.values():
+            table.close()
+
+    def _skip(self, sol_type):
+        self.skipped[sol_type] = self.skipped.get(sol_type, 0)+1
+
+class ColumnsReader(object):
+    """
+    Read the columns of a SOL type written by ColumnsWriter.
+
+    Column files are memory-mapped, so only the columns read are loaded.
+    With NumPy, a column is an array backed by the mapped file, without copy.
+    """
+
+    def __init__(self, dir_name, sol_type):
+        """
+        :param str dir_name: the directory the columns were written to
+        :param sol_type: the SOL type, or its name
+        """
+        if not isinstance(sol_type, basestring):
+            sol_type = SolDefines.sol_type_to_type_name(sol_type)
+        self.dir_name   = os.path.join(dir_name, sol_type)
+        with open(os.path.join(self.dir_name, COLUMNS_SCHEMA), 'r') as f:
+            self.schema = json.load(f)
+        self.num_rows   = self.schema['rows']
+        self._formats   = dict((c['name'], str(c['format'])) for c in self.schema['columns'])
+        self._maps      = {}      # per column, its mapped file
+
+    def columns(self):
+        """
+        :return: the names of the columns, in order
+        :rtype: list
+        """
+        return [c['name'] for c in self.schema['columns']]
+
+    def column(self, name):
+        """
+        :param str name: the name of the column
+        :return: the values of the column, a read-only numpy array if NumPy
+            is available, a tuple otherwise
+        :raises KeyError: if there is no such column
+        """
+        column_format = self._formats[name]
+        if self.num_rows == 0:
+            return numpy.empty(0, column_format) if numpy is not None else ()
+        if name not in self._maps:
+            with open(os.path.join(self.dir_name, name+COLUMNS_EXT), 'rb') as f:
+                self._maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if numpy is not None:
+            return numpy.frombuffer(self._maps[name], column_format, self.num_rows)
+        return struct.unpack_from('<{0}{1}'.format(self.num_rows, column_format[1:]), self._maps[name])
+
+# =========================== private =========================================
+
+class _ColumnsTable(object):
+    """
+    The columns of a SOL type being written by ColumnsWriter.
+    """
+
+    def __init__(self, dir_name, sol_type, codec):
+        self.codec      = codec
+        self.sol_type   = sol_type
+        self.dir_name   = os.path.join(dir_name, SolDefines.sol_type_to_type_name(sol_type))
+        self.names      = ['mac', 'timestamp'] + codec.fields
+        # standard sizes, e.g. 'L' is 4 bytes in a struct but 8 in an array
+        self.formats    = ['Q', 'I'] + [
+            {'l': 'i', 'L': 'I'}.get(c, c) for c in codec.struct.format[1:]
+        ]
+        self.rows       = []      # rows not written yet
+        self.num_rows   = 0
+
+        if not os.path.isdir(self.dir_name):
+            os.makedirs(self.dir_name)
+        self.files      = [open(os.path.join(self.dir_name, n+COLUMNS_EXT), 'wb') for n in self.names]
+
+    def flush(self):
+        if not self.rows:
+            return
+        for (f, column_format, column) in zip(self.files, self.formats, zip(*self.rows)):
+            f.write(struct.pack('<{0}{1}'.format(len(column), column_format), *column))
+        self.num_rows  += len(self.rows)
+        self.rows       = []
+
+    def close(self):
+        self.flush()
+        for f in self.files:
+            f.close()
+        with open(os.path.join(self.dir_name, COLUMNS_SCHEMA), 'w') as f:
+            json.dump(
+                {
+                    'type':     self.sol_type,
+                    'name':     SolDefines.sol_type_to_type_name(self.sol_type),
+                    'rows':     self.num_rows,
+                    'columns':  [
+                        {'name': n, 'format': '<'+c} for (n, c) in zip(self.names, self.formats)
+                    ],
+                },
+                f,
+                indent=4,
+            )
+
+def _influxdb_lines(sol_type, sol_jsonl, tags):
+    """
+    :return: the lines of Objects all of type sol_type
+    :rtype: str
+    """
+    try:
+        columns = _influxdb_columns(sol_type, sol_jsonl)
+    except (KeyError, ValueError) as err:
+        log.debug("converting SOL type {0} object by object: {1!r}".format(sol_type, err))
+        columns = None
+
+    if columns is None:
+        return ''.join(
+            influxdb_to_line(sol.json_to_influxdb(sol_json, dict(tags, mac=sol_json['mac'])))
+            for sol_json in sol_jsonl
+        )
+
+    (tag_columns, field_columns) = columns
+    tag_columns                  = dict(
+        [(k, [v]*len(sol_jsonl)) for (k, v) in tags.items()] +
+        [('mac', [sol_json['mac'] for sol_json in sol_jsonl])] +
+        tag_columns.items()
+    )
+
+    # format each column, None when not in the line
+    formatted = [[_escape_measurement(SolDefines.sol_type_to_type_name(sol_type))]*len(sol_jsonl)]
+    for (k, column) in sorted(tag_columns.items()):
+        prefix     = ',' + _escape_tag(k) + '='
+        formatted += [[
+            None if (v is None or v == '') else prefix+_escape_tag(v)
+            for v in column
+        ]]
+    separator = ' '
+    for (k, column) in sorted(field_columns.items()):
+        prefix     = _escape_tag(k) + '='
+        formatted += [[
+            None if v is None else separator+prefix+_field_value(v)
+            for v in column
+        ]]
+        separator  = ','
+    formatted += [[' {0}\n'.format(sol_json['timestamp']*1000000000) for sol_json in sol_jsonl]]
+
+    return ''.join(
+        ''.join(part for part in line if part is not None)
+        for line in zip(*formatted)
+    )
+
+def _influxdb_columns(sol_type, sol_jsonl):
+    """
+    Compute the fields and 'apply' tags of Objects of the same type, column
+    by column, as json_to_influxdb does object by object.
+
+    :return: (tag columns, field columns) dictionaries, or None if that type
+        can't be converted column-wise
+    :raises KeyError: if an Object doesn't have the fields of its type
+    :raises ValueError: if the type is not defined
+    """
+    codec = sol._CODECS.get(sol_type)
+    if sol_type in _INFLUXDB_SPECIFIC_TYPES or codec is None or codec.extrafields:
+        return None
+    if any(len(sol_json['value']) != len(codec.fields) for sol_json in sol_jsonl):
+        return None
+
+    # fields
+    field_columns = {}
+    for name in codec.fields:
+        column = [sol_json['value'][name] for sol_json in sol_jsonl]
+        if name in sol.MAC_FIELDS:
+            column = [sol._format_buffer(v) if type(v) == list else v for v in column]
+        elif name in sol.VERSION_FIELDS:
+            column = ['.'.join(str(i) for i in v) if type(v) == list else v for v in column]
+        elif any(type(v) == list for v in column):
+            return None
+        field_columns[name] = column
+
+    # additional fields and tags
+    tag_columns = {}
+    for ap in SolDefines.solStructure(sol_type).get('apply', []):
+        column = _apply_column(ap['function'], [field_columns[arg] for arg in ap['args']])
+        if 'field' in ap:
+            field_columns[ap['field']] = column
+        if 'tag' in ap:
+            tag_columns[ap['tag']]     = column
+
+    return tag_columns, field_columns
+
+def _apply_column(function, arg_columns):
+    """
+    Call function on each row of arg_columns.
+
+    If NumPy is available and function returns a float, it is called once
+    on float64 arrays, which gives the same results for arithmetic
+    expressions. Functions which don't accept arrays (e.g. using float()
+    or math) are called row by row.
+    """
+    rows   = zip(*arg_columns)
+    first  = function(*rows[0])
+    if numpy is not None and type(first) == float:
+        try:
+            column = function(*[numpy.asarray(c, dtype=numpy.float64) for c in arg_columns])
+            if isinstance(column, numpy.ndarray) and column.shape == (len(rows),):
+                return column.tolist()
+        except Exception:
+            pass
+    return [first] + [function(*row) for row in rows[1:]]
+
+def _field_value(v):
+    if v is True or v is False:
+        return 'true' if v else 'false'
+    elif isinstance(v, (int, long)):
+        return '{0}i'.format(v)
+    elif isinstance(v, float):
+        return repr(v)
+    if isinstance(v, unicode):
+        v = v.encode('utf-8')
+    return '"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _escape_tag(v):
+    if isinstance(v, unicode):
+        v = v.encode('utf-8')
+    return str(v).replace('\\', '\\\\').replace(',', '\\,').replace(' ', '\\ ').replace('=', '\\=')
+
+def _escape_measurement(v):
+    return str(v).replace(',', '\\,').replace(' ', '\\ ')
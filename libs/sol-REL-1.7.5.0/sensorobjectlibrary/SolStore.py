@@ -0,0 +1,275 @@
+#!/usr/bin/python
+
+# =========================== imports =========================================
+
+# from default Python
+import os
+import gzip
+import shutil
+import struct
+import logging
+
+import Sol as sol
+import openhdlc as hdlc
+
+# =========================== defines =========================================
+
+SEGMENT_PERIOD    = 24*60*60                 # one segment per day, in seconds
+
+SEGMENT_EXT       = '.sol'
+INDEX_EXT         = '.idx'
+COMPRESSED_EXT    = '.gz'
+
+IMPORT_CHUNK_SIZE = 1000
+
+# one index record per object: timestamp, MAC, type, offset, length
+INDEX_RECORD      = struct.Struct('>IQBII')
+
+# =========================== logging =========================================
+
+log = logging.getLogger(__name__)
+
+# =========================== helpers =========================================
+
+def _mac_to_num(mac):
+    if isinstance(mac, basestring):
+        mac = sol._format_mac_string_to_bytes(mac)
+    return sol._list_to_num(mac)
+
+# =========================== classes =========================================
+
+class SolStore(object):
+    """
+    Segmented, indexed store of SOL objects.
+
+    Objects are HDLC-framed into segment files (same framing as dumpToFile),
+    one segment per segment_period seconds of object timestamps. Next to each
+    segment "<start>.sol", a sidecar index "<start>.idx" holds one fixed-size
+    record (timestamp, MAC, type, byte offset, frame length) per object.
+
+    A range query only opens the segments overlapping the range, reads their
+    index and seeks directly to the matching frames. Segments which are not
+    written to anymore can be compressed ("<start>.sol.gz") or removed without
+    touching the others; their index is left uncompressed.
+    """
+
+    def __init__(self, dir_name, segment_period=SEGMENT_PERIOD):
+        """
+        :param str dir_name: the directory holding the segments, created if needed
+        :param int segment_period: the time span of a segment, in seconds
+        """
+
+        # store params
+        self.dir_name       = dir_name
+        self.segment_period = segment_period
+
+        if not os.path.isdir(self.dir_name):
+            os.makedirs(self.dir_name)
+
+    # ======================= public ==========================================
+
+    def dump(self, sol_jsonl):
+        """
+        Append JSON SOL objects to the segments matching their timestamp.
+
+        :param list sol_jsonl: a list of JSON SOL objects
+        """
+
+        # group objects per segment, keeping their order
+        segments = {}
+        for sol_json in sol_jsonl:
+            segments.setdefault(self._segmentStart(sol_json['timestamp']), []).append(sol_json)
+
+        for start in sorted(segments):
+            self._dumpToSegment(start, segments[start])
+
+    def load(self, start_timestamp=None, end_timestamp=None, mac=None, types=None):
+        """
+        Retrieve JSON SOL objects from the store, see iterLoad().
+
+        :return: a list of JSON SOL objects, chronological per segment
+        :rtype: list
+        """
+        return list(self.iterLoad(start_timestamp, end_timestamp, mac, types))
+
+    def iterLoad(self, start_timestamp=None, end_timestamp=None, mac=None, types=None):
+        """
+        Iterate over the JSON SOL objects of the store, decoding them one by one.
+
+        :param int start_timestamp: only objects at or after that time (inclusive)
+        :param int end_timestamp: only objects at or before that time (inclusive)
+        :param mac: only objects from that MAC address (string or list of bytes)
+        :param list types: only objects of those SOL types
+        :return: a generator of JSON SOL objects, chronological per segment
+        """
+        for sol_bin in self.iterLoadBin(start_timestamp, end_timestamp, mac, types):
+            yield sol.bin_to_json(sol_bin)
+
+    def iterLoadBin(self, start_timestamp=None, end_timestamp=None, mac=None, types=None):
+        """
+        Iterate over the binary SOL objects of the store, as iterLoad() but
+        without converting them to JSON.
+
+        :return: a generator of binary SOL objects (bytearrays), chronological per segment
+        """
+
+        if mac is not None:
+            mac = _mac_to_num(mac)
+        if types is not None:
+            types = set(types)
+
+        for start in self.segments():
+            # skip segments outside of the range
+            if end_timestamp is not None and start > end_timestamp:
+                continue
+            if start_timestamp is not None and start+self.segment_period <= start_timestamp:
+                continue
+
+            # select the objects from the index
+            selected = []
+            for (ts, m, t, offset, length) in self._readIndex(start):
+                if start_timestamp is not None and ts < start_timestamp:
+                    continue
+                if end_timestamp is not None and ts > end_timestamp:
+                    continue
+                if mac is not None and m != mac:
+                    continue
+                if types is not None and t not in types:
+                    continue
+                selected += [(offset, length)]
+            if not selected:
+                continue
+
+            # read the selected objects
+            with self._openSegment(start) as f:
+                for (offset, length) in selected:
+                    f.seek(offset)
+                    try:
+                        sol_bin = hdlc.dehdlcifyFrameBytes(f.read(length))
+                    except ValueError as err:
+                        log.warning("segment {0}, offset {1}: {2}".format(start, offset, err))
+                        continue
+                    yield sol_bin
+
+    def importFile(self, file_name, chunk_size=IMPORT_CHUNK_SIZE):
+        """
+        Copy the objects of a single backup file (see dumpToFile) into the
+        store, chunk_size objects at a time.
+
+        :param str file_name: the backup file to import
+        :param int chunk_size: the number of objects held in memory
+        """
+        sol_jsonl = []
+        for (sol_json, _) in sol.iterFromFile(file_name):
+            sol_jsonl += [sol_json]
+            if len(sol_jsonl) >= chunk_size:
+                self.dump(sol_jsonl)
+                sol_jsonl = []
+        self.dump(sol_jsonl)
+
+    def segments(self):
+        """
+        :return: the start timestamps of the segments in the store, sorted
+        :rtype: list
+        """
+        return sorted(
+            int(n[:-len(INDEX_EXT)]) for n in os.listdir(self.dir_name) if n.endswith(INDEX_EXT)
+        )
+
+    def compress(self, before_timestamp):
+        """
+        Gzip the segments which end before before_timestamp.
+
+        :param int before_timestamp: the segments ending before that time are compressed
+        """
+        for start in self.segments():
+            if start+self.segment_period > before_timestamp:
+                continue
+            data_file = self._segmentFile(start)
+            if not os.path.exists(data_file):
+                continue  # already compressed
+            with open(data_file, 'rb') as fin:
+                with gzip.open(data_file+COMPRESSED_EXT, 'wb') as fout:
+                    shutil.copyfileobj(fin, fout)
+            os.remove(data_file)
+            log.info("compressed segment {0}".format(start))
+
+    def remove(self, before_timestamp):
+        """
+        Delete the segments (and their index) which end before before_timestamp.
+
+        :param int before_timestamp: the segments ending before that time are removed
+        """
+        for start in self.segments():
+            if start+self.segment_period > before_timestamp:
+                continue
+            for f in [self._segmentFile(start), self._segmentFile(start)+COMPRESSED_EXT, self._indexFile(start)]:
+                if os.path.exists(f):
+                    os.remove(f)
+            log.info("removed segment {0}".format(start))
+
+    # ======================= private =========================================
+
+    def _segmentStart(self, timestamp):
+        return timestamp - timestamp % self.segment_period
+
+    def _segmentFile(self, start):
+        return os.path.join(self.dir_name, '{0}{1}'.format(start, SEGMENT_EXT))
+
+    def _indexFile(self, start):
+        return os.path.join(self.dir_name, '{0}{1}'.format(start, INDEX_EXT))
+
+    def _openSegment(self, start, mode='rb'):
+        data_file = self._segmentFile(start)
+        if os.path.exists(data_file+COMPRESSED_EXT):
+            return gzip.open(data_file+COMPRESSED_EXT, mode)
+        return open(data_file, mode)
+
+    def _dumpToSegment(self, start, sol_jsonl):
+        if os.path.exists(self._segmentFile(start)+COMPRESSED_EXT):
+            # late objects for a compressed segment: append a gzip member,
+            # offsets continue from the end of the last indexed frame
+            index = self._readIndex(start)
+            if index:
+                offset = index[-1][3]+index[-1][4]
+            else:
+                offset = 0
+        elif os.path.exists(self._segmentFile(start)):
+            offset = os.path.getsize(self._segmentFile(start))
+        else:
+            offset = 0
+
+        # frame the objects
+        frames  = []
+        records = []
+        for sol_json in sol_jsonl:
+            sol_bin  = sol.json_to_bytes(sol_json)
+            frame    = hdlc.hdlcifyBytes(sol_bin)
+            frames  += [frame]
+            records += [INDEX_RECORD.pack(
+                sol_json['timestamp'],
+                sol._list_to_num(sol_bin[1:9]),
+                sol_json['type'],
+                offset,
+                len(frame),
+            )]
+            offset  += len(frame)
+
+        # write the data before the index, so the index never points past the data
+        with self._openSegment(start, 'ab') as f:
+            f.write(''.join(frames))
+        with open(self._indexFile(start), 'ab') as f:
+            f.write(''.join(records))
+
+    def _readIndex(self, start):
+        try:
+            with open(self._indexFile(start), 'rb') as f:
+                data = f.read()
+        except IOError:
+            return []
+
+        # a truncated last record (interrupted write) is ignored
+        return [
+            INDEX_RECORD.unpack_from(data, offset)
+            for offset in range(0, len(data)-INDEX_RECORD.size+1, INDEX_RECORD.size)
+        ]
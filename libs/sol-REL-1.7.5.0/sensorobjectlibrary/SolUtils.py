@@ -1,3 +1,4 @@
+import os
 import time
 import logging
 import traceback
@@ -34,6 +35,7 @@ def logCrash(err, appstats, threadName=None):
 
     # update stats
     appstats.increment('ADM_NUM_CRASHES')
+    appstats.flush()
     log.critical(output)
     print output
     return output
@@ -79,8 +81,10 @@ class AppConfig(object):
                     except ValueError:
                         self.config[k] = v
 
-    def get(self, name):
+    def get(self, name, default=None):
         with self.dataLock:
+            if default is not None and name not in self.config:
+                return default
             return self.config[name]
 
 
@@ -88,25 +92,32 @@ class AppStats(object):
     """
     Singleton which contains the stats of the application.
 
-    Stats are read once from file STATSFILE.
+    Stats are read once from file STATSFILE. They are then only updated in
+    memory, and written back by a background thread every flush_period
+    seconds if they changed, so updating a stat costs no I/O. The file is
+    replaced atomically, it always holds a complete set of stats.
     """
     _instance = None
     _init     = False
 
+    FLUSH_PERIOD = 10           # in seconds
+
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
             cls._instance = super(AppStats, cls).__new__(cls, *args, **kwargs)
         return cls._instance
 
-    def __init__(self, stats_list = "", stats_file = ""):
+    def __init__(self, stats_list = "", stats_file = "", flush_period = FLUSH_PERIOD):
         if self._init:
             return
         self._init      = True
 
         self.dataLock   = threading.RLock()
+        self.fileLock   = threading.Lock()
         self.stats      = {}
         self.stats_list = stats_list
         self.stats_file = stats_file
+        self.dirty      = False
 
         try:
             with open(self.stats_file, 'r') as f:
@@ -121,32 +132,70 @@ class AppStats(object):
                 log.info("Stats recovered from file.")
         except (EnvironmentError, EOFError) as e:
             log.info("Could not read stats file: %s", e)
-            self._backup()
+            self.dirty  = True
+            self.flush()
+
+        # start the flusher
+        if flush_period:
+            self.flusher        = threading.Thread(target=self._flushPeriodically, args=(flush_period,))
+            self.flusher.name   = 'AppStatsFlusher'
+            self.flusher.daemon = True
+            self.flusher.start()
 
     # ======================= public ==========================================
 
-    def increment(self, statName):
+    def increment(self, statName, num=1):
         self._validateStatName(statName)
         with self.dataLock:
-            if statName not in self.stats:
-                self.stats[statName] = 0
-            self.stats[statName] += 1
-        self._backup()
+            self.stats[statName] = self.stats.get(statName, 0) + num
+            self.dirty           = True
 
     def update(self, k, v):
         self._validateStatName(k)
         with self.dataLock:
             self.stats[k] = v
-        self._backup()
+            self.dirty    = True
 
     def set(self, stats_file):
-        self.stats_file = stats_file
+        with self.dataLock:
+            self.stats_file = stats_file
+            self.dirty      = True
 
     def get(self):
         with self.dataLock:
             stats = self.stats.copy()
         return stats
 
+    def flush(self):
+        """
+        Write the stats to file now, if they changed since the last write.
+        """
+        with self.fileLock:
+            with self.dataLock:
+                if not self.dirty:
+                    return
+                stats      = self.stats.copy()
+                stats_file = self.stats_file
+                self.dirty = False
+            output = ['{0} = {1}'.format(k, v) for (k, v) in stats.items()]
+            output = '\n'.join(output)
+            try:
+                # write next to the file, then replace it
+                with open(stats_file+'.tmp', 'w') as f:
+                    f.write(output)
+                    f.flush()
+                    os.fsync(f.fileno())
+                try:
+                    os.rename(stats_file+'.tmp', stats_file)
+                except OSError:
+                    # Windows does not replace an existing file
+                    os.remove(stats_file)
+                    os.rename(stats_file+'.tmp', stats_file)
+            except EnvironmentError as err:
+                log.error("Could not write stats file: %s", err)
+                with self.dataLock:
+                    self.dirty = True
+
     # ======================= private =========================================
 
     def _validateStatName(self, statName):
@@ -155,9 +204,7 @@ class AppStats(object):
                 print statName
             assert statName in self.stats_list
 
-    def _backup(self):
-        with self.dataLock:
-            output = ['{0} = {1}'.format(k, v) for (k, v) in self.stats.items()]
-            output = '\n'.join(output)
-            with open(self.stats_file, 'w') as f:
-                f.write(output)
+    def _flushPeriodically(self, flush_period):
+        while True:
+            time.sleep(flush_period)
+            self.flush()
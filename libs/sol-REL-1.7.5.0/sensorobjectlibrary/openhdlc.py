@@ -1,3 +1,10 @@
+import os
+
+try:
+    from binascii import crc_hqx
+except ImportError:
+    crc_hqx = None
+
 HDLC_FLAG              = '\x7e'
 HDLC_FLAG_ESCAPED      = '\x5e'
 HDLC_ESCAPE            = '\x7d'
@@ -6,6 +13,8 @@ HDLC_CRCINIT           = 0xffff
 HDLC_CRCGOOD           = 0xf0b8
 HDLC_ESCAPE_MASK       = 0x20
 
+BLOCK_SIZE             = 64*1024
+
 FCS16TAB  = (
     0x0000, 0x1189, 0x2312, 0x329b, 0x4624, 0x57ad, 0x6536, 0x74bf,
     0x8c48, 0x9dc1, 0xaf5a, 0xbed3, 0xca6c, 0xdbe5, 0xe97e, 0xf8f7,
@@ -41,152 +50,202 @@ FCS16TAB  = (
     0x7bc7, 0x6a4e, 0x58d5, 0x495c, 0x3de3, 0x2c6a, 0x1ef1, 0x0f78,
 )
 
+# bit-reversal of each byte, as FCS-16 is computed LSB-first and crc_hqx MSB-first
+_BITREVERSE = ''.join(chr(int('{0:08b}'.format(b)[::-1], 2)) for b in range(256))
+
 #============================ public ======================================
 
 def hdlcify(inBuf):
 
-    # make copy of input
-    outBuf     = ''.join([chr(b) for b in inBuf])
+    return [ord(b) for b in hdlcifyBytes(inBuf)]
+
+def hdlcifyBytes(inBuf):
+    """
+    Create an HDLC frame, as hdlcify, but without going through a list of bytes.
 
-    # calculate CRC
-    crc        = HDLC_CRCINIT
-    for b in outBuf:
-        crc    = _crcIteration(crc, b)
-    crc        = 0xffff-crc
+    :param inBuf: the content of the frame, as a list of bytes, a str or a bytearray
+    :return: the frame, including its opening and closing flags
+    :rtype: str
+    """
+
+    # make copy of input
+    outBuf     = inBuf if isinstance(inBuf, str) else str(bytearray(inBuf))
 
     # append CRC
+    crc        = 0xffff-fcs16(outBuf)
     outBuf     = outBuf + chr(crc & 0xff) + chr((crc & 0xff00) >> 8)
 
     # stuff bytes
-    outBuf     = outBuf.replace(
+    if HDLC_ESCAPE in outBuf:
+        outBuf = outBuf.replace(
                     HDLC_ESCAPE,
                     HDLC_ESCAPE + HDLC_ESCAPE_ESCAPED)
-    outBuf     = outBuf.replace(
+    if HDLC_FLAG in outBuf:
+        outBuf = outBuf.replace(
                     HDLC_FLAG,
                     HDLC_ESCAPE + HDLC_FLAG_ESCAPED)
 
     # add flags
-    outBuf     = HDLC_FLAG + outBuf + HDLC_FLAG
+    return HDLC_FLAG + outBuf + HDLC_FLAG
 
-    return [ord(b) for b in outBuf]
+def hdlcifyMany(inBufs):
+    """
+    Create the HDLC frames of several buffers, as a single string to be
+    written at once.
 
-def dehdlcify(fileName, fileOffset=0, maxNum=None):
+    :param list inBufs: the contents of the frames (see hdlcifyBytes)
+    :return: the frames, one after the other
+    :rtype: str
+    """
+    return ''.join([hdlcifyBytes(inBuf) for inBuf in inBufs])
 
-    returnVal = []
+def fcs16(buf, crc=HDLC_CRCINIT):
+    """
+    Compute the FCS-16 of a buffer (RFC 1662), without the final complement.
 
-    busyReceiving  = False
-    lastRxByte     = HDLC_FLAG
-    inputs = (None, None, None)
+    :param str buf: the buffer
+    :param int crc: the FCS to start from, to compute it over several buffers
+    :rtype: int
+    """
+    return _fcs16(buf, crc)
 
-    with open(fileName,'rb') as f:
+def dehdlcify(fileName, fileOffset=0, maxNum=None):
 
-        f.seek(fileOffset)
+    returnVal  = []
 
-        rxByte = f.read(1)
+    with open(fileName,'rb') as f:
 
-        while rxByte != "":
+        for (frame, nextOffset) in iterDehdlcify(f, fileOffset):
+            returnVal += [frame]
+            if maxNum and len(returnVal) >= maxNum:
+                return returnVal, nextOffset
 
-            if (
-                    busyReceiving is False and
-                    lastRxByte == HDLC_FLAG and
-                    rxByte != HDLC_FLAG
-                ):
-                # start of frame
+        f.seek(0, os.SEEK_END)
 
-                # I'm now receiving
-                busyReceiving = True
+        return returnVal, f.tell()
 
-                # create the HDLC frame
-                inputs = _hdlc_input_open()
+def iterDehdlcify(f, fileOffset=0, blockSize=BLOCK_SIZE):
+    """
+    Decode the HDLC frames of an open file, see iterDehdlcifyBytes.
 
-                # add the byte just received
-                inputs = _hdlc_input_write(inputs, rxByte)
+    :return: a generator of (frame, nextOffset) tuples, frame being a list of bytes
+    """
 
-            elif (
-                    busyReceiving is True and
-                    rxByte != HDLC_FLAG
-                ):
-                # middle of frame
+    for (frame, nextOffset) in iterDehdlcifyBytes(f, fileOffset, blockSize):
+        yield list(frame), nextOffset
 
-                # add the byte just received
-                inputs = _hdlc_input_write(inputs, rxByte)
+def iterDehdlcifyBytes(f, fileOffset=0, blockSize=BLOCK_SIZE):
+    """
+    Decode the HDLC frames of an open file, reading it by blocks.
 
-            elif (
-                    busyReceiving is True and
-                    rxByte == HDLC_FLAG
-                ):
-                # end of frame
+    Frames with an invalid CRC are skipped. The bytes between fileOffset and
+    the first flag are handled as a frame, as dehdlcify does.
 
-                # finalize the HDLC frame
-                try:
-                    inputs = _hdlc_input_close(inputs)
-                except ValueError:
-                    # invalid HDLC frame
-                    pass
-                else:
-                    returnVal += [[ord(b) for b in inputs[0]]]
-                    if maxNum and len(returnVal) >= maxNum:
-                        break
+    :param file f: the file, opened in binary mode
+    :param int fileOffset: the offset to start decoding at
+    :param int blockSize: the number of bytes read at once
+    :return: a generator of (frame, nextOffset) tuples, where frame is a
+        bytearray and nextOffset is the offset right after the closing flag
+        of the frame
+    """
 
-                busyReceiving = False
+    f.seek(fileOffset)
 
-            else:
-                # between frames
-                pass
+    pending    = []       # bytes received since the last flag
+    blockStart = fileOffset
 
-            lastRxByte = rxByte
+    while True:
+        block = f.read(blockSize)
+        if not block:
+            break
 
-            rxByte = f.read(1)
+        start = 0
+        while True:
+            flag = block.find(HDLC_FLAG, start)
+            if flag == -1:
+                pending += [block[start:]]
+                break
 
-        return returnVal, f.tell()
+            # end of frame
+            frame    = ''.join(pending) + block[start:flag]
+            pending  = []
+            start    = flag+1
 
-#============================ private =====================================
+            if not frame:
+                # between frames
+                continue
+            try:
+                frame = _hdlc_decode(frame)
+            except ValueError:
+                # invalid HDLC frame
+                continue
+            yield bytearray(frame), blockStart+start
 
-def _crcIteration(crc, b):
-    return (crc >> 8) ^ FCS16TAB[((crc ^ (ord(b))) & 0xff)]
+        blockStart += len(block)
 
-def _hdlc_input_open():
+def dehdlcifyFrame(frame):
+    """
+    Decode a single HDLC frame, e.g. read at a known offset of a file.
 
-    # reset the input buffer
-    input_buf = []
+    :param str frame: the frame, including its opening and closing flags
+    :return: the content of the frame, CRC removed
+    :rtype: list
+    :raises ValueError: if the frame is not valid
+    """
 
-    # initialize the value of the CRC
-    input_crc = HDLC_CRCINIT
+    return list(dehdlcifyFrameBytes(frame))
 
-    return input_buf, input_crc, None
+def dehdlcifyFrameBytes(frame):
+    """
+    Decode a single HDLC frame, as dehdlcifyFrame, but without going through
+    a list of bytes.
 
-def _hdlc_input_write(inputs, b):
-    input_buf, input_crc, input_escaping = inputs
-    if b == HDLC_ESCAPE:
-        input_escaping = True
-    else:
-        if input_escaping is True:
-            b = chr(ord(b) ^ HDLC_ESCAPE_MASK)
-            input_escaping = False
+    :param str frame: the frame, including its opening and closing flags
+    :return: the content of the frame, CRC removed
+    :rtype: bytearray
+    :raises ValueError: if the frame is not valid
+    """
 
-        # add byte to input buffer
-        input_buf += [b]
+    if len(frame) < 2 or frame[0] != HDLC_FLAG or frame[-1] != HDLC_FLAG:
+        raise ValueError("not an HDLC frame")
 
-        # iterate through CRC calculator
-        input_crc = _crcIteration(input_crc, b)
+    return bytearray(_hdlc_decode(frame[1:-1]))
 
-    return input_buf, input_crc, input_escaping
+#============================ private =====================================
 
-def _hdlc_input_close(inputs):
-    input_buf, input_crc, input_escaping = inputs
+def _hdlc_decode(frame):
+    """
+    Unescape the content of a frame (flags excluded) and verify its CRC.
 
-    # verify the validity of the frame
-    if input_crc == HDLC_CRCGOOD:
-        # the CRC is correct
+    :return: the content of the frame, CRC removed
+    :rtype: str
+    :raises ValueError: if the CRC is not valid
+    """
 
-        # remove the CRC from the input buffer
-        input_buf = input_buf[:-2]
-    else:
-        input_buf = []
+    # unescape: the byte following an escape byte is XOR'ed with the mask
+    if HDLC_ESCAPE in frame:
+        parts  = frame.split(HDLC_ESCAPE)
+        frame  = parts[0] + ''.join(
+            chr(ord(p[0]) ^ HDLC_ESCAPE_MASK) + p[1:] for p in parts[1:] if p
+        )
 
+    # verify the CRC over the whole frame
+    if fcs16(frame) != HDLC_CRCGOOD:
         raise ValueError("invalid CRC")
 
-    # reset escaping
-    input_escaping = False
+    return frame[:-2]
+
+def _fcs16_table(buf, crc=HDLC_CRCINIT):
+    # pure-Python, one table lookup per byte
+    for b in bytearray(buf):
+        crc = (crc >> 8) ^ FCS16TAB[(crc ^ b) & 0xff]
+    return crc
+
+def _bitreverse16(v):
+    return (ord(_BITREVERSE[v & 0xff]) << 8) | ord(_BITREVERSE[v >> 8])
+
+def _fcs16_binascii(buf, crc=HDLC_CRCINIT):
+    # FCS-16 is the bit-reflected CRC-CCITT that crc_hqx computes in C
+    return _bitreverse16(crc_hqx(str(buf).translate(_BITREVERSE), _bitreverse16(crc)))
 
-    return input_buf, input_crc, input_escaping
+_fcs16 = _fcs16_binascii if crc_hqx else _fcs16_table
@@ -2175,3 +2175,133 @@ def test_chain(sol_chain_example):
         pp.pprint(sol_influxdb)
         print example["influxdb"]
         assert sol_influxdb==example["influxdb"]
+
+def test_batch():
+    sol_binl = []
+    for example in SOL_CHAIN_EXAMPLE:
+        for o in example["objects"]:
+            sol_binl += [o["bin"]]
+
+    batch = sol.bin_to_batch(sol_binl, timestamp=0x01020304)
+    assert batch[0] == 0<<6 | 1<<5 | 0<<4 | 0<<3 | 0<<2 | 2<<0
+    assert batch[1:5] == [0x01, 0x02, 0x03, 0x04]
+    assert batch[5:7] == [0x00, len(sol_binl)]
+    assert sol.batch_to_bin(batch) == sol_binl
+    assert [sol.bin_to_json(b) for b in sol.batch_to_bin(batch)] == \
+        [sol.bin_to_json(b) for b in sol_binl]
+    assert sol.batch_to_bin(sol.bin_to_batch([])) == []
+
+def test_codecs_match_field_by_field(monkeypatch):
+    # the precompiled codecs give the same result as the field by field conversion
+    for (sol_type, codec) in sol._CODECS.items():
+        if codec is None:
+            continue
+        binary = [(0x11*i) & 0x7f for i in range(codec.struct.size)]
+        if codec.extrafields:
+            binary += [0x01, 0x02, 0x03]
+
+        fields = sol._binary_to_fields_with_structure(sol_type, binary)
+        assert sol._fields_to_binary_with_structure(sol_type, fields) == binary
+
+        monkeypatch.setitem(sol._CODECS, sol_type, None)
+        assert sol._binary_to_fields_with_structure(sol_type, binary) == fields
+        assert sol._fields_to_binary_with_structure(sol_type, fields) == binary
+        monkeypatch.undo()
+
+def test_bytes():
+    # the bytearray API gives the same objects as the list API
+    for example in SOL_CHAIN_EXAMPLE:
+        for o in example["objects"]:
+            sol_bytes = sol.json_to_bytes(o["json"])
+            assert isinstance(sol_bytes, bytearray)
+            assert list(sol_bytes) == o["bin"]
+            assert sol.bin_to_json(sol_bytes) == sol.bin_to_json(o["bin"])
+            assert sol.bin_to_json(str(sol_bytes)) == sol.bin_to_json(o["bin"])
+
+    sol_binl = [sol.json_to_bytes(o["json"]) for example in SOL_CHAIN_EXAMPLE for o in example["objects"]]
+    assert list(sol.bin_to_batch_bytes(sol_binl, 0)) == sol.bin_to_batch([list(b) for b in sol_binl], 0)
+
+def test_many():
+    examples  = json.loads(json.dumps([e for e in SOL_CHAIN_EXAMPLE if "dust" in e]))
+
+    sol_jsonl = sol.dust_to_json_many(
+        [e["dust"] for e in examples],
+        mac_manager  = MACMANAGER,
+        timestamps   = [TIMESTAMP] * len(examples),
+    )
+    assert sol_jsonl == [o["json"] for e in examples for o in e["objects"]]
+    assert sol.json_to_bin_many(sol_jsonl) == [o["bin"] for e in examples for o in e["objects"]]
+    assert sol.dust_to_json_many([]) == []
+
+    # MAC addresses as strings or lists of bytes, shared by several objects
+    sol_jsonl = [o["json"] for e in SOL_CHAIN_EXAMPLE for o in e["objects"]]
+    sol_jsonl = [
+        dict(o, mac=sol._format_mac_string_to_bytes(o["mac"])) if i % 2 else o
+        for (i, o) in enumerate(sol_jsonl)
+    ]
+    assert sol.json_to_bytes_many(sol_jsonl * 2) == [sol.json_to_bytes(o) for o in sol_jsonl * 2]
+
+def test_many_errors():
+    examples  = json.loads(json.dumps([e for e in SOL_CHAIN_EXAMPLE if "dust" in e]))
+    invalid   = {'name': 'notifData', 'fields': {}}
+
+    # the notifications which can't be converted are reported, the others converted
+    errors    = []
+    sol_jsonl = sol.dust_to_json_many(
+        [invalid] + [e["dust"] for e in examples] + [invalid],
+        mac_manager  = MACMANAGER,
+        timestamps   = [TIMESTAMP] * (len(examples)+2),
+        on_error     = lambda n, err: errors.append(n),
+    )
+    assert sol_jsonl == [o["json"] for e in examples for o in e["objects"]]
+    assert errors == [invalid, invalid]
+    with pytest.raises(Exception):
+        sol.dust_to_json_many([invalid])
+
+    # same for the objects which can't be encoded
+    invalid   = {'mac': sol_jsonl[0]['mac'], 'timestamp': TIMESTAMP, 'type': sol_jsonl[0]['type'], 'value': {}}
+    errors    = []
+    sol_binl  = sol.json_to_bytes_many(sol_jsonl + [invalid], on_error=lambda o, err: errors.append(o))
+    assert [list(b) for b in sol_binl] == [o["bin"] for e in examples for o in e["objects"]]
+    assert errors == [invalid]
+
+def test_structural_sharing():
+    # the objects share their values with the notification, which is left untouched
+    hr_device     = {'charge': 1234, 'queueOcc': 0x11, 'temperature': 22}
+    hr_discovered = {'numJoinParents': 1, 'numItems': 0, 'discoveredNeighbors': []}
+    dust_notif = {
+        'name':     'hr',
+        'mac':      '01-02-03-04-05-06-07-08',
+        'hr':       {'Device': hr_device, 'Discovered': hr_discovered},
+    }
+    sol_jsonl = sol.dust_to_json(dust_notif, mac_manager=MACMANAGER, timestamp=TIMESTAMP)
+    assert sorted(sol_jsonl, key=lambda o: o['type']) == [
+        {'mac': dust_notif['mac'], 'timestamp': TIMESTAMP, 'type': 0x10, 'value': hr_device},
+        {'mac': dust_notif['mac'], 'timestamp': TIMESTAMP, 'type': 0x12, 'value': hr_discovered},
+    ]
+    assert all(o['value'] is hr_device or o['value'] is hr_discovered for o in sol_jsonl)
+    assert sorted(dust_notif['hr'].keys()) == ['Device', 'Discovered']
+
+    data = [0x01, 0x02, 0x03]
+    dust_notif = {
+        'name':     'notifData',
+        'manager':  'COM6',
+        'fields':   {
+            'utcSecs':    1,
+            'utcUsecs':   2,
+            'macAddress': '01-02-03-04-05-06-07-08',
+            'srcPort':    0x0102,
+            'dstPort':    0x0304,
+            'data':       data,
+        },
+    }
+    [sol_json] = sol.dust_to_json(dust_notif, mac_manager=MACMANAGER, timestamp=TIMESTAMP)
+    assert sol_json['value'] == {'srcPort': 0x0102, 'dstPort': 0x0304, 'data': data}
+    assert sol_json['value']['data'] is data
+    assert sorted(dust_notif['fields'].keys()) == ['data', 'dstPort', 'macAddress', 'srcPort', 'utcSecs', 'utcUsecs']
+
+    # json_to_influxdb does not modify its inputs
+    tags = dict(TAGS)
+    sol.json_to_influxdb(sol_json, tags)
+    assert tags == TAGS
+    assert sol_json['value']['data'] is data
@@ -0,0 +1,36 @@
+from .context import sol
+from sensorobjectlibrary import SolDefines
+import struct
+
+import pytest
+
+# ============================ tests =================================
+
+def test_type_name_lookups():
+    names = [n for n in dir(SolDefines) if n.startswith('SOL_TYPE_')]
+    for n in names:
+        type_id = getattr(SolDefines, n)
+        assert SolDefines.sol_name_to_type(n) == type_id
+        # first name in alphabetical order
+        assert SolDefines.sol_type_to_type_name(type_id) == \
+            [m for m in names if getattr(SolDefines, m) == type_id][0]
+
+    with pytest.raises(ValueError):
+        SolDefines.sol_type_to_type_name(0xff)
+    with pytest.raises(ValueError):
+        SolDefines.sol_name_to_type('SOL_TYPE_DOES_NOT_EXIST')
+
+def test_structure_lookups():
+    for item in SolDefines.sol_types:
+        # last definition wins
+        expected = [i for i in SolDefines.sol_types if i['type'] == item['type']][-1]
+        assert SolDefines.solStructure(item['type']) is expected
+        assert SolDefines.solStructureSize(item['type']) == struct.calcsize(expected['structure'])
+
+    name = SolDefines.sol_type_to_type_name(SolDefines.SOL_TYPE_DUST_NOTIFDATA)
+    assert SolDefines.solStructure(name)['type'] == SolDefines.SOL_TYPE_DUST_NOTIFDATA
+
+    with pytest.raises(ValueError):
+        SolDefines.solStructure(0xff)
+    with pytest.raises(ValueError):
+        SolDefines.solStructureSize(0xff)
@@ -0,0 +1,105 @@
+from .context import sol
+from sensorobjectlibrary import SolDefines, SolExport, SolStore
+from .test_chain import SOL_CHAIN_EXAMPLE, TAGS
+
+import copy
+
+# ============================ defines ===============================
+
+TAGS_SITE = dict((k, v) for (k, v) in TAGS.items() if k != 'mac')
+
+# ============================ helpers ===============================
+
+def object_by_object(sol_jsonl):
+    return ''.join(
+        SolExport.influxdb_to_line(sol.json_to_influxdb(o, dict(TAGS_SITE, mac=o['mac'])))
+        for o in sol_jsonl
+    )
+
+def sol_jsonl_of_type(sol_type, num):
+    # objects of a type with a fixed structure, with different values
+    codec      = sol._CODECS[sol_type]
+    return_val = []
+    for i in range(num):
+        values = [(i*7+j) % 100 + 1 for j in range(len(codec.fields))]
+        value  = codec.unpack(bytearray(codec.struct.pack(*values)))
+        return_val += [{
+            'mac':       '01-02-03-04-05-06-07-{0:02x}'.format(i % 3),
+            'timestamp': 1500000000+i,
+            'type':      sol_type,
+            'value':     value,
+        }]
+    return return_val
+
+# ============================ tests =================================
+
+def test_influxdb_to_line():
+    point = {
+        'time':         1000000000,
+        'measurement':  'SOL_TYPE_A B',
+        'tags':         {'site': 'a,b c', 'mac': '01-02', 'empty': '', 'none': None},
+        'fields':       {'i': 1, 'f': 1.5, 's': 'a"b', 'b': True, 'n': None},
+    }
+    assert SolExport.influxdb_to_line(point) == \
+        'SOL_TYPE_A\\ B,mac=01-02,site=a\\,b\\ c b=true,f=1.5,i=1i,s="a\\"b" 1000000000\n'
+
+def test_influxdb_lines_chain():
+    sol_jsonl = [o['json'] for example in SOL_CHAIN_EXAMPLE for o in example['objects']]
+    original  = copy.deepcopy(sol_jsonl)
+    lines     = ''.join(SolExport.json_to_influxdb_lines(sol_jsonl, TAGS_SITE))
+    assert sorted(lines.splitlines()) == sorted(object_by_object(sol_jsonl).splitlines())
+
+    # the objects are not modified, DUST_SNAPSHOT ones included
+    assert sol_jsonl == original
+
+def test_influxdb_lines_columns():
+    for sol_type in [t for (t, c) in sol._CODECS.items() if c and not c.extrafields]:
+        sol_jsonl = sol_jsonl_of_type(sol_type, 10)
+        chunks    = list(SolExport.json_to_influxdb_lines(sol_jsonl, TAGS_SITE, chunk_size=4))
+        assert len(chunks) == 3
+        assert ''.join(chunks) == object_by_object(sol_jsonl)
+
+def test_columns(tmpdir):
+    sht3x     = sol_jsonl_of_type(SolDefines.SOL_TYPE_TEMPRH_SHT3X, 25)
+    join      = sol_jsonl_of_type(SolDefines.SOL_TYPE_DUST_EVENTMOTEJOIN, 3)
+    data      = {
+        'mac':       '01-02-03-04-05-06-07-08',
+        'timestamp': 1500000000,
+        'type':      SolDefines.SOL_TYPE_DUST_NOTIFDATA,
+        'value':     {'srcPort': 1, 'dstPort': 2, 'data': [1, 2, 3]},
+    }
+    sol.dumpToFile(sht3x + [data] + join, str(tmpdir.join('backup')))
+
+    writer = SolExport.dumpToColumns(str(tmpdir.join('backup')), str(tmpdir.join('columns')), chunk_size=10)
+    assert writer.skipped == {SolDefines.SOL_TYPE_DUST_NOTIFDATA: 1}
+
+    reader = SolExport.ColumnsReader(str(tmpdir.join('columns')), SolDefines.SOL_TYPE_TEMPRH_SHT3X)
+    assert reader.num_rows == 25
+    assert reader.columns() == ['mac', 'timestamp', 'temp_raw', 't_Nval', 'rh_raw', 'rh_Nval']
+    assert list(reader.column('timestamp')) == [o['timestamp'] for o in sht3x]
+    assert list(reader.column('rh_raw')) == [o['value']['rh_raw'] for o in sht3x]
+    assert list(reader.column('mac')) == [sol._list_to_num(sol._format_mac_string_to_bytes(o['mac'])) for o in sht3x]
+
+    reader = SolExport.ColumnsReader(str(tmpdir.join('columns')), 'SOL_TYPE_DUST_EVENTMOTEJOIN')
+    assert list(reader.column('macAddress')) == [sol._list_to_num(o['value']['macAddress']) for o in join]
+
+    # only the selected types
+    writer = SolExport.dumpToColumns(
+        str(tmpdir.join('backup')),
+        str(tmpdir.join('columns2')),
+        types=[SolDefines.SOL_TYPE_DUST_EVENTMOTEJOIN],
+    )
+    assert writer.tables.keys() == [SolDefines.SOL_TYPE_DUST_EVENTMOTEJOIN]
+
+    # from a SolStore directory, as written by the solmanager
+    SolStore.SolStore(str(tmpdir.join('backup.d'))).importFile(str(tmpdir.join('backup')))
+    writer = SolExport.dumpToColumns(
+        str(tmpdir.join('backup.d')),
+        str(tmpdir.join('columns3')),
+        types=[SolDefines.SOL_TYPE_TEMPRH_SHT3X],
+    )
+    assert writer.tables.keys() == [SolDefines.SOL_TYPE_TEMPRH_SHT3X]
+    reader = SolExport.ColumnsReader(str(tmpdir.join('columns3')), SolDefines.SOL_TYPE_TEMPRH_SHT3X)
+    assert reader.num_rows == 25
+    assert list(reader.column('timestamp')) == [o['timestamp'] for o in sht3x]
+    assert list(reader.column('rh_raw')) == [o['value']['rh_raw'] for o in sht3x]
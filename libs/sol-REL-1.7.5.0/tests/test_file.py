@@ -145,6 +145,89 @@ def test_retrieve_range(removeFile):
     assert sol_jsonl_loaded == sol_jsonl_toDump[100:]
 
 
+def test_retrieve_expected_range(removeFile, expectedRange):
+    (start_timestamp, end_timestamp, idxMin, idxMax) = expectedRange
+
+    # prepare dicts to dump
+    sol_jsonl_toDump = [random_sol_json(timestamp=ts) for ts in range(1000)]
+
+    # dump
+    sol.dumpToFile(sol_jsonl_toDump, FILENAME)
+
+    # load
+    sol_jsonl_loaded = sol.loadFromFile(
+        FILENAME,
+        start_timestamp=start_timestamp,
+        end_timestamp=end_timestamp,
+    )
+
+    # compare
+    assert sol_jsonl_loaded == sol_jsonl_toDump[idxMin:idxMax]
+
+
+def test_retrieve_range_before_first(removeFile):
+    # prepare dicts to dump
+    sol_jsonl_toDump = [random_sol_json(timestamp=1521645792+ts) for ts in range(100)]
+
+    # dump
+    sol.dumpToFile(sol_jsonl_toDump, FILENAME)
+
+    # load
+    sol_jsonl_loaded = sol.loadFromFile(
+        FILENAME,
+        start_timestamp=1521645000,
+        end_timestamp=1521645841,
+    )
+
+    # compare
+    assert sol_jsonl_loaded == sol_jsonl_toDump[:50]
+
+
+def test_retrieve_range_same_timestamp(removeFile):
+    # prepare dicts to dump, the middle of the file in a run of equal timestamps
+    sol_jsonl_toDump = [random_sol_json(timestamp=ts) for ts in [0]*300 + [1]*400 + [2]*300]
+
+    # dump
+    sol.dumpToFile(sol_jsonl_toDump, FILENAME)
+
+    # load
+    sol_jsonl_loaded = sol.loadFromFile(
+        FILENAME,
+        start_timestamp=1,
+        end_timestamp=1,
+    )
+
+    # compare
+    assert sol_jsonl_loaded == sol_jsonl_toDump[300:700]
+
+
+def test_iter_filter_resume(removeFile):
+    # prepare dicts to dump
+    sol_jsonl_toDump = [random_sol_json(timestamp=ts) for ts in range(1000)]
+    sol_jsonl_toDump[500]['mac'] = sol._format_buffer(EXAMPLE_MAC)
+
+    # dump
+    sol.dumpToFile(sol_jsonl_toDump, FILENAME)
+
+    # filter on MAC and type
+    loaded = [o for (o, _) in sol.iterFromFile(FILENAME, mac=EXAMPLE_MAC, types=[0x0e])]
+    assert loaded == sol_jsonl_toDump[500:501]
+    loaded = [o for (o, _) in sol.iterFromFile(FILENAME, types=[0x27])]
+    assert loaded == []
+
+    # stop half way, then resume from the cursor
+    it = sol.iterFromFile(FILENAME, start_timestamp=100, end_timestamp=800)
+    loaded = []
+    for (o, cursor) in it:
+        loaded += [o]
+        if len(loaded) == 300:
+            break
+    it.close()
+    for (o, cursor) in sol.iterFromFile(FILENAME, end_timestamp=800, offset=cursor):
+        loaded += [o]
+    assert loaded == sol_jsonl_toDump[100:801]
+
+
 def test_retrieve_range_corrupt_beginning(removeFile):
     # prepare dicts to dump
     sol_jsonl_toDump = [random_sol_json(timestamp=ts) for ts in range(1000)]
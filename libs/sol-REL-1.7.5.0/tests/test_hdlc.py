@@ -96,3 +96,54 @@ def test_hdlc():
     assert d[0] == sol.json_to_bin(JSON)
     assert sol.bin_to_json(d[0]) == JSON
     os.remove(file_name)
+
+def test_dehdlcify_blocks():
+    file_name = "test_hdlc_blocks.backup"
+
+    # frames full of bytes to escape, separated by garbage
+    frames = [
+        [0x7e, 0x7d, i, 0x7e, 0x7d, 0x5e, 0x5d] * (i+1)
+        for i in range(50)
+    ]
+    with open(file_name, 'wb') as f:
+        for frame in frames:
+            f.write("".join(chr(c) for c in hdlc.hdlcify(frame)))
+            f.write("garbage")
+
+    with open(file_name, 'rb') as f:
+        for blockSize in [1, 2, 3, 7, 64, 4096]:
+            decoded = list(hdlc.iterDehdlcify(f, blockSize=blockSize))
+            assert [d for (d, _) in decoded] == frames
+
+            # every returned offset is right after a closing flag
+            (d, o) = hdlc.dehdlcify(file_name, fileOffset=decoded[10][1], maxNum=1)
+            assert d == [frames[11]]
+            assert o == decoded[11][1]
+
+    os.remove(file_name)
+
+def test_dehdlcify_frame():
+    frame = "".join(chr(c) for c in hdlc.hdlcify([0x7e, 0x01, 0x7d]))
+    assert hdlc.dehdlcifyFrame(frame) == [0x7e, 0x01, 0x7d]
+    try:
+        hdlc.dehdlcifyFrame(frame[:-2] + frame[-1])
+    except ValueError:
+        pass
+    else:
+        assert False
+
+def test_fcs16_backends():
+    bufs = ['', '\x00', '\x7e\x7d', ''.join(chr(i) for i in range(256)) * 3]
+    for buf in bufs:
+        for crc in [hdlc.HDLC_CRCINIT, 0x0000, 0x1234]:
+            assert hdlc._fcs16_binascii(buf, crc) == hdlc._fcs16_table(buf, crc)
+
+    # computed over several buffers
+    assert hdlc.fcs16(bufs[3][100:], hdlc.fcs16(bufs[3][:100])) == hdlc.fcs16(bufs[3])
+
+def test_hdlcify_many():
+    bufs = [[0x7e, 0x7d, i] * i for i in range(20)]
+    frames = hdlc.hdlcifyMany(bufs)
+    assert frames == "".join(hdlc.hdlcifyBytes(buf) for buf in bufs)
+    assert hdlc.hdlcifyBytes(bufs[5]) == "".join(chr(c) for c in hdlc.hdlcify(bufs[5]))
+    assert hdlc.hdlcifyBytes(bytearray(bufs[5])) == hdlc.hdlcifyBytes(bufs[5])
@@ -0,0 +1,110 @@
+from .context import sol
+from sensorobjectlibrary import SolDefines
+
+import pytest
+
+# ============================ defines ===============================
+
+MAC       = '00-17-0d-00-00-58-5b-02'
+TIMESTAMP = 1521645792
+
+SNAPSHOT  = {
+    'manager':          MAC,
+    'valid':            True,
+    'name':             'snapshot',
+    'epoch_stop':       1521645792.786726,
+    'timestamp_stop':   'Wed, 21 Mar 2018 15:23:12 UTC',
+    'getMoteConfig':    {
+        MAC:            {'macAddress': MAC, 'moteId': 1, 'isAP': True, 'reserved': None},
+    },
+    'getMoteInfo':      {
+        MAC:            {'macAddress': MAC, 'stateTime': 1355, 'totalNeededBw': 55890, 'avgLatency': -1},
+    },
+    'getPathInfo':      {
+        MAC:            {'paths': [{'source': MAC, 'dest': '00-17-0d-00-00-58-5b-03', 'quality': 74}]},
+    },
+    'getMoteLinks':     {
+        MAC:            {'links': []},
+    },
+    'numbers':          [0, -128, 127, 32767, -32769, 2**31, -2**63, 2**64, 1.5, -0.0],
+    'strings':          [u'\xe9t\xe9', '', '00-17-0D-00-00-58-5B-02', '00-17'],
+}
+
+# ============================ helpers ===============================
+
+def sol_json(value):
+    return {
+        'timestamp':    TIMESTAMP,
+        'mac':          MAC,
+        'type':         SolDefines.SOL_TYPE_DUST_SNAPSHOT_2,
+        'value':        value,
+    }
+
+# ============================ tests =================================
+
+def test_snapshot_2_roundtrip():
+    sol_bin = sol.json_to_bytes(sol_json(SNAPSHOT))
+    assert sol_bin[14] == SolDefines.SOL_SNAPSHOT_2_VERSION
+
+    decoded = sol.bin_to_json(sol_bin)
+    assert decoded == sol_json(SNAPSHOT)
+    assert isinstance(decoded['value']['manager'], unicode)
+    assert isinstance(decoded['value']['getPathInfo'].keys()[0], unicode)
+
+    # each key appears once, MAC addresses are not written as strings
+    assert str(sol_bin).count('macAddress') == 1
+    assert MAC not in str(sol_bin)[15:].replace(MAC, '', 1)
+
+def test_snapshot_2_literal():
+    # objects written by older versions, as a Python literal
+    sol_bin = bytearray(sol.json_to_bytes(sol_json(None))[:14]) + str(SNAPSHOT)
+    assert sol.bin_to_json(sol_bin) == sol_json(SNAPSHOT)
+
+def test_snapshot_2_keys():
+    # non-string keys become strings, as in JSON
+    value = {1: 'a', None: 'b', 2.5: 'c'}
+    assert sol.bin_to_json(sol.json_to_bytes(sol_json(value)))['value'] == \
+        {u'1': u'a', u'null': u'b', u'2.5': u'c'}
+
+    with pytest.raises(TypeError):
+        sol.json_to_bytes(sol_json({'a': object()}))
+
+def test_snapshot_delta():
+    mac2     = '00-17-0d-00-00-58-5b-03'
+    previous = {
+        'epoch_stop':       1521645792.5,
+        'getMoteConfig':    {MAC: {'moteId': 1, 'isAP': True}},
+        'getMoteInfo':      {MAC: {'numGoodNbrs': 3, 'packetsReceived': 1000}},
+        'getPathInfo':      {MAC: {0: {'dest': mac2, 'quality': 74}, 1: {'dest': MAC, 'quality': 50}}},
+        'getMoteLinks':     {MAC: {'links': [{'slot': 1}]}},
+    }
+    current  = {
+        'epoch_stop':       1521649392.5,
+        'getMoteConfig':    {MAC: {'moteId': 1, 'isAP': True}, mac2: {'moteId': 2, 'isAP': False}},
+        'getMoteInfo':      {MAC: {'numGoodNbrs': 3, 'packetsReceived': 1200}},
+        'getPathInfo':      {MAC: {0: {'dest': mac2, 'quality': 80}}},
+        'getMoteLinks':     {MAC: {'links': [{'slot': 1}, {'slot': 2}]}},
+    }
+
+    delta = sol.snapshot_diff(previous, current)
+    assert 'getMoteConfig' not in delta.get('set', {})
+    assert delta['sub']['getMoteConfig'] == {'set': {mac2: {'moteId': 2, 'isAP': False}}}
+    assert delta['sub']['getMoteInfo'] == {'sub': {MAC: {'inc': {'packetsReceived': 200}}}}
+    assert delta['sub']['getPathInfo']['sub'][MAC]['del'] == [1]
+    assert sol.snapshot_diff(current, current) == {}
+
+    # previous is not modified, unchanged parts are shared
+    assert sol.snapshot_apply(previous, delta) == current
+    assert sol.snapshot_apply(previous, delta)['getMoteConfig'][MAC] is previous['getMoteConfig'][MAC]
+    assert 1 in previous['getPathInfo'][MAC]
+
+    # on the server, keys are strings
+    def through_bin(value):
+        return sol.bin_to_json(sol.json_to_bytes(dict(sol_json(value), type=SolDefines.SOL_TYPE_DUST_SNAPSHOT_DELTA)))['value']
+    assert sol.snapshot_apply(through_bin(previous), through_bin(delta)) == through_bin(current)
+
+def test_snapshot_delta_dust_to_json():
+    notif = {'name': 'snapshotDelta', 'manager': MAC, 'valid': True, 'base': 1.5, 'delta': {}}
+    [o]   = sol.dust_to_json(notif, mac_manager=MAC, timestamp=TIMESTAMP)
+    assert o['type'] == SolDefines.SOL_TYPE_DUST_SNAPSHOT_DELTA
+    assert sol.bin_to_json(sol.json_to_bytes(o)) == o
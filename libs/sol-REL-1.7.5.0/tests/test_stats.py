@@ -0,0 +1,55 @@
+from .context import sol
+from sensorobjectlibrary import SolUtils
+import os
+
+import pytest
+
+# ============================ defines ===============================
+
+FILENAME       = 'temp_test_stats.stats'
+STATS_LIST     = ['STAT_A', 'STAT_B']
+
+# ============================ fixtures ==============================
+
+@pytest.fixture
+def appStats():
+    # AppStats is a singleton, start from a fresh instance
+    SolUtils.AppStats._instance = None
+    SolUtils.AppStats._init     = False
+    yield lambda: SolUtils.AppStats(stats_list=STATS_LIST, stats_file=FILENAME, flush_period=0)
+    SolUtils.AppStats._instance = None
+    SolUtils.AppStats._init     = False
+    for f in [FILENAME, FILENAME+'.tmp']:
+        try:
+            os.remove(f)
+        except OSError:
+            # if file does not exist. NOT an error.
+            pass
+
+# ============================ tests =================================
+
+def test_increment_no_io(appStats):
+    stats = appStats()
+    os.remove(FILENAME)
+
+    for _ in range(100):
+        stats.increment('STAT_A')
+    stats.update('STAT_B', 'value')
+    stats.increment('NUMRX_notifData')
+    stats.increment('NUMRX_notifData', 10)
+
+    assert not os.path.exists(FILENAME)
+    assert stats.get() == {'STAT_A': 100, 'STAT_B': 'value', 'NUMRX_notifData': 11}
+
+def test_flush_reload(appStats):
+    stats = appStats()
+    stats.increment('STAT_A')
+    stats.increment('STAT_A')
+    stats.flush()
+    assert not os.path.exists(FILENAME+'.tmp')
+
+    # reload from file
+    SolUtils.AppStats._instance = None
+    SolUtils.AppStats._init     = False
+    stats = appStats()
+    assert stats.get() == {'STAT_A': 2}
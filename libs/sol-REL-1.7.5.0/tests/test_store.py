@@ -0,0 +1,118 @@
+from .context import sol
+from sensorobjectlibrary import SolStore
+import os
+import shutil
+import random
+
+import pytest
+
+# ============================ defines ===============================
+
+DIRNAME        = 'temp_test_store'
+FILENAME       = 'temp_test_store.sol'
+SEGMENT_PERIOD = 100
+EXAMPLE_MAC    = '01-02-03-04-05-06-07-08'
+
+# ============================ fixtures ==============================
+
+@pytest.fixture
+def removeStore():
+    yield
+    shutil.rmtree(DIRNAME, ignore_errors=True)
+    try:
+        os.remove(FILENAME)
+    except OSError:
+        # if file does not exist. NOT an error.
+        pass
+
+# ============================ helpers ===============================
+
+def random_sol_json(timestamp=0, mac=None, type=0x0e):
+    if mac is None:
+        mac = sol._format_buffer([random.randint(0x00, 0xff)] * 8)
+    returnVal = {
+        "timestamp": timestamp,
+        "mac": mac,
+        "type": type,
+        "value": {
+            'srcPort': random.randint(0x0000, 0xffff),
+            'dstPort': random.randint(0x0000, 0xffff),
+            'data': [random.randint(0x00, 0xff)] * random.randint(10, 30),
+        },
+    }
+
+    return returnVal
+
+# ============================ tests =================================
+
+def test_dump_load(removeStore):
+    sol_jsonl_toDump = [random_sol_json(timestamp=ts) for ts in range(1000)]
+
+    store = SolStore.SolStore(DIRNAME, segment_period=SEGMENT_PERIOD)
+    store.dump(sol_jsonl_toDump[:500])
+    store.dump(sol_jsonl_toDump[500:])
+
+    assert store.segments() == range(0, 1000, SEGMENT_PERIOD)
+    assert store.load() == sol_jsonl_toDump
+
+def test_load_range(removeStore):
+    sol_jsonl_toDump = [random_sol_json(timestamp=ts) for ts in range(1000)]
+
+    store = SolStore.SolStore(DIRNAME, segment_period=SEGMENT_PERIOD)
+    store.dump(sol_jsonl_toDump)
+
+    assert store.load(start_timestamp=150, end_timestamp=420) == sol_jsonl_toDump[150:421]
+    assert store.load(start_timestamp=950, end_timestamp=2000) == sol_jsonl_toDump[950:]
+    assert store.load(start_timestamp=1100, end_timestamp=2000) == []
+
+def test_load_filter(removeStore):
+    sol_jsonl_toDump = [
+        random_sol_json(timestamp=ts, mac=EXAMPLE_MAC if ts % 3 == 0 else None)
+        for ts in range(300)
+    ]
+    sol_jsonl_toDump += [
+        {
+            "timestamp": 150,
+            "mac": EXAMPLE_MAC,
+            "type": 0x27,
+            "value": {'temperature': 2300},
+        },
+    ]
+
+    store = SolStore.SolStore(DIRNAME, segment_period=SEGMENT_PERIOD)
+    store.dump(sol_jsonl_toDump)
+
+    loaded = store.load(mac=EXAMPLE_MAC, types=[0x0e])
+    assert loaded == [o for o in sol_jsonl_toDump if o['mac'] == EXAMPLE_MAC and o['type'] == 0x0e]
+    loaded = store.load(start_timestamp=100, end_timestamp=199, types=[0x27])
+    assert loaded == sol_jsonl_toDump[-1:]
+
+def test_compress_remove(removeStore):
+    sol_jsonl_toDump = [random_sol_json(timestamp=ts) for ts in range(500)]
+
+    store = SolStore.SolStore(DIRNAME, segment_period=SEGMENT_PERIOD)
+    store.dump(sol_jsonl_toDump)
+
+    store.compress(before_timestamp=300)
+    assert os.path.exists(os.path.join(DIRNAME, '100.sol.gz'))
+    assert not os.path.exists(os.path.join(DIRNAME, '100.sol'))
+    assert os.path.exists(os.path.join(DIRNAME, '300.sol'))
+    assert store.load(start_timestamp=150, end_timestamp=350) == sol_jsonl_toDump[150:351]
+
+    # late object for a compressed segment
+    late = random_sol_json(timestamp=120)
+    store.dump([late])
+    assert store.load(start_timestamp=100, end_timestamp=199) == sol_jsonl_toDump[100:200] + [late]
+
+    store.remove(before_timestamp=200)
+    assert store.segments() == [200, 300, 400]
+    assert store.load() == sol_jsonl_toDump[200:]
+
+def test_import_file(removeStore):
+    sol_jsonl_toDump = [random_sol_json(timestamp=ts) for ts in range(300)]
+    sol.dumpToFile(sol_jsonl_toDump, FILENAME)
+
+    store = SolStore.SolStore(DIRNAME, segment_period=SEGMENT_PERIOD)
+    store.importFile(FILENAME)
+
+    assert store.load() == sol_jsonl_toDump
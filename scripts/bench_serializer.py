@@ -0,0 +1,61 @@
+### This script benchmarks the decoding of the IP manager serial API packets:
+### time per packet with the compiled layouts of ByteArraySerializer, and
+### field by field (the decoder used when a packet does not fit the layouts).
+
+#============================ imports =========================================
+
+import timeit
+import argparse
+
+from SmartMeshSDK.ApiDefinition import ApiDefinition, IpMgrDefinition
+
+parser = argparse.ArgumentParser()
+
+#============================ args ============================================
+
+parser.add_argument("-n", help="number of packets decoded [10000]", type=int, default=10000)
+
+args = parser.parse_args()
+
+#============================ helpers =========================================
+
+COMMAND      = ApiDefinition.ApiDefinition.COMMAND
+NOTIFICATION = ApiDefinition.ApiDefinition.NOTIFICATION
+
+MAC          = [0x00, 0x17, 0x0d, 0x00, 0x00, 0x38, 0x06, 0x0a]
+
+apidef       = IpMgrDefinition.IpMgrDefinition()
+
+def notif(subcommandArray, payload):
+    # notification ID, followed by the subcommand IDs and the payload
+    nameArray = ['notification']
+    subIds    = []
+    for name in subcommandArray:
+        subIds   += [apidef.subcommandNameToId(NOTIFICATION, nameArray, name)]
+        nameArray = nameArray+[name]
+    return (NOTIFICATION, apidef.nameToId(NOTIFICATION, ['notification']), subIds+payload)
+
+def resp(name, payload):
+    return (COMMAND, apidef.nameToId(COMMAND, [name]), payload)
+
+PACKETS = [
+    ('notifData (80B)',         notif(['notifData'],         [0]*7+[1] + [0, 0, 0, 2] + MAC + [0xf0, 0xb8, 0xf0, 0xb8] + range(80))),
+    ('notifHealthReport (60B)', notif(['notifHealthReport'], MAC + range(60))),
+    ('eventMoteJoin',           notif(['notifEvent', 'eventMoteJoin'], [0, 0, 0, 1] + MAC)),
+    ('getMoteInfo',             resp('getMoteInfo', [0] + MAC + [4, 5, 3] + [0, 0, 0, 1]*7 + [1, 2])),
+]
+
+#============================ main ============================================
+
+for (name, (type, id, payload)) in PACKETS:
+    print '{0}:'.format(name)
+    results = []
+    for useLayouts in [False, True]:
+        apidef.serializer.useLayouts = useLayouts
+        results  += [apidef.deserialize(type, id, payload)]
+        duration  = timeit.timeit(lambda: apidef.deserialize(type, id, payload), number=args.n)
+        print '   {0:<22}: {1:.1f} us/packet'.format(
+            'compiled layouts' if useLayouts else 'field by field',
+            1e6*duration/args.n,
+        )
+    assert results[0]==results[1]
@@ -0,0 +1,95 @@
+### This script benchmarks the conversion of Dust notifications into SOL objects:
+### time per notification, and number of containers (dicts, lists) of the
+### resulting objects which are copies, i.e. not shared with the notification.
+
+#============================ imports =========================================
+
+import timeit
+import argparse
+
+from sensorobjectlibrary import Sol as sol
+
+parser = argparse.ArgumentParser()
+
+#============================ args ============================================
+
+parser.add_argument("-n", help="number of conversions timed [1000]", type=int, default=1000)
+parser.add_argument("--neighbors", help="number of neighbors in the health reports [30]", type=int, default=30)
+
+args = parser.parse_args()
+
+#============================ helpers =========================================
+
+MAC = '01-02-03-04-05-06-07-08'
+
+def hr_notif(num_neighbors):
+    neighbors = [
+        {
+            'neighborId':           i,
+            'neighborFlag':         0,
+            'rssi':                 -50,
+            'numTxPackets':         100,
+            'numTxFailures':        1,
+            'numRxPackets':         100,
+        }
+        for i in range(num_neighbors)
+    ]
+    return {
+        'name':     'hr',
+        'mac':      MAC,
+        'hr':       {
+            'Device':       {'charge': 1234, 'queueOcc': 0x11, 'temperature': 22, 'batteryVoltage': 3000},
+            'Neighbors':    {'numItems': num_neighbors, 'neighbors': neighbors},
+            'Discovered':   {'numJoinParents': 1, 'numItems': num_neighbors, 'discoveredNeighbors': neighbors},
+            'Extended':     {'RSSI': [{'idleRssi': -90, 'txUnicastAttempts': 10, 'txUnicastFailures': 0}] * 15},
+        },
+    }
+
+def data_notif():
+    return {
+        'name':     'notifData',
+        'manager':  'COM6',
+        'fields':   {
+            'utcSecs':    1,
+            'utcUsecs':   2,
+            'macAddress': MAC,
+            'srcPort':    0x0102,
+            'dstPort':    0x0304,
+            'data':       range(80),
+        },
+    }
+
+def containers(o):
+    # ids of the distinct dicts and lists reachable from o
+    seen  = set()
+    stack = [o]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        if isinstance(o, dict):
+            seen.add(id(o))
+            stack += o.values()
+        elif isinstance(o, list):
+            seen.add(id(o))
+            stack += o
+    return seen
+
+#============================ main ============================================
+
+for (name, notif) in [
+        ('hr ({0} neighbors)'.format(args.neighbors), hr_notif(args.neighbors)),
+        ('notifData',                                 data_notif()),
+    ]:
+    duration  = timeit.timeit(lambda: sol.dust_to_json(notif, mac_manager=MAC, timestamp=0), number=args.n)
+    sol_jsonl = sol.dust_to_json(notif, mac_manager=MAC, timestamp=0)
+    copied    = containers(sol_jsonl) - containers(notif)
+
+    print '{0}:'.format(name)
+    print '   dust_to_json          : {0:.1f} us/notification'.format(1e6*duration/args.n)
+    print '   containers copied     : {0}'.format(len(copied))
+
+sol_json = sol.dust_to_json(data_notif(), mac_manager=MAC, timestamp=0)[0]
+tags     = {'mac': MAC, 'site': 'site', 'latitude': 0.0, 'longitude': 0.0}
+duration = timeit.timeit(lambda: sol.json_to_influxdb(sol_json, tags), number=args.n)
+print 'json_to_influxdb        : {0:.1f} us/object'.format(1e6*duration/args.n)
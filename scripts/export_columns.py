@@ -0,0 +1,37 @@
+### This script writes the objects of the backup created by the solmanager
+### as columns, one directory per SOL type, for analytics (see
+### SolExport.ColumnsReader to read them back).
+
+#============================ imports =========================================
+
+import argparse
+
+from sensorobjectlibrary import SolDefines, SolExport
+
+parser = argparse.ArgumentParser()
+
+#============================ args ============================================
+
+outputdir = 'solmanager.backup.columns'
+
+parser.add_argument("inputfile",
+                    help="input file or backup directory [../solmanager.backup.d]",
+                    type=str)
+parser.add_argument("-o", help="output directory [solmanager.backup.columns]", type=str)
+parser.add_argument("-t", help="filter SOL type (decimal type id)", type=int)
+
+args = parser.parse_args()
+
+if args.o is not None:
+    outputdir = args.o
+
+#============================ main ============================================
+
+types  = [args.t] if args.t is not None else None
+
+writer = SolExport.dumpToColumns(args.inputfile, outputdir, types=types)
+
+for (sol_type, table) in sorted(writer.tables.items()):
+    print '{0:<45} {1} objects'.format(SolDefines.sol_type_to_type_name(sol_type), table.num_rows)
+for (sol_type, num) in sorted(writer.skipped.items()):
+    print '{0:<45} {1} objects skipped (no fixed structure)'.format(SolDefines.sol_type_to_type_name(sol_type), num)
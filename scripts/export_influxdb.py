@@ -0,0 +1,88 @@
+### This script exports the objects of the backup file created by the solmanager
+### as InfluxDB line protocol, into a file or to a local socket (e.g. the UDP
+### service of InfluxDB, or a Telegraf socket_listener).
+
+#============================ imports =========================================
+
+import os
+import sys
+import argparse
+import json
+import socket
+import urlparse
+
+from sensorobjectlibrary import Sol as sol, SolStore, SolExport
+
+parser = argparse.ArgumentParser()
+
+#============================ args ============================================
+
+outputfile = 'solmanager.backup.influxdb'
+
+parser.add_argument("inputfile",
+                    help="input file or backup directory [../solmanager.backup.d]",
+                    type=str)
+parser.add_argument("-o", help="output file [solmanager.backup.influxdb]", type=str)
+parser.add_argument("-s", help="output socket, instead of a file (udp://host:port, tcp://host:port or unix:///path)", type=str)
+parser.add_argument("-t", help="filter SOL type (decimal type id)", type=int)
+parser.add_argument("--tags", help="tags of all points, as JSON [{}]", type=json.loads, default={})
+parser.add_argument("--chunk", help="number of objects of the same type converted at once [5000]", type=int, default=5000)
+
+args = parser.parse_args()
+
+if args.o is not None:
+    outputfile = args.o
+
+#============================ helpers =========================================
+
+MAX_DATAGRAM = 60000
+
+def socket_writer(url):
+    url = urlparse.urlparse(url)
+    if url.scheme == 'unix':
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(url.path)
+    elif url.scheme == 'tcp':
+        s = socket.create_connection((url.hostname, url.port))
+    elif url.scheme == 'udp':
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect((url.hostname, url.port))
+        return lambda lines: send_datagrams(s, lines)
+    else:
+        sys.exit("unknown socket type {0}".format(url.scheme))
+    return s.sendall
+
+def send_datagrams(s, lines):
+    # split on line boundaries, as each datagram is parsed on its own
+    start = 0
+    while start < len(lines):
+        end = lines.rfind('\n', start, start+MAX_DATAGRAM) + 1
+        if end <= start:
+            end = lines.find('\n', start) + 1
+        s.send(lines[start:end])
+        start = end
+
+#============================ main ============================================
+
+# read the file
+
+types = [args.t] if args.t is not None else None
+
+if os.path.isdir(args.inputfile):
+    obj_list = SolStore.SolStore(args.inputfile).iterLoad(types=types)
+else:
+    obj_list = (obj for (obj, _) in sol.iterFromFile(args.inputfile, types=types))
+
+# write the output
+
+if args.s is not None:
+    write = socket_writer(args.s)
+else:
+    out   = open(outputfile, 'w')
+    write = out.write
+
+for lines in SolExport.json_to_influxdb_lines(obj_list, args.tags, chunk_size=args.chunk):
+    write(lines)
+
+if args.s is None:
+    out.close()
@@ -8,7 +8,7 @@ import argparse
 import json
 import time
 
-from sensorobjectlibrary import Sol as sol, SolDefines
+from sensorobjectlibrary import Sol as sol, SolDefines, SolStore
 
 parser = argparse.ArgumentParser()
 
@@ -17,7 +17,7 @@ parser = argparse.ArgumentParser()
 outputfile = 'solmanager.backup.json'
 
 parser.add_argument("inputfile",
-                    help="input file [../solmanager.backup]",
+                    help="input file or backup directory [../solmanager.backup.d]",
                     type=str)
 parser.add_argument("-o", help="output file [solmanager.backup.json]", type=str)
 parser.add_argument("-f", help="output format [json|csv]", type=str, default="json")
@@ -32,16 +32,16 @@ if args.o is not None:
 
 # read the file
 
-obj_list = sol.loadFromFile(args.inputfile)
+types = [args.t] if args.t is not None else None
+
+if os.path.isdir(args.inputfile):
+    obj_list = SolStore.SolStore(args.inputfile).iterLoad(types=types)
+else:
+    obj_list = (obj for (obj, _) in sol.iterFromFile(args.inputfile, types=types))
 
 # write the output
 
 for obj in obj_list:
-    # skip if type is filtered
-    if args.t is not None:
-        if obj["type"] != args.t:
-            continue
-
     # format object
     str_type = SolDefines.sol_type_to_type_name(obj["type"])
     if args.f == "json":
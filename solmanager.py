@@ -18,6 +18,10 @@ if __name__ == "__main__":
 # from default Python
 import time
 import json
+import heapq
+import itertools
+import collections
+import Queue
 import threading
 import logging.config
 import base64
@@ -34,6 +38,7 @@ from   SmartMeshSDK.utils    import JsonManager, \
 from   dustCli               import DustCli
 from   sensorobjectlibrary   import Sol as sol, \
                                     SolDefines, \
+                                    SolStore, \
                                     SolUtils
 from   DuplexClient          import DuplexClient
 
@@ -46,7 +51,8 @@ log = logging.getLogger("solmanager")
 
 DFLT_CONFIGFILE    = 'solmanager.config'
 STATSFILE          = 'solmanager.stats'
-BACKUPFILE         = 'solmanager.backup'
+BACKUPDIR          = 'solmanager.backup.d'
+OUTBOXFILE         = 'solmanager.outbox'
 
 ALLSTATS           = [
     #== admin
@@ -54,16 +60,26 @@ ALLSTATS           = [
     #== notifications from manager
     # note: we count the number of notifications form the manager, for each time, e.g. NUMRX_NOTIFDATA
     # all stats start with "NUMRX_"
+    'NOTIF_DROPPED',
     #== publication
     'PUB_TOTAL_SENTTOPUBLISH',
     # to file
     'PUBFILE_PUBBINARY',
     'PUBFILE_BACKLOG',
+    'PUBFILE_BACKLOG_AGE',
     'PUBFILE_WRITES',
     # to server
     'PUBSERVER_PUBBINARY',
+    'PUBSERVER_BATCHES',
     'PUBSERVER_PUBJSON',
     'PUBSERVER_FROMSERVER',
+    #== commands from server
+    'CMD_QUEUED',
+    'CMD_EXECUTED',
+    'CMD_REJECTED',
+    'CMD_EXPIRED',
+    'CMD_WAIT_LAST_S',
+    'CMD_WAIT_MAX_S',
 ]
 
 # =========================== helpers =========================================
@@ -105,6 +121,10 @@ def get_versions():
         'SmartMesh SDK' : list(sdk_version.VERSION),
     }
 
+def log_conversion_error(o, err):
+    """Logs a notification or object which can't be converted, and is left out of its batch"""
+    SolUtils.logCrash(err, SolUtils.AppStats())
+
 # =========================== classes =========================================
 
 class Tracer(object):
@@ -159,7 +179,7 @@ class DoSomethingPeriodic(threading.Thread):
             self.currentDelay = 5
             while self.goOn:
                 self.currentDelay -= 1
-                if self.currentDelay == 0:
+                if self.currentDelay <= 0:
                     self._doSomething()
                     self.currentDelay = self.periodvariable
                 time.sleep(1)
@@ -179,11 +199,48 @@ class MgrThread(object):
     Thread to start the connection with the Dust Manager using the JsonManager
     """
 
+    # maximum number of notifications converted and published at once
+    NOTIF_BATCH_SIZE = 100
+
+    # notifications waiting to be converted, further notifications wait for
+    # room ("block") or are dropped ("drop")
+    DFLT_NOTIF_MAX_QUEUED = 1000
+    DFLT_NOTIF_QUEUE_FULL = "block"
+
+    # by default, all snapshots are complete
+    DFLT_SNAPSHOT_KEYFRAME_EVERY = 1
+
+    # by default, wait for the response to each command sent to the manager
+    # (pipelining the snapshot commands is experimental)
+    DFLT_SERIALAPI_WINDOW = 1
+
     def __init__(self):
 
         # local variables
         self.macManager = None
         self.dataLock   = threading.RLock()
+        self.notifQueue = Queue.Queue(int(SolUtils.AppConfig().get(
+            "notif_max_queued",
+            self.DFLT_NOTIF_MAX_QUEUED,
+        )))
+        self.notifBlock = SolUtils.AppConfig().get(
+            "notif_queue_full",
+            self.DFLT_NOTIF_QUEUE_FULL,
+        ) == "block"
+
+        # only publish the changes between full snapshots
+        self.snapshotDiffer = SnapshotDiffer(
+            keyframe_every  = int(SolUtils.AppConfig().get(
+                "snapshot_keyframe_every",
+                self.DFLT_SNAPSHOT_KEYFRAME_EVERY,
+            )),
+        )
+
+        # start the thread handling the notifications
+        self.notifThread        = threading.Thread(target=self._drain_notifs)
+        self.notifThread.name   = 'MgrThreadNotifs'
+        self.notifThread.daemon = True
+        self.notifThread.start()
 
         # initialize JsonManager
         self.jsonManager = JsonManager.JsonManager(
@@ -191,6 +248,10 @@ class MgrThread(object):
             autodeletemgr   = False,
             serialport      = SolUtils.AppConfig().get("serialport"),
             notifCb         = self._notif_cb,
+            serialwindow    = int(SolUtils.AppConfig().get(
+                "serialapi_window",
+                self.DFLT_SERIALAPI_WINDOW,
+            )),
         )
 
         # todo replace this by JsonManager method to know when a manager is ready
@@ -329,59 +390,125 @@ class MgrThread(object):
         except Exception as err:
             log.error("could not execute {0}: {1}".format(o,traceback.format_exc()))
 
+    def reject_cb_MgrThread(self, o, error):
+        # answer with an error, in the same format as from_server_cb_MgrThread
+        try:
+            if o['command']=='JsonManager':
+                value = {
+                    'success':   False,
+                    'return':    error,
+                }
+                type  = 'JsonManagerResponse'
+            else:
+                value = {
+                    'success':   False,
+                    'error':     error,
+                }
+                type  = 'oapResponse'
+            if 'token' in o['data']:
+                value['token'] = o['data']['token']
+            json_res = {
+                'type':          type,
+                'mac':           o['id'],
+                'manager':       self.macManager,
+                'value':         value,
+            }
+            PubServer().publishJson(json_res)
+        except Exception as err:
+            log.error("could not reject {0}: {1}".format(o,traceback.format_exc()))
+
     def close(self):
         pass
 
     # ======================= private =========================================
 
     def _notif_cb(self, notifName, notifJson):
-        self._handler_dust_notifs(
-            notifJson,
-            notifName
-        )
+        # handled by _drain_notifs, not to block the JsonManager (unless it falls behind)
+        try:
+            self.notifQueue.put((notifName, notifJson, int(time.time())), self.notifBlock)
+        except Queue.Full:
+            SolUtils.AppStats().increment('NOTIF_DROPPED')
+
+    def _drain_notifs(self):
+        while True:
+            # wait for a notification, then take all those queued, up to NOTIF_BATCH_SIZE
+            batch = [self.notifQueue.get()]
+            try:
+                while len(batch) < self.NOTIF_BATCH_SIZE:
+                    batch += [self.notifQueue.get_nowait()]
+            except Queue.Empty:
+                pass
 
-    def _handler_dust_notifs(self, dust_notif, notif_name=""):
-        if   (notif_name!="") and ('name' not in dust_notif):
-            dust_notif['name'] = notif_name
-        elif (notif_name=="") and ('name' not in dust_notif):
-            logging.warning("Cannot find notification name")
-            return
+            try:
+                self._handler_dust_notifs_many(batch)
+            except Exception as err:
+                SolUtils.logCrash(err, SolUtils.AppStats())
+
+    def _handler_dust_notifs_many(self, notifs):
+        """
+        Convert notifications from the manager into JSON SOL objects, and
+        publish those.
+
+        :param list notifs: a list of (notification name, notification, time received) tuples
+        """
+        mac_manager     = self.get_mac_manager()
+        dust_notifs     = []
+        timestamps      = []
+
+        for (notif_name, dust_notif, received) in notifs:
+            if   (notif_name!="") and ('name' not in dust_notif):
+                dust_notif['name'] = notif_name
+            elif (notif_name=="") and ('name' not in dust_notif):
+                logging.warning("Cannot find notification name")
+                continue
 
-        try:
             # trace
             Tracer().trace('from manager: {0}'.format(dust_notif['name']))
 
             # filter raw HealthReport notifications
             if dust_notif['name'] == "notifHealthReport":
-                return
+                continue
 
             # change "manager" field of snaphots (for stars to display correctly)
             if dust_notif['name'] == "snapshot":
-                dust_notif['manager'] = self.get_mac_manager()
+                dust_notif['manager'] = mac_manager
 
             # update stats
             SolUtils.AppStats().increment('NUMRX_{0}'.format(dust_notif['name']))
 
+            # only publish what changed since the previous snapshot, between keyframes
+            if dust_notif['name'] == "snapshot":
+                dust_notif = self.snapshotDiffer.diff(dust_notif)
+
             # get time
-            epoch = None
+            epoch = received
             if hasattr(dust_notif, "utcSecs") and hasattr(dust_notif, "utcUsecs"):
                 netTs = self._calcNetTs(dust_notif)
                 epoch = self._netTsToEpoch(netTs)
 
-            # convert dust notification to JSON SOL Object
-            sol_jsonl = sol.dust_to_json(
-                dust_notif  = dust_notif,
-                mac_manager = self.get_mac_manager(),
-                timestamp   = epoch,
-            )
+            dust_notifs    += [dust_notif]
+            timestamps     += [epoch]
 
-            for sol_json in sol_jsonl:
-                # publish
-                PubFile().publishBinary(sol_json)     # to the backup file
-                PubServer().publishBinary(sol_json)   # to the solserver over the Internet
+        if not dust_notifs:
+            return
 
-        except Exception as err:
-            SolUtils.logCrash(err, SolUtils.AppStats())
+        # convert dust notifications to JSON SOL Objects, only losing those which can't be converted
+        sol_jsonl = sol.dust_to_json_many(
+            dust_notifs = dust_notifs,
+            mac_manager = mac_manager,
+            timestamps  = timestamps,
+            on_error    = log_conversion_error,
+        )
+
+        # publish
+        for pub in [
+                PubFile(),      # to the backup file
+                PubServer(),    # to the solserver over the Internet
+            ]:
+            try:
+                pub.publishBinaryMany(sol_jsonl)
+            except Exception as err:
+                SolUtils.logCrash(err, SolUtils.AppStats())
 
     # === misc
 
@@ -396,8 +523,154 @@ class MgrThread(object):
         with self.dataLock:
             return int(netTs + self.tsDiff)
 
+# ======= executing commands from the server
+
+class CommandPool(object):
+    """
+    Bounded pool of worker threads executing the commands received from the server.
+
+    Commands are executed by priority (manager before mote commands), then in
+    the order received. Commands for the same mote are executed one at a time,
+    as the JsonManager only supports one in-flight OAP request per mote.
+    Commands which do not fit in the queue, or which waited more than timeout
+    seconds, are not executed but passed to reject_cb.
+    """
+    PRIORITY_MANAGER = 0
+    PRIORITY_MOTE    = 1
+
+    def __init__(self, execute_cb, reject_cb, num_workers, max_queued, timeout):
+        # store params
+        self.execute_cb      = execute_cb
+        self.reject_cb       = reject_cb
+        self.max_queued      = max_queued
+        self.timeout         = timeout
+
+        # local variables
+        self.dataLock        = threading.RLock()
+        self.workAvailable   = threading.Condition(self.dataLock)
+        self.queue           = []     # heap of (priority, seqnum, enqueue time, mote, command)
+        self.counter         = itertools.count()
+        self.deferred        = {}     # per mote, commands waiting for the in-flight one
+        self.busy            = set()  # motes with a command in-flight
+        self.num_queued      = 0
+        self.wait_max        = 0
+
+        # start the workers
+        for i in range(num_workers):
+            t = threading.Thread(target=self._run, name='CommandPool_{0}'.format(i))
+            t.daemon = True
+            t.start()
+
+    # ======================= public ==========================================
+
+    def put(self, o):
+        with self.dataLock:
+            full = self.num_queued >= self.max_queued
+            if not full:
+                heapq.heappush(
+                    self.queue,
+                    (self._priority(o), next(self.counter), time.time(), self._mote(o), o),
+                )
+                self.num_queued += 1
+                self.workAvailable.notify()
+
+        if full:
+            SolUtils.AppStats().increment('CMD_REJECTED')
+            self.reject_cb(o, 'queue full')
+        else:
+            SolUtils.AppStats().increment('CMD_QUEUED')
+
+    def qsize(self):
+        with self.dataLock:
+            return self.num_queued
+
+    # ======================= private =========================================
+
+    def _priority(self, o):
+        if isinstance(o, dict) and o.get('type')=='manager':
+            return self.PRIORITY_MANAGER
+        return self.PRIORITY_MOTE
+
+    def _mote(self, o):
+        if isinstance(o, dict) and o.get('type')=='mote':
+            return o.get('id')
+        return None
+
+    def _run(self):
+        while True:
+            # get the next command whose mote is not busy
+            with self.workAvailable:
+                entry = None
+                while entry is None:
+                    while not self.queue:
+                        self.workAvailable.wait()
+                    entry = heapq.heappop(self.queue)
+                    if entry[3] is not None and entry[3] in self.busy:
+                        self.deferred.setdefault(entry[3], collections.deque()).append(entry)
+                        entry = None
+                (_, _, enqueued, mote, o) = entry
+                if mote is not None:
+                    self.busy.add(mote)
+                self.num_queued -= 1
+
+            # execute it
+            wait = time.time()-enqueued
+            try:
+                SolUtils.AppStats().update('CMD_WAIT_LAST_S', round(wait, 3))
+                if wait > self.wait_max:
+                    self.wait_max = wait
+                    SolUtils.AppStats().update('CMD_WAIT_MAX_S', round(wait, 3))
+                if wait > self.timeout:
+                    SolUtils.AppStats().increment('CMD_EXPIRED')
+                    self.reject_cb(o, 'timeout')
+                else:
+                    SolUtils.AppStats().increment('CMD_EXECUTED')
+                    self.execute_cb(o)
+            except Exception as err:
+                log.error("could not execute {0}: {1}".format(o, traceback.format_exc()))
+            finally:
+                # release the mote, requeue its next command
+                with self.workAvailable:
+                    if mote is not None:
+                        self.busy.discard(mote)
+                        if mote in self.deferred:
+                            heapq.heappush(self.queue, self.deferred[mote].popleft())
+                            if not self.deferred[mote]:
+                                del self.deferred[mote]
+                            self.workAvailable.notify()
+
 # ======= publishers
 
+class ReorderBuffer(object):
+    """
+    Min-heap of JSON SOL objects keyed on their timestamp.
+
+    Objects can be pushed in any order; popReady() releases them
+    chronologically once they are at least buffer_period seconds old.
+    Objects with the same timestamp are released in the order they were pushed.
+    """
+    def __init__(self, buffer_period):
+        self.buffer_period   = buffer_period
+        self.heap            = []
+        self.counter         = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, o):
+        heapq.heappush(self.heap, (o['timestamp'], next(self.counter), o))
+
+    def popReady(self, now):
+        returnVal = []
+        while self.heap and now-self.heap[0][0] >= self.buffer_period:
+            returnVal += [heapq.heappop(self.heap)[2]]
+        return returnVal
+
+    def oldestAge(self, now):
+        if not self.heap:
+            return 0
+        return now-self.heap[0][0]
+
 class Pub(object):
     """
     Abstract publish thread.
@@ -408,6 +681,10 @@ class Pub(object):
     def publishBinary(self, o):
         raise SystemError("abstract method")
 
+    def publishBinaryMany(self, ol):
+        for o in ol:
+            self.publishBinary(o)
+
     def publishJson(self, o):
         raise SystemError("abstract method")
 
@@ -422,6 +699,9 @@ class PubFile(Pub,DoSomethingPeriodic):
     # file chronologically
     BUFFER_PERIOD = 30
 
+    # backup segments are compressed once they are COMPRESS_DELAY seconds old
+    COMPRESS_DELAY = 2*SolStore.SEGMENT_PERIOD
+
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
             cls._instance = super(PubFile, cls).__new__(cls, *args, **kwargs)
@@ -431,7 +711,8 @@ class PubFile(Pub,DoSomethingPeriodic):
         if self._init:
             return
         self._init           = True
-        self.toPublishBinary = []
+        self.toPublishBinary = ReorderBuffer(self.BUFFER_PERIOD)
+        self.store           = SolStore.SolStore(BACKUPDIR)
         # initialize parent classes
         Pub.__init__(self)
         DoSomethingPeriodic.__init__(self, SolUtils.AppConfig().get("period_pubfile_min"))
@@ -441,14 +722,16 @@ class PubFile(Pub,DoSomethingPeriodic):
     #======================== public ==========================================
 
     def publishBinary(self, o):
+        self.publishBinaryMany([o])
 
-        # update stats
-        SolUtils.AppStats().increment('PUBFILE_PUBBINARY')
+    def publishBinaryMany(self, ol):
 
         with self.dataLock:
-            self.toPublishBinary += [o]
+            for o in ol:
+                self.toPublishBinary.push(o)
 
             # update stats
+            SolUtils.AppStats().increment('PUBFILE_PUBBINARY', len(ol))
             SolUtils.AppStats().update("PUBFILE_BACKLOG", len(self.toPublishBinary))
 
     def publishJson(self, o):
@@ -458,6 +741,10 @@ class PubFile(Pub,DoSomethingPeriodic):
         with self.dataLock:
             return len(self.toPublishBinary)
 
+    def getBacklogAge(self):
+        with self.dataLock:
+            return self.toPublishBinary.oldestAge(time.time())
+
     #======================== private =========================================
 
     def _doSomething(self):
@@ -471,36 +758,34 @@ class PubFile(Pub,DoSomethingPeriodic):
         Tracer().trace('write to backup file')
 
         with self.dataLock:
-            # order toPublishBinary chronologically
-            self.toPublishBinary.sort(key=lambda i: i['timestamp'])
-
-            # extract the JSON SOL objects heard more than BUFFER_PERIOD ago
+            # extract, chronologically, the JSON SOL objects heard more than BUFFER_PERIOD ago
             now = time.time()
-            solJsonObjectsToWrite = []
-            while True:
-                if not self.toPublishBinary:
-                    break
-                if now-self.toPublishBinary[0]['timestamp'] < self.BUFFER_PERIOD:
-                    break
-                solJsonObjectsToWrite += [self.toPublishBinary.pop(0)]
+            solJsonObjectsToWrite = self.toPublishBinary.popReady(now)
 
             # update stats
             SolUtils.AppStats().update("PUBFILE_BACKLOG", len(self.toPublishBinary))
+            SolUtils.AppStats().update("PUBFILE_BACKLOG_AGE", int(self.toPublishBinary.oldestAge(now)))
 
         # write those to file
         if solJsonObjectsToWrite:
-            sol.dumpToFile(
-                solJsonObjectsToWrite,
-                BACKUPFILE,
-            )
+            self.store.dump(solJsonObjectsToWrite)
+
+        # compress the segments not written to anymore
+        self.store.compress(before_timestamp=now-self.COMPRESS_DELAY)
 
-class PubServer(Pub):
+class PubServer(Pub,DoSomethingPeriodic):
     """
     Singleton that sends objects to the solserver.
+
+    When pubserver_batch_size is larger than 1, binary objects are coalesced
+    into a single SOL batch, sent when pubserver_batch_size objects are
+    waiting or every period_pubserver_min, whichever comes first.
     """
     _instance = None
     _init     = False
 
+    DFLT_PERIOD_MIN = 0.1
+
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
             cls._instance = super(PubServer, cls).__new__(cls, *args, **kwargs)
@@ -510,9 +795,19 @@ class PubServer(Pub):
         if self._init:
             return
         self._init              = True
+        self.duplex_client      = None
+        self.batch_size         = int(SolUtils.AppConfig().get("pubserver_batch_size", 1))
+        self.toPublishBinary    = []
+        # initialize parent classes
         Pub.__init__(self)
+        DoSomethingPeriodic.__init__(
+            self,
+            SolUtils.AppConfig().get("period_pubserver_min", self.DFLT_PERIOD_MIN),
+        )
         self.name               = 'PubServer'
-        self.duplex_client      = None
+        if self.batch_size > 1:
+            # flush the batches periodically
+            self.start()
 
     #======================== public ==========================================
 
@@ -521,20 +816,39 @@ class PubServer(Pub):
             self.duplex_client  = duplex_client
 
     def publishBinary(self, o):
+        self.publishBinaryMany([o])
+
+    def publishBinaryMany(self, ol):
         # stop if duplex_client not configured yet
         with self.dataLock:
             if not self.duplex_client:
                 return
 
         # update stats
-        SolUtils.AppStats().increment('PUBSERVER_PUBBINARY')
+        SolUtils.AppStats().increment('PUBSERVER_PUBBINARY', len(ol))
 
-        # convert objects and push to duplex_client
-        o = sol.json_to_bin(o)
-        o = base64.b64encode(''.join(chr(b) for b in o))
-        o = json.dumps(['b',o])
-        log.debug("sending binary object, size: {0} B".format(len(o)))
-        self.duplex_client.to_server(o)
+        batches = []
+        for o in sol.json_to_bytes_many(ol, on_error=log_conversion_error):
+            # objects too large for a batch are sent on their own
+            if self.batch_size <= 1 or len(o) > SolDefines.SOL_BATCH_MAX_LENGTH:
+                try:
+                    self._sendBinary(o)
+                except Exception as err:
+                    SolUtils.logCrash(err, SolUtils.AppStats())
+                continue
+
+            # add to the batch, send it if full
+            with self.dataLock:
+                self.toPublishBinary += [o]
+                if len(self.toPublishBinary) < self.batch_size:
+                    continue
+                batches             += [self.toPublishBinary]
+                self.toPublishBinary = []
+        for batch in batches:
+            try:
+                self._sendBatch(batch)
+            except Exception as err:
+                SolUtils.logCrash(err, SolUtils.AppStats())
 
     def publishJson(self, o):
         # stop if duplex_client not configured yet
@@ -550,8 +864,83 @@ class PubServer(Pub):
         log.debug("sending json object, size: {0} B".format(len(o)))
         self.duplex_client.to_server(o)
 
+    #======================== private =========================================
+
+    def _doSomething(self):
+        # send the objects batched during the last period
+        with self.dataLock:
+            batch                = self.toPublishBinary
+            self.toPublishBinary = []
+        if batch:
+            self._sendBatch(batch)
+
+    def _sendBatch(self, batch):
+        # update stats
+        SolUtils.AppStats().increment('PUBSERVER_BATCHES')
+
+        self._sendBinary(sol.bin_to_batch_bytes(batch))
+
+    def _sendBinary(self, o):
+        # push a binary object (or batch) to duplex_client
+        o = base64.b64encode(str(o))
+        o = json.dumps(['b',o])
+        log.debug("sending binary object, size: {0} B".format(len(o)))
+        self.duplex_client.to_server(o)
+
 # ======= periodically do something
 
+class SnapshotDiffer(object):
+    """
+    Replace snapshots by the changes since the previous snapshot of the same
+    manager ("snapshotDelta" notifications, see sol.snapshot_diff).
+
+    Every keyframe_every-th snapshot, and every snapshot requested by the
+    server, is left complete (a keyframe), so the server can rebuild the
+    network state from the last keyframe and the deltas after it. Each delta
+    carries the epoch_stop of the snapshot it applies to, as 'base'.
+    """
+
+    def __init__(self, keyframe_every):
+        # store params
+        self.keyframe_every  = keyframe_every
+
+        # local variables
+        self.dataLock        = threading.RLock()
+        self.previous        = {}     # per manager, the last snapshot
+        self.num_deltas      = {}     # per manager, the deltas since the last keyframe
+
+    def diff(self, dust_notif):
+        """
+        :param dict dust_notif: a "snapshot" notification from the JsonManager
+        :return: the same notification if a keyframe is due, else a
+            "snapshotDelta" notification
+        """
+        if not dust_notif.get('valid'):
+            return dust_notif
+
+        manager  = dust_notif['manager']
+        snapshot = dust_notif['snapshot']
+
+        with self.dataLock:
+            previous = self.previous.get(manager)
+            self.previous[manager] = snapshot
+            if (
+                    previous is None or
+                    'correlationID' in dust_notif or
+                    self.num_deltas.get(manager, 0)+1 >= self.keyframe_every
+                ):
+                self.num_deltas[manager] = 0
+                return dust_notif
+            self.num_deltas[manager] += 1
+
+        return {
+            'name':     'snapshotDelta',
+            'manager':  manager,
+            'valid':    True,
+            'base':     previous['epoch_stop'],
+            'delta':    sol.snapshot_diff(previous, snapshot),
+        }
+
 class SolSnapshotThread(DoSomethingPeriodic):
 
     def __init__(self, mgrThread=None):
@@ -614,6 +1003,10 @@ class StatsThread(DoSomethingPeriodic):
 
 class SolManager(threading.Thread):
 
+    DFLT_CMD_WORKERS    = 4
+    DFLT_CMD_MAX_QUEUED = 100
+    DFLT_CMD_TIMEOUT_S  = 60
+
     def __init__(self, configfile):
         # store params
         self.configfile     = configfile
@@ -629,6 +1022,7 @@ class SolManager(threading.Thread):
             "pollForCommandsThread"    : None,
         }
         self.duplex_client = None
+        self.commandPool   = None
 
         # init Singletons
         SolUtils.AppConfig(config_file=self.configfile)
@@ -673,6 +1067,15 @@ class SolManager(threading.Thread):
             # start manager thread
             self.threads["mgrThread"]  = MgrThread()
 
+            # start the pool executing the commands from the server
+            self.commandPool           = CommandPool(
+                execute_cb             = self.threads["mgrThread"].from_server_cb_MgrThread,
+                reject_cb              = self.threads["mgrThread"].reject_cb_MgrThread,
+                num_workers            = int(SolUtils.AppConfig().get("cmd_workers", self.DFLT_CMD_WORKERS)),
+                max_queued             = int(SolUtils.AppConfig().get("cmd_max_queued", self.DFLT_CMD_MAX_QUEUED)),
+                timeout                = SolUtils.AppConfig().get("cmd_timeout_s", self.DFLT_CMD_TIMEOUT_S),
+            )
+
             # start the duplexClient
             self.duplex_client = DuplexClient.from_url(
                 server_url             = 'http://{0}/api/v1/o.json'.format(SolUtils.AppConfig().get("solserver_host")),
@@ -681,6 +1084,9 @@ class SolManager(threading.Thread):
                 polling_period         = SolUtils.AppConfig().get("period_pollserver_min")*60,
                 from_server_cb         = self.from_server_cb_JsonManager,
                 buffer_tx              = False,
+                queue_file             = OUTBOXFILE,
+                compress               = bool(SolUtils.AppConfig().get("solserver_compress", 0)),
+                long_poll              = SolUtils.AppConfig().get("solserver_long_poll_s", 0),
             )
             while self.duplex_client is None:
                 log.warning("Waiting for duplex client to be started")
@@ -732,6 +1138,7 @@ class SolManager(threading.Thread):
         self.close()
 
     def close(self):
+        SolUtils.AppStats().flush()
         os._exit(0)  # bypass CLI thread
 
     def _clihandle_quit(self):
@@ -754,12 +1161,15 @@ class SolManager(threading.Thread):
         output += self._returnStatsGroup(stats, 'ADM_')
         output += ['#== notifications from manager']
         output += self._returnStatsGroup(stats, 'NUMRX_')
+        output += self._returnStatsGroup(stats, 'NOTIF_')
         output += ['#== publication']
         output += self._returnStatsGroup(stats, 'PUB_')
         output += ['# to file']
         output += self._returnStatsGroup(stats, 'PUBFILE_')
         output += ['# to server']
         output += self._returnStatsGroup(stats, 'PUBSERVER_')
+        output += ['#== commands from server']
+        output += self._returnStatsGroup(stats, 'CMD_')
         output = '\n'.join(output)
         print output
 
@@ -791,19 +1201,7 @@ class SolManager(threading.Thread):
 
         log.debug("from_server_cb_JsonManager: {0}".format(os))
         for o in os:
-            try:
-                name    = '{0}.{1}.{2}'.format(
-                    o['id'],
-                    o['command'],
-                    o['data']['function'],
-                )
-            except:
-                name    = 'from_server'
-            threading.Thread(
-                target  = self.threads["mgrThread"].from_server_cb_MgrThread,
-                args    = (o,),
-                name    = name,
-            ).start()
+            self.commandPool.put(o)
 
 # =========================== main ============================================
 
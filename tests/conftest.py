@@ -0,0 +1,38 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.join(here, '..')
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'libs', 'sol-REL-1.7.5.0'))
+sys.path.insert(0, os.path.join(root, 'libs', 'smartmeshsdk-REL-1.3.0.1', 'libs'))
+sys.path.insert(0, os.path.join(root, 'libs', 'duplex-REL-1.1.0.0'))
+
+# solmanager reads logging.conf from, and writes its log to, the working directory
+workdir = tempfile.mkdtemp()
+shutil.copy(os.path.join(root, 'logging.conf'), workdir)
+os.chdir(workdir)
+
+import solmanager
+from sensorobjectlibrary import SolUtils
+
+@pytest.fixture(scope='session', autouse=True)
+def appConfig():
+    # default configuration
+    with open(os.path.join(workdir, solmanager.DFLT_CONFIGFILE), 'w') as f:
+        f.write('[config]\n')
+    return SolUtils.AppConfig(config_file=os.path.join(workdir, solmanager.DFLT_CONFIGFILE))
+
+@pytest.fixture(scope='session', autouse=True)
+def appStats():
+    stats = SolUtils.AppStats(
+        stats_list   = solmanager.ALLSTATS,
+        stats_file   = os.path.join(workdir, solmanager.STATSFILE),
+        flush_period = 0,
+    )
+    yield stats
+    shutil.rmtree(workdir, ignore_errors=True)
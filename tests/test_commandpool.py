@@ -0,0 +1,154 @@
+import time
+import threading
+
+import pytest
+
+import solmanager
+from sensorobjectlibrary import SolUtils
+
+# ============================ defines ===============================
+
+TIMEOUT = 5
+MOTE_A  = '00-17-0d-00-00-00-00-0a'
+MOTE_B  = '00-17-0d-00-00-00-00-0b'
+
+# ============================ helpers ===============================
+
+def manager_cmd(name):
+    return {'type': 'manager', 'name': name}
+
+def mote_cmd(mote, name):
+    return {'type': 'mote', 'id': mote, 'name': name}
+
+class FakeExecutor(object):
+    """
+    Records the commands executed and rejected. A command whose name is in
+    blocked does not return until release() is called with that name.
+    """
+    def __init__(self, blocked=()):
+        self.dataLock = threading.Lock()
+        self.events   = dict((name, threading.Event()) for name in blocked)
+        self.started  = []
+        self.executed = []
+        self.rejected = []
+
+    def execute(self, o):
+        with self.dataLock:
+            self.started += [o['name']]
+        if o['name'] in self.events:
+            assert self.events[o['name']].wait(TIMEOUT)
+        with self.dataLock:
+            self.executed += [o['name']]
+
+    def reject(self, o, reason):
+        with self.dataLock:
+            self.rejected += [(o['name'], reason)]
+
+    def release(self, name):
+        self.events[name].set()
+
+def wait_for(condition):
+    deadline = time.time()+TIMEOUT
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+def new_pool(executor, num_workers=1, max_queued=10, timeout=TIMEOUT):
+    return solmanager.CommandPool(
+        execute_cb  = executor.execute,
+        reject_cb   = executor.reject,
+        num_workers = num_workers,
+        max_queued  = max_queued,
+        timeout     = timeout,
+    )
+
+# ============================ tests =================================
+
+def test_priority():
+    executor = FakeExecutor(blocked=['first'])
+    pool     = new_pool(executor)
+    pool.put(mote_cmd(MOTE_A, 'first'))
+    wait_for(lambda: executor.started == ['first'])
+
+    # manager commands go before mote commands, then in the order received
+    pool.put(mote_cmd(MOTE_B, 'mote1'))
+    pool.put(manager_cmd('manager1'))
+    pool.put(mote_cmd(MOTE_A, 'mote2'))
+    pool.put(manager_cmd('manager2'))
+    assert pool.qsize() == 4
+    executor.release('first')
+    wait_for(lambda: len(executor.executed) == 5)
+    assert executor.executed == ['first', 'manager1', 'manager2', 'mote1', 'mote2']
+    assert pool.qsize() == 0
+
+def test_one_command_per_mote():
+    executor = FakeExecutor(blocked=['a1', 'b1'])
+    pool     = new_pool(executor, num_workers=3)
+    pool.put(mote_cmd(MOTE_A, 'a1'))
+    pool.put(mote_cmd(MOTE_A, 'a2'))
+    pool.put(mote_cmd(MOTE_B, 'b1'))
+    pool.put(manager_cmd('manager1'))
+
+    # a2 waits for a1, even with a worker free; other commands go on
+    wait_for(lambda: len(executor.started) == 3)
+    assert sorted(executor.started) == ['a1', 'b1', 'manager1']
+    time.sleep(0.1)
+    assert 'a2' not in executor.started
+    assert pool.qsize() == 1
+
+    executor.release('b1')
+    wait_for(lambda: 'b1' in executor.executed)
+    time.sleep(0.1)
+    assert 'a2' not in executor.started
+
+    executor.release('a1')
+    wait_for(lambda: 'a2' in executor.executed)
+    assert executor.executed.index('a1') < executor.executed.index('a2')
+    assert pool.qsize() == 0
+    assert executor.rejected == []
+
+def test_queue_full():
+    executor = FakeExecutor(blocked=['first'])
+    pool     = new_pool(executor, max_queued=2)
+    pool.put(manager_cmd('first'))
+    wait_for(lambda: executor.started == ['first'])
+
+    rejected = SolUtils.AppStats().get().get('CMD_REJECTED', 0)
+    pool.put(manager_cmd('queued1'))
+    pool.put(manager_cmd('queued2'))
+    pool.put(manager_cmd('full'))
+    assert executor.rejected == [('full', 'queue full')]
+    assert SolUtils.AppStats().get()['CMD_REJECTED'] == rejected+1
+
+    executor.release('first')
+    wait_for(lambda: len(executor.executed) == 3)
+    assert executor.executed == ['first', 'queued1', 'queued2']
+
+def test_timeout():
+    executor = FakeExecutor(blocked=['first'])
+    pool     = new_pool(executor, timeout=0.1)
+    pool.put(manager_cmd('first'))
+    wait_for(lambda: executor.started == ['first'])
+
+    # waits longer than the timeout behind first: rejected, not executed
+    expired = SolUtils.AppStats().get().get('CMD_EXPIRED', 0)
+    pool.put(manager_cmd('late'))
+    time.sleep(0.2)
+    executor.release('first')
+    wait_for(lambda: executor.rejected)
+    assert executor.rejected == [('late', 'timeout')]
+    assert executor.executed == ['first']
+    assert SolUtils.AppStats().get()['CMD_EXPIRED'] == expired+1
+
+def test_crash_releases_mote():
+    executor = FakeExecutor()
+    def execute(o):
+        if o['name'] == 'crash':
+            raise ValueError('crash')
+        executor.execute(o)
+    pool = solmanager.CommandPool(execute, executor.reject, 1, 10, TIMEOUT)
+
+    # a command which raises does not block the next command of its mote
+    pool.put(mote_cmd(MOTE_A, 'crash'))
+    pool.put(mote_cmd(MOTE_A, 'next'))
+    wait_for(lambda: executor.executed == ['next'])
@@ -0,0 +1,59 @@
+import json
+import base64
+import Queue
+
+import solmanager
+from sensorobjectlibrary import Sol as sol, SolUtils
+
+# ============================ defines ===============================
+
+MAC = '00-17-0d-00-00-00-00-0a'
+
+# ============================ helpers ===============================
+
+def sol_json(timestamp, mac=MAC):
+    return {
+        'mac':       mac,
+        'timestamp': timestamp,
+        'type':      0x0e,
+        'value':     {'srcPort': 1, 'dstPort': 2, 'data': [timestamp & 0xff]},
+    }
+
+class FakeDuplexClient(object):
+    """
+    Keeps the objects sent to the server, raises Queue.Full for those in full.
+    """
+    def __init__(self, full=()):
+        self.sent = []
+        self.full = full
+
+    def to_server(self, o):
+        (kind, o) = json.loads(o)
+        o = bytearray(base64.b64decode(o))
+        if sol.bin_to_json(o)['timestamp'] in self.full:
+            raise Queue.Full()
+        self.sent += [sol.bin_to_json(o)]
+
+# ============================ tests =================================
+
+def test_pubserver_many():
+    pub = solmanager.PubServer()
+    assert pub.batch_size == 1
+    assert not pub.is_alive()  # no batching, no flush timer
+
+    published = SolUtils.AppStats().get().get('PUBSERVER_PUBBINARY', 0)
+    pub.setDuplexClient(FakeDuplexClient())
+    pub.publishBinaryMany([sol_json(ts) for ts in range(5)])
+    assert pub.duplex_client.sent == [sol_json(ts) for ts in range(5)]
+    assert SolUtils.AppStats().get()['PUBSERVER_PUBBINARY'] == published+5
+
+def test_pubserver_many_errors():
+    pub = solmanager.PubServer()
+    crashes = SolUtils.AppStats().get().get('ADM_NUM_CRASHES', 0)
+
+    # an object which can't be encoded, or sent, does not lose the others
+    pub.setDuplexClient(FakeDuplexClient(full=[3]))
+    invalid = dict(sol_json(1), mac='invalid')
+    pub.publishBinaryMany([sol_json(0), invalid, sol_json(2), sol_json(3), sol_json(4)])
+    assert pub.duplex_client.sent == [sol_json(0), sol_json(2), sol_json(4)]
+    assert SolUtils.AppStats().get()['ADM_NUM_CRASHES'] == crashes+2